@@ -0,0 +1,189 @@
+import heapq
+import random
+from abc import ABCMeta
+from abc import abstractmethod
+
+
+class AllocationStrategy(object):
+    """
+        Class: AllocationStrategy
+        -------------------------
+        An allocation strategy keeps track of the rooms of one type that still
+        have free space and decides which of them the next person goes to.
+        Amity calls update() every time the occupants of a room change and
+        choice() every time it needs a room for someone.
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def update(self, room_name, occupants, capacity):
+        """
+        Records the current number of occupants of a room
+        ______________________________________________________
+        :param room_name: name of the room
+        :param occupants: number of people in the room
+        :param capacity: maximum number of people the room can take
+        """
+
+    @abstractmethod
+    def choice(self):
+        """
+        Picks the room the next person should be allocated to
+        ______________________________________________________
+        :return: name of the room or None when every room is full
+        """
+
+
+class VacancyPool(AllocationStrategy):
+    """
+        Class: VacancyPool
+        ------------------
+        Keeps the names of all the rooms of one type that still have free
+        space. The names are held in a list together with a name -> position
+        index so that adding a room, removing a room and picking a random
+        room are all O(1) no matter how many rooms amity has.
+    """
+    name = "random"
+
+    def __init__(self):
+        self.rooms = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def __contains__(self, room_name):
+        return room_name in self.positions
+
+    def add(self, room_name):
+        """
+        Adds a room to the pool if it is not already there
+        ______________________________________________________
+        :param room_name: name of the room with free space
+        """
+        if room_name not in self.positions:
+            self.positions[room_name] = len(self.rooms)
+            self.rooms.append(room_name)
+
+    def discard(self, room_name):
+        """
+        Removes a room from the pool by swapping it with the last room
+        ______________________________________________________
+        :param room_name: name of the room that is now full
+        """
+        position = self.positions.pop(room_name, None)
+        if position is None:
+            return
+        last_room = self.rooms.pop()
+        if last_room != room_name:
+            self.rooms[position] = last_room
+            self.positions[last_room] = position
+
+    def update(self, room_name, occupants, capacity):
+        if occupants < capacity:
+            self.add(room_name)
+        else:
+            self.discard(room_name)
+
+    def choice(self):
+        """
+        Picks a random room with free space
+        ______________________________________________________
+        :return: name of the room or None when every room is full
+        """
+        if not self.rooms:
+            return None
+        return random.choice(self.rooms)
+
+
+class HeapStrategy(AllocationStrategy):
+    """
+        Class: HeapStrategy
+        -------------------
+        Keeps the rooms with free space in a heap ordered by key(). Entries
+        are never removed from the middle of the heap, instead a new entry is
+        pushed every time a room changes and outdated entries are dropped when
+        they reach the top, so every update and choice is O(log R).
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        self.heap = []
+        self.occupancy = {}
+        self.order = {}
+
+    def __len__(self):
+        return len(self.occupancy)
+
+    def __contains__(self, room_name):
+        return room_name in self.occupancy
+
+    @abstractmethod
+    def key(self, occupants):
+        """
+        Sort key of a room in the heap, smallest is chosen first
+        ______________________________________________________
+        :param occupants: number of people in the room
+        """
+
+    def update(self, room_name, occupants, capacity):
+        if room_name not in self.order:
+            self.order[room_name] = len(self.order)
+        if occupants < capacity:
+            self.occupancy[room_name] = occupants
+            heapq.heappush(self.heap, (self.key(occupants), self.order[room_name], room_name, occupants))
+        else:
+            self.occupancy.pop(room_name, None)
+        if len(self.heap) > 2 * len(self.occupancy) + 64:
+            self.compact()
+
+    def compact(self):
+        """
+        Rebuilds the heap without the outdated entries
+        ______________________________________________________
+        """
+        self.heap = [(self.key(occupants), self.order[room_name], room_name, occupants)
+                     for room_name, occupants in self.occupancy.items()]
+        heapq.heapify(self.heap)
+
+    def choice(self):
+        while self.heap:
+            key, order, room_name, occupants = self.heap[0]
+            if self.occupancy.get(room_name) == occupants:
+                return room_name
+            heapq.heappop(self.heap)
+        return None
+
+
+class LeastLoadedStrategy(HeapStrategy):
+    """
+        Class: LeastLoadedStrategy
+        --------------------------
+        Allocates people to the room with the fewest occupants so that people
+        are spread evenly across all the rooms.
+    """
+    name = "least-loaded"
+
+    def key(self, occupants):
+        return occupants
+
+
+class PackFirstStrategy(HeapStrategy):
+    """
+        Class: PackFirstStrategy
+        ------------------------
+        Allocates people to the fullest room that still has space, and to
+        the oldest room when there is a tie, so that rooms are filled before
+        new ones are opened.
+    """
+    name = "pack-first"
+
+    def key(self, occupants):
+        return -occupants
+
+
+STRATEGIES = {
+    VacancyPool.name: VacancyPool,
+    LeastLoadedStrategy.name: LeastLoadedStrategy,
+    PackFirstStrategy.name: PackFirstStrategy,
+}
@@ -1,15 +1,76 @@
 # coding=utf-8
 import os
-import random
+import glob
+import functools
 import sqlite3
-import pickle
-import sys
+import threading
+import time
+from collections import OrderedDict
 
-from person import Person, Fellow, Staff
-from room import Room, LivingSpace, Office
+from .person import Fellow, Staff
+from .room import LivingSpace, Office
+from .allocation import STRATEGIES
+from .roster import iter_people, iter_rooms, parse_roster_file, max_people
+from .search import NameIndex
+from . import storage
+from .ids import IdAllocator
+from .occupancy import Occupancy
+from .events import EventLog, INFO, WARNING, QUIET
+from .journal import Journal, segments, read_records, remove_segments
+from .snapshot import Snapshot, is_snapshot, write_snapshot, convert_state
+from . import reports
+from .stats import Stats
+from .locks import NO_LOCK, AllOf, RoomLocks
 
-if os.path.exists('amity'):
-    os.chdir('amity')
+DATA_DIR = os.environ.get("AMITY_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def data_path(path):
+    """
+    Resolves a path in the data directory without depending on the working directory
+    ____________________________________________________________________________________
+    :param path: path relative to DATA_DIR, e.g. input/people.txt
+    :return: the full path
+    """
+    return os.path.join(DATA_DIR, path)
+
+
+class Failed(str):
+    """
+    The message a call returns when it fails. Errors are returned as messages
+    like every other result, callers that need to tell them apart check for
+    this type
+    """
+
+
+def hydrated(method):
+    """
+    Decorates the methods that need the whole state in memory so that a state
+    loaded lazily is fully loaded before they run
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.store is not None:
+            self.hydrate()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def exclusive(method):
+    """
+    Decorates the methods that read or replace the whole state so that in thread
+    safe mode no other thread changes the state while they run
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.thread_safe:
+            return method(self, *args, **kwargs)
+        with self.lock_all():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+STATS_METHODS = ("enable_stats", "disable_stats", "print_stats")
 
 
 class Amity(object):
@@ -29,79 +90,240 @@ class Amity(object):
         Data structures:
         ______________________
         rooms(list): contains a list of all rooms in the system
-        office(dict): This is a dict of all IDs of offices in the amity system
-        accommodations(dict): This is a dict of all IDs of accommodations in the amity system
+        room_names(set): the names of all the rooms, to check for duplicates in constant time
+        office(dict): This is a dict of the set of IDs of the occupants of every office
+        accommodations(dict): This is a dict of the set of IDs of the occupants of every accommodation
         employees(dict): This is a dict of all IDs of employees in the amity system
         fellows(dict): This is a dict of all IDs of fellows in the amity system
         staff(dict): This is a dict of all IDs of staff in the amity system
-        unallocated(list): This a list of all unallocated people
-        allocated(list): List of all allocated people
+        unallocated(list): people who have no room at all, derived from the waitlists
+        waitlists(dict): OrderedDict of the IDs waiting for a room of every room type, first come first
+        room_capacity(dict): maximum number of occupants of every room
+        strategy(str): name of the allocation strategy (random|least-loaded|pack-first)
+        vacancies(dict): AllocationStrategy holding the rooms with free space for each room type
+        person_rooms(dict): the office and living space of every allocated person
+        names(NameIndex): index of the names of all the people in the amity system
+        ids(IdAllocator): hands out the id numbers of new people
+        occupancy(Occupancy): counters of the rooms, seats and people kept up to date on every change
+        dirty_people(set): IDs of the people added since the last save_state
+        dirty_rooms(set): names of the rooms created or whose occupants changed since the last save_state
+        saved_to(str): path of the database the state was last saved to or loaded from
+        saved_waitlists(dict): number of IDs at the head of every waitlist already in that database
+        saved_rooms(int): number of rooms at the head of rooms already in that database
+        store(LazyStore|Snapshot): the database or snapshot people and rooms are read from when the
+                                   state was loaded lazily
+        events(EventLog): the allocations and other events for the caller to show, see amity.events
+        verbose(bool): whether allocations are logged as they happen, a view of the level of events
+        load_errors(list): (line_no, reason) of the lines skipped by the last load_people
+        stats(Stats): call counts and latencies of the public methods, None while statistics are off
+        thread_safe(bool): whether the instance can be used from many threads at once
+        people_lock: guards the people and their ids in thread safe mode
+        type_locks(dict): guards the vacancy pool and the waitlist of every room type in thread safe mode
+        room_locks(RoomLocks): guards the occupants of every room in thread safe mode
+        journal(Journal): the journal every change is appended to, None while journaling is off
+        journal_database(str): name of the database the journal belongs to
+        journal_lock: keeps save_state and the compaction of the journal from running at once
+        compact_every(int): number of changes in the journal after which it is compacted in the background
 
     """
-    def __init__(self):
+    def __init__(self, strategy="random", thread_safe=False):
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown allocation strategy: " + str(strategy))
         self.rooms = []
+        self.room_names = set()
         self.offices = {}
         self.accommodations = {}
         self.employees = {}
         self.fellows = {}
         self.staff = {}
-        self.unallocated = []
-        self.allocated = []
+        self.waitlists = {"office": OrderedDict(), "livingspace": OrderedDict()}
+        self.room_capacity = {}
+        self.strategy = strategy
+        self.vacancies = {"office": STRATEGIES[strategy](), "livingspace": STRATEGIES[strategy]()}
+        self.person_rooms = {}
+        self.names = NameIndex()
+        self.ids = IdAllocator()
+        self.occupancy = Occupancy()
+        self.dirty_people = set()
+        self.dirty_rooms = set()
+        self.saved_to = None
+        self.saved_waitlists = {"office": 0, "livingspace": 0}
+        self.saved_rooms = 0
+        self.store = None
+        self.events = EventLog()
+        self.load_errors = []
+        self.stats = None
+        if os.environ.get("AMITY_STATS", "") not in ("", "0"):
+            self.enable_stats()
+        self.thread_safe = False
+        self.people_lock = NO_LOCK
+        self.type_locks = {"office": NO_LOCK, "livingspace": NO_LOCK}
+        self.room_locks = RoomLocks()
+        self.journal = None
+        self.journal_database = None
+        self.journal_lock = threading.Lock()
+        self.compact_every = 100000
+        if thread_safe:
+            self.make_thread_safe()
 
+    def make_thread_safe(self):
+        """
+        Turns on the locks that make the instance safe to use from many threads at
+        once. Has to be called before other threads start using the instance
+        ________________________________________________________________________
+        """
+        if not self.thread_safe:
+            self.people_lock = threading.RLock()
+            self.type_locks = {"office": threading.RLock(), "livingspace": threading.RLock()}
+            self.room_locks.enabled = True
+            self.thread_safe = True
+
+    def lock_all(self):
+        """
+        :return: context manager holding the people lock and the locks of both room types,
+                 which keeps every other thread from changing the state
+        """
+        if not self.thread_safe:
+            return NO_LOCK
+        return AllOf([self.people_lock, self.type_locks["office"], self.type_locks["livingspace"]])
+
+    @property
+    def verbose(self):
+        return self.events.level <= INFO
+
+    @verbose.setter
+    def verbose(self, verbose):
+        self.events.level = INFO if verbose else QUIET
+
+    @property
+    def unallocated(self):
+        """
+        :return: IDs of the people waiting for an office who have no living space either
+        """
+        return [id_no for id_no in self.waitlists["office"]
+                if "livingspace" not in self.person_rooms.get(id_no, ())]
+
+    @exclusive
+    @hydrated
     def create_room(self, room_list, room_type):
         """
-        create rooms in amity that are either of type offices or accommodations
+        create rooms in amity that are either of type offices or accommodations.
+        The people waiting for a room of the type are then placed in the new space
         ________________________________________________________________________
         :param room_list: the unique list of room names
         :param room_type:
         :return: success message
         """
-        zero = 0
         total_rooms = len(self.rooms)
-        for name in room_list:
-            if name in self.rooms:
-                name_index = self.rooms.index(name)
-                self.rooms.pop(name_index)
-                msg = "\nThe room " + name + " already exists cannot create duplicate rooms\n"
-                print(msg)
-        if len(room_list) is not zero:
-            if room_type == "office":
-                if "OFFICE" in room_list:
-                    return "to specify the type of room use --o for type office, --ls for livingspace"
-                for room_name in room_list:
-                    new_office = Office(room_name)
-                    self.rooms.append(new_office.room_name)
-                    self.offices[new_office.room_name] = []
-                new_total_rooms = len(self.rooms)
-                if new_total_rooms-total_rooms > 1:
-                    return str(new_total_rooms-total_rooms) + " offices have been successfully created"
-                else:
-                    return " The office has been created successfully!"
-
-            elif room_type == "livingspace":
-                if "LIVINGSPACE" in room_list:
-                    return "to specify the type of room use --o for type office, --ls for livingspace"
-                for room_name in room_list:
-                    new_accommodation = LivingSpace(room_name)
-                    self.rooms.append(new_accommodation.room_name)
-                    self.accommodations[new_accommodation.room_name] = []
-                new_total_rooms = len(self.rooms)
-                if new_total_rooms - total_rooms > 1:
-                    return str(new_total_rooms - total_rooms) + " living spaces have been successfully created"
-                else:
-                    return "The living space has been created successfully!"
+        msg = self.add_rooms(room_list, room_type)
+        if len(self.rooms) > total_rooms:
+            placed = self.drain("livingspace" if room_type == "livingspace" else "office")
+            if placed:
+                msg += "\n" + str(len(placed)) + " people on the waitlist have been placed in the new rooms"
+        return msg
+
+    def add_rooms(self, room_list, room_type):
+        """
+        Creates the rooms without placing the people on the waitlists
+        ________________________________________________________________________
+        :param room_list: the unique list of room names
+        :param room_type: office or livingspace, anything else creates offices
+        :return: success message and a line for every room that already exists
+        """
+        if not room_list:
+            return None
+        room_type = "livingspace" if room_type == "livingspace" else "office"
+        if room_type.upper() in room_list:
+            return Failed("to specify the type of room use --o for type office, --ls for livingspace")
+        created = 0
+        msg = ""
+        for room_name in room_list:
+            if self.register_room(room_name, room_type):
+                created += 1
             else:
-                for room_name in room_list:
-                    new_office = Office(room_name)
-                    self.rooms.append(new_office.room_name)
-                    self.offices[new_office.room_name] = []
-                new_total_rooms = len(self.rooms)
-                if new_total_rooms-total_rooms > 1:
-                    return str(new_total_rooms-total_rooms) + " offices have been successfully created"
+                msg += "\nThe room " + room_name + " already exists cannot create duplicate rooms\n"
+        if created > 1:
+            label = " offices" if room_type == "office" else " living spaces"
+            return str(created) + label + " have been successfully created" + msg
+        if created == 1:
+            if room_type == "office":
+                return " The office has been created successfully!" + msg
+            return "The living space has been created successfully!" + msg
+        return msg
+
+    def register_room(self, room_name, room_type, capacity=None):
+        """
+        Adds a room to the room registry, unless a room with the name already exists.
+        Checking the name against the room_names set takes constant time
+        ________________________________________________________________________
+        :param room_name: name of the room
+        :param room_type: office or livingspace
+        :param capacity: maximum number of occupants, the default of the room type when None
+        :return: whether the room was created
+        """
+        if room_name in self.room_names:
+            return False
+        room_class = LivingSpace if room_type == "livingspace" else Office
+        room = room_class(room_name) if capacity is None else room_class(room_name, capacity)
+        self.room_names.add(room.room_name)
+        self.rooms.append(room.room_name)
+        self.dirty_rooms.add(room.room_name)
+        if room_type == "livingspace":
+            self.accommodations[room.room_name] = set()
+        else:
+            self.offices[room.room_name] = set()
+        self.room_capacity[room.room_name] = room.capacity
+        self.update_vacancy(room.room_type, room.room_name)
+        self.occupancy.add_room(room.room_type, room.capacity)
+        if self.journal is not None:
+            self.journal.append("room", room.room_name, room.room_type, room.capacity)
+        return True
+
+    @exclusive
+    @hydrated
+    def load_rooms(self, textfile):
+        """
+        Creates the rooms of a room manifest in data/input. The manifest is streamed
+        one line at a time, every line has the name, type and optionally the capacity
+        of a room. Lines that cannot be parsed and rooms that already exist are
+        skipped and listed in the summary, then the waitlists are drained once
+        ____________________________________________________________________________________
+        :param textfile: name of the manifest in data/input
+        :return: summary of the rooms created, the duplicates and the lines skipped
+        """
+        path = data_path('input/' + textfile)
+        if not os.path.exists(path):
+            return Failed("The file does not exist!")
+        created = {"office": 0, "livingspace": 0}
+        duplicates = []
+        self.load_errors = []
+        start = time.time()
+        with open(path, 'r') as manifest:
+            for line_no, room, error in iter_rooms(manifest):
+                if error is not None:
+                    self.load_errors.append((line_no, error))
+                elif self.register_room(*room):
+                    created[room[1]] += 1
                 else:
-                    return " The office has been created successfully!"
+                    duplicates.append((line_no, room[0]))
+        placed = sum(len(self.drain(room_type)) for room_type in created if created[room_type])
+        elapsed = time.time() - start
+        output = "{} offices and {} living spaces created, {} duplicates and {} lines skipped in {:.2f}s\n".format(
+            created["office"], created["livingspace"], len(duplicates), len(self.load_errors), elapsed)
+        if placed:
+            output += "{} people on the waitlist have been placed in the new rooms\n".format(placed)
+        for line_no, room_name in duplicates[:10]:
+            output += "line {}: the room {} already exists\n".format(line_no, room_name)
+        if len(duplicates) > 10:
+            output += "... {} more duplicates\n".format(len(duplicates) - 10)
+        for line_no, error in self.load_errors[:10]:
+            output += "line {}: {}\n".format(line_no, error)
+        if len(self.load_errors) > 10:
+            output += "... {} more\n".format(len(self.load_errors) - 10)
+        return output
 
-    def add_person(self, role, name, accommodate="N"):
+    @hydrated
+    def add_person(self, role, name, accommodate="N", id_no=None):
         """
         adds people to amity that are either fellows or staff and the person has
         a choice to either want accommodation or not
@@ -109,131 +331,394 @@ class Amity(object):
         :param name: name of the person to be added to system
         :param role: role of the person in Andela (fellow|staff)
         :param accommodate: Y or N
+        :param id_no: id number reserved for the person, a new one is used by default
         :return: success messages that person added successfully, added to office
                  successfully, and added to living space successfully
         """
-        self.allocated = False
-        if role.upper() == "FELLOW":
-            msg = ""
-            new_fellow = Fellow(name)
-            new_id_no = new_fellow.id_no
-            self.employees[new_id_no] = new_fellow.name
-            self.fellows[new_id_no] = new_fellow.name
-            self.allocate_office(new_id_no)
-
-            if accommodate == "Y":
-                self.allocate_accommodation(new_id_no)
+        role = role.upper()
+        if role not in ("FELLOW", "STAFF"):
+            return Failed("Please specify the persons role\n")
+        with self.people_lock:
+            if id_no is None:
+                id_no = self.ids.next_id()
+            elif id_no in self.employees:
+                return Failed("error!!! the id " + id_no + " is already in use\n")
+            person = self.register_person(id_no, name, role.lower())
 
-            if not self.allocated:
-                self.unallocated.append(new_id_no)
-                msg += "added to unallocated list\n"
-
-            if new_id_no in self.employees.keys() and self.fellows.keys():
-                msg += "The fellow " + new_fellow.name + " has been added successfully to the system\n"
-            else:
-                msg = "error!!! person not add properly\n"
-            return msg
-
-        elif role.upper() == "STAFF":
-            msg = ""
-            new_staff = Staff(name)
-            new_id_no = new_staff.id_no
-            self.employees[new_id_no] = new_staff.name
-            self.staff[new_id_no] = new_staff.name
-            self.allocate_office(new_id_no)
-
-            if accommodate == "Y":  # check that amity does not allocate staff accommodation
+        msg = ""
+        office = self.allocate_office(id_no)
+        if office is None:
+            self.wait_for("office", id_no)
+        allocated = office
+        if accommodate == "Y":
+            if role == "FELLOW":
+                living_space = self.allocate_accommodation(id_no)
+                if living_space is None:
+                    self.wait_for("livingspace", id_no)
+                allocated = living_space or allocated
+            else:  # check that amity does not allocate staff accommodation
                 msg += "staff can not be allocated accommodation\n"
+        if not allocated:
+            msg += "added to unallocated list\n" if role == "FELLOW" else "add to unallocated list\n"
+        msg += "The " + role.lower() + " " + person.name + " has been added successfully to the system\n"
+        return msg
 
-            if not self.allocated:
-                self.unallocated.append(new_id_no)
-                msg += "add to unallocated list\n"
-
-            if new_id_no in self.employees.keys() and self.staff.keys():
-                msg += "The staff " + new_staff.name + " has been added successfully to the system\n"
-            else:
-                msg = "error!!! person not add properly\n"
-            return msg
-
+    def register_person(self, id_no, name, role):
+        """
+        Adds a person to the people registry without allocating them a room.
+        The caller holds the people lock
+        __________________________________________________________________________
+        :param id_no: id number of the person
+        :param name: name of the person
+        :param role: fellow or staff
+        :return: the Fellow or Staff
+        """
+        if role == "fellow":
+            person = Fellow(name, id_no)
+            self.fellows[id_no] = person.name
         else:
-            return "Please specify the persons role\n"
+            person = Staff(name, id_no)
+            self.staff[id_no] = person.name
+        self.employees[id_no] = person.name
+        self.names.add(person.name, id_no)
+        self.dirty_people.add(id_no)
+        self.occupancy.add_person(role)
+        if self.journal is not None:
+            self.journal.append("person", id_no, person.name, role)
+        return person
+
+    @hydrated
+    def add_people_concurrently(self, people, workers=8):
+        """
+        Adds many people at once from a pool of threads, as a web service serving
+        allocations from many threads would. Turns on thread safety first
+        __________________________________________________________________________
+        :param people: iterable of (role, name, accommodate) tuples
+        :param workers: number of threads
+        :return: list of the messages of add_person in the order of people
+        """
+        from multiprocessing.pool import ThreadPool
+        self.make_thread_safe()
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(lambda person: self.add_person(*person), list(people))
+        finally:
+            pool.close()
+            pool.join()
 
     def allocate_office(self, new_id_no):
         """
         Allocates office to staff and fellows
         _______________________________________________________
         :param new_id_no: id number of the person
-        :return: success or failure message
+        :return: name of the office or None when no office has space
         """
-        zero = 0
-        if len(self.rooms) is zero:
-            msg = "The system has no available rooms"
-            return msg
-
-        vacant_offices = []
-        for room in self.rooms:
-            if room in self.offices.keys() and len(self.offices[room]) < 6:
-                vacant_offices.append(room)
-        if len(vacant_offices) == 0:
-            print("The system has no available office space")
-            if new_id_no in self.unallocated:
-                self.unallocated.append(new_id_no)
-        else:
-            workspace = random.choice(vacant_offices)
-            self.offices[workspace].append(new_id_no)
-            self.allocated = True
-            if new_id_no in self.offices[workspace]:
-                print(self.employees[new_id_no] + " has successfully been allocated the office: " + workspace)
+        return self.allocate("office", new_id_no)
 
     def allocate_accommodation(self, new_id_no):
         """
         Allocates random living space to fellows only
         ______________________________________________________________________________
         :param new_id_no: id number of fellow being allocated:
-        :return: success or failure message
+        :return: name of the living space or None when no living space has space
+        """
+        return self.allocate("livingspace", new_id_no)
+
+    def allocate(self, room_type, id_no):
         """
-        zero = 0
-        if len(self.rooms) is zero:
-            msg = "The system has no available rooms"
-            return msg
-
-        vacant_accommodation = []
-        for room in self.rooms:
-            if room in self.accommodations.keys() and len(self.accommodations[room]) < 4:
-                vacant_accommodation.append(room)
-        if len(vacant_accommodation) == 0:
-            print("The system has no available accommodations")
-            if new_id_no in self.unallocated:
-                self.unallocated.append(new_id_no)
+        Puts a person in a room of the type picked by the allocation strategy.
+        Picking the room and taking a place in it happen under the lock of the
+        room type, so two threads never take the last place in a room
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param id_no: id number of the person
+        :return: name of the room or None when no room of the type has space
+        """
+        if not self.rooms:
+            return None
+        if not self.thread_safe:
+            room_name = self.vacancies[room_type].choice()
+            if room_name is not None:
+                self.move(room_type, id_no, room_name)
         else:
-            workspace = random.choice(vacant_accommodation)
-            self.accommodations[workspace].append(new_id_no)
-            self.allocated = True
-            if new_id_no in self.accommodations[workspace]:
-                print(self.employees[new_id_no] + " has successfully been allocated the living space: " + workspace)
+            with self.type_locks[room_type]:
+                room_name = self.vacancies[room_type].choice()
+                if room_name is not None:
+                    self.move(room_type, id_no, room_name)
+        events = self.events
+        if room_name is None:
+            if events.level <= WARNING:
+                events.log(WARNING, "no_vacancy", room_type)
+        elif events.level <= INFO:
+            events.log(INFO, "allocated", self.employees[id_no], room_type, room_name)
+        return room_name
+
+    def move(self, room_type, id_no, room_name):
+        """
+        Puts a person in a room, taking them out of the room of the same type
+        they were in before. Uses the person -> rooms index so it takes
+        constant time. The caller holds the lock of the room type
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param id_no: id number of the person
+        :param room_name: name of the room the person is moved to
+        """
+        rooms = self.offices if room_type == "office" else self.accommodations
+        person_rooms = self.person_rooms.setdefault(id_no, {})
+        old_room = person_rooms.get(room_type)
+        if not self.thread_safe:
+            return self.swap_rooms(rooms, room_type, id_no, old_room, room_name)
+        with self.room_locks.hold(old_room, room_name):
+            self.swap_rooms(rooms, room_type, id_no, old_room, room_name)
+
+    def swap_rooms(self, rooms, room_type, id_no, old_room, room_name):
+        if id_no in self.waitlists[room_type]:
+            self.leave_waitlist(room_type, id_no)
+        if old_room is not None:
+            rooms[old_room].discard(id_no)
+            occupants = len(rooms[old_room])
+            self.occupancy.change(room_type, self.room_capacity[old_room], occupants + 1, occupants)
+            self.update_vacancy(room_type, old_room)
+            self.dirty_rooms.add(old_room)
+        else:
+            self.occupancy.allocate(room_type, "fellow" if id_no in self.fellows else "staff")
+        rooms[room_name].add(id_no)
+        occupants = len(rooms[room_name])
+        self.occupancy.change(room_type, self.room_capacity[room_name], occupants - 1, occupants)
+        self.dirty_rooms.add(room_name)
+        self.person_rooms[id_no][room_type] = room_name
+        self.update_vacancy(room_type, room_name)
+        if self.journal is not None:
+            self.journal.append("move", id_no, room_type, room_name)
+
+    def wait_for(self, room_type, id_no):
+        """
+        Puts a person at the end of the waitlist of a room type
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param id_no: id number of the person
+        """
+        with self.type_locks[room_type]:
+            self.waitlists[room_type][id_no] = None
+            if self.journal is not None:
+                self.journal.append("wait", room_type, id_no)
+
+    def leave_waitlist(self, room_type, id_no):
+        """
+        Takes a person off the waitlist of a room type. The waitlist is written
+        again from the start on the next save_state since the people behind them
+        move up. The caller holds the lock of the room type
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param id_no: id number of the person
+        """
+        del self.waitlists[room_type][id_no]
+        self.saved_waitlists[room_type] = 0
+
+    def drain(self, room_type, dry_run=False):
+        """
+        Places the people waiting for a room of a type, first come first, until the
+        waitlist is empty or no room of the type has space left. Every step takes
+        the head of the waitlist and the room picked by the allocation strategy,
+        so the pass is linear in the people placed
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param dry_run: whether to only work out who would be placed without moving anybody
+        :return: list of (id_no, room name) of the people placed, the room is None in a dry run
+        """
+        waitlist = self.waitlists[room_type]
+        placed = []
+        if dry_run:
+            rooms = self.offices if room_type == "office" else self.accommodations
+            free = sum(self.room_capacity[name] - len(occupants) for name, occupants in rooms.items()
+                       if len(occupants) < self.room_capacity[name])
+            for id_no in waitlist:
+                if len(placed) == free:
+                    break
+                placed.append((id_no, None))
+            return placed
+        with self.type_locks[room_type]:
+            while waitlist:
+                room_name = self.vacancies[room_type].choice()
+                if room_name is None:
+                    break
+                id_no = next(iter(waitlist))
+                self.move(room_type, id_no, room_name)
+                placed.append((id_no, room_name))
+        return placed
+
+    @exclusive
+    @hydrated
+    def drain_unallocated(self, dry_run=False):
+        """
+        Places the people on the office and living space waitlists in the rooms
+        that have space, first come first
+        ______________________________________________________________________________
+        :param dry_run: whether to only report who would be placed
+        :return: one line for every person placed and the number still waiting
+        """
+        output = []
+        for room_type, label in (("office", "an office"), ("livingspace", "a living space")):
+            placed = self.drain(room_type, dry_run)
+            for id_no, room_name in placed:
+                if dry_run:
+                    output.append(self.employees[id_no] + " would get " + label)
+                else:
+                    output.append(self.employees[id_no] + " has been placed in: " + room_name)
+            output.append("{} {} {}, {} still waiting".format(
+                len(placed), "would get" if dry_run else "got", label,
+                len(self.waitlists[room_type]) - (len(placed) if dry_run else 0)))
+        return "\n".join(output)
+
+    def update_vacancy(self, room_type, room_name):
+        """
+        Adds the room to or removes it from the vacancy pool of its type
+        depending on whether it still has free space
+        ______________________________________________________________________________
+        :param room_type: office or livingspace
+        :param room_name: name of the room whose occupants have changed
+        """
+        if room_type == "livingspace":
+            occupants = self.accommodations[room_name]
+            capacity = self.room_capacity.get(room_name, 4)
+        else:
+            occupants = self.offices[room_name]
+            capacity = self.room_capacity.get(room_name, 6)
+        self.vacancies[room_type].update(room_name, len(occupants), capacity)
+
+    def rebuild_vacancies(self):
+        """
+        Rebuilds the vacancy pools from the offices and accommodations, used
+        after the whole state has been replaced or the strategy has changed
+        ______________________________________________________________________________
+        """
+        self.vacancies = {"office": STRATEGIES[self.strategy](), "livingspace": STRATEGIES[self.strategy]()}
+        for room_name in self.rooms:
+            if room_name in self.offices:
+                self.room_capacity.setdefault(room_name, Office(room_name).capacity)
+                self.update_vacancy("office", room_name)
+            if room_name in self.accommodations:
+                self.room_capacity.setdefault(room_name, LivingSpace(room_name).capacity)
+                self.update_vacancy("livingspace", room_name)
+
+    def rebuild_occupancy(self):
+        """
+        Counts the rooms, seats and people again after the whole state has been
+        replaced
+        ______________________________________________________________________________
+        """
+        occupancy = Occupancy()
+        occupancy.people = {"fellow": len(self.fellows), "staff": len(self.staff)}
+        for room_type, rooms in (("office", self.offices), ("livingspace", self.accommodations)):
+            for room_name, occupants in rooms.items():
+                occupancy.add_room(room_type, self.room_capacity[room_name], len(occupants))
+        for id_no, rooms in self.person_rooms.items():
+            for room_type in rooms:
+                occupancy.allocate(room_type, "fellow" if id_no in self.fellows else "staff")
+        self.occupancy = occupancy
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds the name index and the person -> rooms index after the whole
+        state has been replaced
+        ______________________________________________________________________________
+        """
+        self.names = NameIndex()
+        for id_no, name in self.employees.items():
+            self.names.add(name, id_no)
+        self.person_rooms = {}
+        for room_type, rooms in (("office", self.offices), ("livingspace", self.accommodations)):
+            for room_name, occupants in rooms.items():
+                for id_no in occupants:
+                    self.person_rooms.setdefault(id_no, {})[room_type] = room_name
+
+    @exclusive
+    @hydrated
+    def set_strategy(self, strategy):
+        """
+        Changes the way amity picks rooms for the people it allocates
+        ______________________________________________________________________________
+        :param strategy: random, least-loaded or pack-first
+        :return: success or failure message
+        """
+        if strategy not in STRATEGIES:
+            return Failed("Unknown allocation strategy " + strategy + ", use one of: " +
+                          ", ".join(sorted(STRATEGIES)))
+        self.strategy = strategy
+        self.rebuild_vacancies()
+        return "Rooms will now be allocated using the " + strategy + " strategy"
 
     def get_person_id(self, search_name):
         """
-        The function receive a search name and prints out the id number of person
+        The function receive a search name and prints out the id number of person,
+        one line for every person with the name
         ___________________________________________________________
         :param search_name: Name of person you want to get the id
         :return: prints out id_no of the person being searched
         """
-        if search_name not in list(self.employees.values()):
-            return "The person is not in system"
+        if self.store is not None:
+            found = self.store.find(search_name)
         else:
-            for id_no, name in self.employees.items():
-                if name == search_name:
-                    output = "ID: "
-                    output += id_no
-                    if id_no in self.fellows.keys():
-                        output += " ROLE: FELLOW "
-                        output += "NAME: " + self.employees[id_no]
-                    if id_no in  self.staff.keys():
-                        output += " ROLE: STAFF "
-                        output += "NAME: " + self.employees[id_no]
-                    return output
+            found = [(id_no, self.employees[id_no], "fellow" if id_no in self.fellows else "staff")
+                     for id_no in self.names.exact(search_name)]
+        if not found:
+            return "The person is not in system"
+        output = []
+        for id_no, name, role in found:
+            output.append("ID: " + id_no + " ROLE: " + role.upper() + " NAME: " + name)
+        return "\n".join(output)
+
+    @hydrated
+    def search_people(self, query, mode="exact", limit=20):
+        """
+        Searches people by name using the name index
+        ___________________________________________________________
+        :param query: the full name, the start of the name or a misspelt name
+        :param mode: exact, prefix or fuzzy
+        :param limit: maximum number of people returned
+        :return: list of dicts with the id_no, name, role, office and livingspace
+        """
+        # prefix and fuzzy queries merge the pending names and build the word
+        # index, register_person adds names under the people lock
+        with self.people_lock:
+            if mode == "prefix":
+                found = self.names.prefix(query, limit)
+            elif mode == "fuzzy":
+                found = self.names.fuzzy(query, limit)
+            else:
+                found = self.names.exact(query)[:limit]
+        people = []
+        for id_no in found:
+            rooms = self.person_rooms.get(id_no, {})
+            people.append({"id_no": id_no,
+                           "name": self.employees[id_no],
+                           "role": "fellow" if id_no in self.fellows else "staff",
+                           "office": rooms.get("office"),
+                           "livingspace": rooms.get("livingspace")})
+        return people
+
+    @hydrated
+    def find_person(self, query, mode="exact", limit=20):
+        """
+        Finds all the people matching a name and prints their role and rooms
+        ___________________________________________________________
+        :param query: the full name, the start of the name or a misspelt name
+        :param mode: exact, prefix or fuzzy
+        :param limit: maximum number of people printed
+        :return: one line for every person found
+        """
+        people = self.search_people(query, mode, limit)
+        if not people:
+            return "No person matching " + query.upper() + " in system"
+        output = []
+        for person in people:
+            output.append("ID: " + person["id_no"] + " ROLE: " + person["role"].upper() +
+                          " NAME: " + person["name"] +
+                          " OFFICE: " + (person["office"] or "-") +
+                          " LIVING SPACE: " + (person["livingspace"] or "-"))
+        return "\n".join(output)
 
+    @hydrated
     def reallocate_person(self, id_no, room_name):
         """
         Reallocates person use the person id number from a certain room to another room
@@ -242,281 +727,750 @@ class Amity(object):
         :param room_name: name of the room person to be relocated to
         :return: Success message that person has be successfully reallocate
         """
-        vacant_room = []
         new_room = room_name.upper()
-        if new_room not in self.rooms:
-            return "The room " + new_room + " does not exist in amity"
-        if new_room in self.accommodations.keys() and len(self.accommodations[new_room]) < 4:
-            vacant_room.append(new_room)
-        elif new_room in self.offices.keys() and len(self.offices[new_room]) < 6:
-            vacant_room.append(new_room)
-        for room in vacant_room:
-            if id_no in self.offices[room]:
-                return "The person is already allocated to the room"
-            if id_no in self.staff.keys():
-                if room in self.accommodations.keys():
-                    return "Staff can not be allocated a living space"
-                else:
-                    for saved_room, saved_id_no in self.offices.items():
-                        for item in self.offices[saved_room]:
-                            if item == id_no:
-                                self.offices[saved_room].remove(item)
-                    if id_no not in self.offices[room]:
-                        self.offices[room].append(id_no)
-                    else:
-                        return "The person is already allocated to the room"
-                    if id_no in self.offices[room]:
-                        return self.employees[id_no] + " has been successfully moved to: " + room
-            if id_no in self.fellows.keys():
-                if room in self.accommodations.keys():
-                    if id_no in self.accommodations[room]:
-                        return "The person is already allocated to the room"
-                    for saved_room, saved_id_no in self.accommodations.items():
-                        for item in self.accommodations[saved_room]:
-                            if item == id_no:
-                                self.accommodations[saved_room].remove(item)
-                    if id_no not in self.accommodations[room]:
-                        self.accommodations[room].append(id_no)
-                    else:
-                        return "The person is already allocated to the room"
-                    if id_no in self.accommodations[room]:
-                        print(self.employees[id_no] + " has been successfully moved to: " + room)
-                else:
-                    for saved_room, saved_id_no in self.offices.items():
-                        for item in self.offices[saved_room]:
-                            if item == id_no:
-                                self.offices[saved_room].remove(item)
-                    self.offices[room].append(id_no)
-                    if id_no in self.offices[room]:
-                        print(self.employees[id_no] + " has been successfully moved to: " + room)
+        error = self.try_move(id_no, new_room)
+        if error is not None:
+            return Failed(error)
+        return self.employees[id_no] + " has been successfully moved to: " + new_room
+
+    def try_move(self, id_no, new_room):
+        """
+        Checks and makes a move under the lock of the room type, so the room
+        cannot fill up in between
+        ______________________________________________________________________________
+        :param id_no: unique identifier for the person to be reallocated
+        :param new_room: upper case name of the room
+        :return: None when the person was moved otherwise the error message
+        """
+        if not self.thread_safe:
+            room_type, error = self.check_reallocation(id_no, new_room)
+            if error is None:
+                self.move(room_type, id_no, new_room)
+            return error
+        room_type = "livingspace" if new_room in self.accommodations else "office"
+        with self.type_locks[room_type]:
+            room_type, error = self.check_reallocation(id_no, new_room)
+            if error is None:
+                self.move(room_type, id_no, new_room)
+        return error
+
+    def check_reallocation(self, id_no, new_room):
+        """
+        Checks whether a person can be moved to a room
+        ______________________________________________________________________________
+        :param id_no: unique identifier for the person to be reallocated
+        :param new_room: upper case name of the room
+        :return: (room_type, None) when the move is possible otherwise (None, error message)
+        """
+        if new_room not in self.room_capacity:
+            return None, "The room " + new_room + " does not exist in amity"
+        if id_no not in self.employees:
+            return None, "The person with id " + id_no + " is not in system"
+        if new_room in self.accommodations:
+            room_type = "livingspace"
+            occupants = self.accommodations[new_room]
+            if id_no in self.staff:
+                return None, "Staff can not be allocated a living space"
+        else:
+            room_type = "office"
+            occupants = self.offices[new_room]
+        if id_no in occupants:
+            return None, "The person is already allocated to the room"
+        if len(occupants) >= self.room_capacity[new_room]:
+            return None, "The room " + new_room + " is full"
+        return room_type, None
+
+    @hydrated
+    def reallocate_many(self, plan_file):
+        """
+        Applies a file of moves in one pass. Every line of the file has the id
+        number of a person and the room they should be moved to
+        ______________________________________________________________________________
+        :param plan_file: name of the file in data/input
+        :return: summary of the moves made and the moves that failed
+        """
+        if not os.path.exists(data_path('input/' + plan_file)):
+            return Failed("The file does not exist!")
+        moved = 0
+        failed = []
+        with open(data_path('input/' + plan_file), 'r') as plan:
+            for line_no, line in enumerate(plan, 1):
+                details = line.split()
+                if not details:
+                    continue
+                if len(details) != 2:
+                    failed.append((line_no, "expected <id_no> <room_name>"))
+                    continue
+                error = self.try_move(details[0], details[1].upper())
+                if error is not None:
+                    failed.append((line_no, error))
+                    continue
+                moved += 1
+        output = "{} people have been successfully moved, {} moves failed\n".format(moved, len(failed))
+        for line_no, error in failed[:10]:
+            output += "line {}: {}\n".format(line_no, error)
+        if len(failed) > 10:
+            output += "... {} more\n".format(len(failed) - 10)
+        return output
 
     def print_room(self, room_name):
         """
         Prints out the members or occupants in the room
         _______________________________________________________________________________
         :param room_name: name of room to print
-        :return: prints a list of all occupants in the room
+        :return: list of all occupants in the room
         """
-        zero = 0
         print_name = room_name.upper()
-        if print_name not in self.rooms:
-            return "There is no room " + print_name + " in system!"
-        if print_name in list(self.offices.keys()) and len(self.offices[print_name]) is zero:
-            return print_name + " is empty!"
-        elif print_name in list(self.accommodations.keys()) and len(self.accommodations[print_name]) is zero:
+        occupants = self.occupants_of(print_name)
+        if occupants is None:
+            return Failed("There is no room " + print_name + " in system!")
+        if len(occupants) == 0:
             return print_name + " is empty!"
+        if self.store is not None:
+            room_type = self.store.room(print_name)[0]
         else:
-            header = "The members of room " + print_name + ":\n"
-            header += "------------------------------------------\n"
-            print(header)
-            if print_name in self.rooms:
-                if print_name in list(self.offices.keys()):
-                    for item in self.offices[print_name]:
-                        print(self.employees[item].upper())
-                elif print_name in self.accommodations.keys():
-                    for item in self.accommodations[print_name]:
-                        print(self.employees[item].upper())
-
-    def load_people(self, textfile):
-        """
-        Load people from a text file to amity
+            room_type = "livingspace" if print_name in self.accommodations else "office"
+        output = reports.StringOut()
+        reports.write_report(output, ((print_name, room_type, id_no, self.name_of(id_no)) for id_no in occupants),
+                             reports.ALLOCATION_COLUMNS, text=reports.room_text)
+        return output.getvalue()
+
+    def occupants_of(self, room_name):
+        """
+        :param room_name: upper case name of the room
+        :return: IDs of the occupants of the room or None when there is no such room
+        """
+        if self.store is not None:
+            room = self.store.room(room_name)
+            return None if room is None else room[2]
+        if room_name not in self.room_capacity:
+            return None
+        occupants = self.offices[room_name] if room_name in self.offices else self.accommodations[room_name]
+        if self.thread_safe:
+            with self.room_locks.lock(room_name):
+                return set(occupants)
+        return occupants
+
+    def name_of(self, id_no):
+        """
+        :param id_no: id number of a person
+        :return: the name of the person
+        """
+        if self.store is not None:
+            return self.store.person(id_no)[0]
+        return self.employees[id_no]
+
+    @hydrated
+    def load_people(self, textfile, processes=None):
+        """
+        Load people from a text file to amity. The file is streamed one line at a
+        time and every person is added as soon as their line is parsed, lines that
+        cannot be parsed are skipped and reported in the summary instead of stopping the load.
+        When textfile is a directory or a glob pattern all the matching files are
+        loaded with load_roster_files
         ____________________________________________________________________________________
-        :param textfile:
-        :return:
+        :param textfile: name of the file, directory or glob pattern in data/input
+        :param processes: number of worker processes used to parse multiple files
+        :return: summary of the people loaded and the lines skipped
         """
         if not isinstance(textfile, str):
             return TypeError("Amity on accepts string as input")
-        elif textfile is not None:
-            if os.path.exists('data/input/' + textfile):
-                with open('data/input/' + textfile, 'r') as file:
-                    people = file.readlines()
-                    for person in people:
-                        person_details = person.split()
-                        role = person_details[0].upper()
-                        name = person_details[1].upper() + " " + person_details[2].upper()
-                        if len(person_details) > 3:
-                            accommodate = person_details[3].upper()
-                        else:
-                            accommodate = "N"
-                        print(self.add_person(role, name, accommodate))
-            else:
-                return "The file does not exist!"
-        return "People have been successfully loaded to amity!"
+        path = data_path('input/' + textfile)
+        if os.path.isdir(path):
+            return self.load_roster_files(sorted(glob.glob(os.path.join(path, '*.txt'))), processes)
+        if glob.has_magic(textfile):
+            return self.load_roster_files(sorted(glob.glob(path)), processes)
+        if not os.path.exists(path):
+            return Failed("The file does not exist!")
+        loaded = 0
+        self.load_errors = []
+        start = time.time()
+        with self.events.quiet(), open(path, 'r') as people:
+            for line_no, person, error in iter_people(people):
+                if error is not None:
+                    self.load_errors.append((line_no, error))
+                    continue
+                self.add_person(*person)
+                loaded += 1
+        return self.load_summary(loaded, time.time() - start)
+
+    @hydrated
+    def load_roster_files(self, paths, processes=None):
+        """
+        Loads several roster files at once. The files are parsed and validated in
+        parallel by a pool of worker processes and the parsed people are then added
+        in one pass in file name and line order, so the result does not depend on
+        which worker finished first
+        ____________________________________________________________________________________
+        :param paths: sorted list of roster file paths
+        :param processes: number of worker processes, defaults to the number of cores
+        :return: summary of the people loaded and the lines skipped
+        """
+        if not paths:
+            return Failed("The file does not exist!")
+        loaded = 0
+        self.load_errors = []
+        start = time.time()
+        tasks = [(path, self.ids.reserve_block(max_people(path))) for path in paths]
+        if self.journal is not None:
+            self.journal.append("ids", self.ids.high_water)
+        if len(paths) == 1 or processes == 1:
+            rosters = [parse_roster_file(task) for task in tasks]
+        else:
+            # imported here so that starting amity does not pay for multiprocessing
+            from multiprocessing import Pool
+            pool = Pool(processes)
+            try:
+                rosters = pool.map(parse_roster_file, tasks, 1)
+            finally:
+                pool.close()
+                pool.join()
+        with self.events.quiet():
+            for path, people, errors in rosters:
+                for line_no, error in errors:
+                    self.load_errors.append((os.path.basename(path) + ":" + str(line_no), error))
+                for id_no, role, name, accommodate in people:
+                    self.add_person(role, name, accommodate, id_no)
+                    loaded += 1
+        return self.load_summary(loaded, time.time() - start)
+
+    def load_summary(self, loaded, elapsed):
+        """
+        Builds the message printed once a load has finished
+        ____________________________________________________________________________________
+        :param loaded: number of people added
+        :param elapsed: seconds the load took
+        :return: summary message
+        """
+        rate = loaded / elapsed if elapsed > 0 else loaded
+        output = "People have been successfully loaded to amity!\n"
+        output += "{} people loaded, {} lines skipped in {:.2f}s ({:.0f} people/s)\n".format(
+            loaded, len(self.load_errors), elapsed, rate)
+        for line_no, error in self.load_errors[:10]:
+            output += "line {}: {}\n".format(line_no, error)
+        if len(self.load_errors) > 10:
+            output += "... {} more\n".format(len(self.load_errors) - 10)
+        return output
+
+    @exclusive
+    @hydrated
+    def write_allocations(self, out, fmt="text", room_type=None, sort=False):
+        """
+        Streams the list of all people who have been allocated a room to a file handle
+        ___________________________________________________________________________________________________
+        :param out: any object with a write method, e.g. sys.stdout or an open file
+        :param fmt: text, csv or ndjson
+        :param room_type: only rooms of this type (office|livingspace) when given
+        :param sort: whether rooms and people are sorted by name instead of creation order
+        :return: number of people written
+        """
+        return reports.write_report(out, reports.allocation_rows(self, room_type, sort),
+                                    reports.ALLOCATION_COLUMNS, fmt, reports.allocation_text)
+
+    @exclusive
+    @hydrated
+    def write_unallocated(self, out, fmt="text"):
+        """
+        Streams the list of all people who have not been allocated a room to a file handle
+        ___________________________________________________________________________________________________
+        :param out: any object with a write method, e.g. sys.stdout or an open file
+        :param fmt: text, csv or ndjson
+        :return: number of people written
+        """
+        return reports.write_report(out, reports.unallocated_rows(self), reports.UNALLOCATED_COLUMNS, fmt,
+                                    reports.unallocated_text)
 
-    def print_allocations(self, filename=None):
+    def print_allocations(self, filename=None, fmt="text", room_type=None, sort=False):
         """
-        Prints out list of all people who have been allocated a room and save it to an external .txt file
+        Prints out list of all people who have been allocated a room and save it to an external file
         ___________________________________________________________________________________________________
-        :param filename:
-        :return:
-        """
-        occupied_rooms = []
-        output = "ROOM ALLOCATIONS\n"
-        for room in self.rooms:
-            if room in self.accommodations.keys() and len(self.accommodations[room]) is not 0:
-                occupied_rooms.append(room)
-            elif room in self.offices.keys() and len(self.offices[room]) is not 0:
-                occupied_rooms.append(room)
-        if len(occupied_rooms) is 0:
-            output = "There are no occupied rooms in amity!\n"
-        for room_name in occupied_rooms:
-            if room_name in self.accommodations.keys():
-                output += "\n"
-                output += room_name.upper() + "\n"
-                output += "-----------------------------------------------\n"
-                for item in self.accommodations[room_name]:
-                    output += self.employees[item] + "\n"
-            elif room_name in self.offices.keys():
-                output += "\n"
-                output += room_name.upper() + "\n"
-                output += "-----------------------------------------------\n"
-                for item in self.offices[room_name]:
-                    output += self.employees[item] + "\n"
+        :param filename: file in data/output the report is streamed to
+        :param fmt: text, csv or ndjson
+        :param room_type: only rooms of this type (office|livingspace) when given
+        :param sort: whether rooms and people are sorted by name instead of creation order
+        :return: the report, or where it was saved when filename is given
+        """
+        if fmt not in reports.FORMATS:
+            return Failed("Unknown format " + fmt + ", use one of: " + ", ".join(reports.FORMATS))
+        if filename is not None:
+            with self.open_output(filename) as outfile:
+                self.write_allocations(outfile, fmt, room_type, sort)
+            return "\nAllocations saved to: {}\n".format(filename)
+        output = reports.StringOut()
+        self.write_allocations(output, fmt, room_type, sort)
+        return output.getvalue()
 
+    def print_unallocated(self, filename=None, fmt="text"):
+        """
+        Prints out list of all people who have not been allocated a room and save it to an external file
+        ___________________________________________________________________________________________________
+        :param filename: file in data/output the report is streamed to
+        :param fmt: text, csv or ndjson
+        :return: the report, or where it was saved when filename is given
+        """
+        if fmt not in reports.FORMATS:
+            return Failed("Unknown format " + fmt + ", use one of: " + ", ".join(reports.FORMATS))
         if filename is not None:
-            with open('data/output/' + filename, 'w') as outfile:
-                outfile.write(output)
-                return "\nAllocations saved to: {}\n".format(filename)
-        return output
+            with self.open_output(filename) as outfile:
+                self.write_unallocated(outfile, fmt)
+            return "\nUnallocated people saved to: {}\n".format(filename)
+        output = reports.StringOut()
+        self.write_unallocated(output, fmt)
+        return output.getvalue()
+
+    def open_output(self, filename):
+        return open(self.output_path(filename), 'w')
+
+    def output_path(self, filename):
+        """
+        :param filename: name of a file in data/output
+        :return: path of the file, data/output is created when it does not exist
+        """
+        if not os.path.isdir(data_path('output')):
+            os.makedirs(data_path('output'))
+        return data_path('output/' + filename)
 
-    def print_unallocated(self, filename=None):
+    @hydrated
+    def summary(self):
         """
-        Prints out list of all people who have not been allocated a room and save it to an external .txt file
+        The number of rooms, seats, free seats and full, partially filled and empty
+        rooms of every room type, the people waiting for every room type and the
+        people of every role. The counters are kept up to date on every change so
+        this takes constant time however big the facility is
         ___________________________________________________________________________________________________
-        :param filename:
-        :return:
+        :return: dict, see amity.occupancy.Occupancy.summary
         """
-        if len(self.unallocated) is 0:
-            return "\nThere are no unallocated people\n"
-        else:
-            output = "\nUNALLOCATED PEOPLE\n"
-            output += "-------------------------------------\n"
-            for item in self.unallocated:
-                output += self.employees[item] + "\n"
-            if filename is not None:
-                with open('data/output/' + filename, 'w') as outfile:
-                    outfile.write(output)
-                    print("\nAllocations saved to: {}\n".format(filename))
+        return self.occupancy.summary(self.waitlists)
+
+    @hydrated
+    def print_summary(self):
+        """
+        :return: the summary as a table
+        """
+        return self.occupancy.report(self.waitlists)
+
+    def enable_stats(self):
+        """
+        Starts counting the calls and timing every public method of this instance
+        ___________________________________________________________________________________________________
+        :return: success message
+        """
+        if self.stats is None:
+            self.stats = Stats()
+            self.stats.instrument(self, [name for name, value in sorted(vars(Amity).items())
+                                         if callable(value) and not name.startswith("_") and
+                                         name not in STATS_METHODS])
+        return "Statistics are on"
+
+    def disable_stats(self):
+        """
+        Stops timing the methods and forgets the statistics collected so far
+        ___________________________________________________________________________________________________
+        :return: success message
+        """
+        if self.stats is not None:
+            self.stats.remove(self)
+            self.stats = None
+        return "Statistics are off"
+
+    def print_stats(self, reset=False):
+        """
+        The call counts and latencies of the methods called since statistics were turned on
+        ___________________________________________________________________________________________________
+        :param reset: whether to start counting from zero again afterwards
+        :return: the statistics as a table
+        """
+        if self.stats is None:
+            return "Statistics are off, turn them on with stats --on or by setting AMITY_STATS=1"
+        output = self.stats.report()
+        if reset:
+            self.stats.reset()
         return output
 
-    def save_state(self, filename=None):  # work in progress
+    @exclusive
+    @hydrated
+    def save_state(self, filename=None, snapshot=False):
         """
-        save all data in amity to a specified database
+        save all data in amity to a specified database. When the state was last saved
+        to or loaded from the same database only the people, rooms and unallocated
+        people that changed since then are written, otherwise the whole state is
+        written. Either way everything is written in a single transaction.
+        When the database has a journal the journal is folded into the new snapshot.
+        With snapshot True, or when the file already is one, the state is written as
+        a binary snapshot instead, see amity.snapshot
         _____________________________________________________________________________________
-        :param filename:
-        :return:
+        :param filename: name of the database in data/states
+        :param snapshot: whether to write a binary snapshot instead of a SQLite database
+        :return: success message with the number of rows written
         """
-        if filename is not None:
-            database_name = filename
-        self.conn = sqlite3.connect('data/states/' + database_name)
-        self.c = self.conn.cursor()
-        self.c.execute("DROP TABLE IF EXISTS EMPLOYEES")
-        self.c.execute("DROP TABLE IF EXISTS FELLOWS")
-        self.c.execute("DROP TABLE IF EXISTS STAFF")
-        self.c.execute("DROP TABLE IF EXISTS ROOMS")
-        self.c.execute("DROP TABLE IF EXISTS OFFICES")
-        self.c.execute("DROP TABLE IF EXISTS ACCOMMODATIONS")
-        self.c.execute("DROP TABLE IF EXISTS STATE")
-        self.create_db_table(database_name)
-
-        for person_id in self.employees.keys():
-            self.c.execute("INSERT INTO EMPLOYEES(NAME, ID_NO) VALUES(?, ?)", [person_id, self.employees[person_id]])
-        self.conn.commit()
-
-        for person_id in self.fellows.keys():
-            self.c.execute("INSERT INTO FELLOWS(NAME, ID_NO) VALUES(?, ?)", [person_id, self.fellows[person_id]])
-        self.conn.commit()
-
-        for person_id in self.staff.keys():
-            self.c.execute("INSERT INTO STAFF(NAME, ID_NO) VALUES(?, ?)", [person_id, self.staff[person_id]])
-        self.conn.commit()
-
-        for name in self.rooms:
-            self.c.execute("INSERT INTO ROOMS(ROOMNAME) VALUES(?)", [name])
-        self.conn.commit()
-
-        for room_name in self.offices.keys():
-            self.c.execute("INSERT INTO OFFICES(ROOMNAME, OCCUPANTS) \
-                            VALUES(?, ?)", [room_name, str(self.offices[room_name])])
-        self.conn.commit()
-
-        for room_name in self.accommodations.keys():
-            self.c.execute("INSERT INTO ACCOMMODATIONS(ROOMNAME, OCCUPANTS) \
-                              VALUES(?, ?)", [room_name, str(self.accommodations[room_name])])
-        self.conn.commit()
-
-        data = (self.rooms, self.offices, self.employees, self.accommodations,
-                self.fellows, self.staff, self.allocated, self.unallocated)
-        save_data = pickle.dumps(data)
-        appdata = sqlite3.Binary(save_data)
-        self.c.execute("INSERT INTO STATE(State) VALUES(?)", (appdata,))
-        self.conn.commit()
-        return "\nRecords created successfully!\n"
-
-    def create_db_table(self, database_name):
-        """
-        creates a database table
-        ______________________________________________
-        :param database_name: The name of the database that the tables will be create in
-        :return: success message that the tables have been created successfully.
-        """
-        self.conn = sqlite3.connect('data/states/' + database_name)
-        self.c = self.conn.cursor()
+        database_name = filename or 'amity.db'
+        path = data_path('states/' + database_name)
+        if snapshot or (os.path.exists(path) and is_snapshot(path)):
+            rows = write_snapshot(path, self.state_rows())
+            self.mark_saved(path)
+            if self.stats is not None:
+                self.stats.add_rows("written", rows)
+            return "\nSnapshot saved successfully! ({} rows written)\n".format(rows)
+        with self.journal_lock:
+            if self.journal is not None and self.journal.path == path + ".journal":
+                journal_seq, folded = self.journal.rotate()
+            else:
+                # a journal left behind by another session is older than this state
+                journal_seq, folded = 0, [segment for number, segment in segments(path + ".journal")]
+            conn = sqlite3.connect(path)
+            conn.isolation_level = None
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                full = self.saved_to != path or storage.schema_version(conn) != storage.SCHEMA_VERSION
+                conn.execute("BEGIN")
+                try:
+                    if full:
+                        state = self.state_rows()
+                        state["journal_seq"] = journal_seq
+                        rows = storage.write_state(conn, state)
+                    else:
+                        rows = storage.write_people(conn, self.people_rows(self.dirty_people))
+                        # new rooms go in in the order they were created, read_state orders by rowid
+                        new_rooms = self.rooms[self.saved_rooms:]
+                        rows += storage.write_rooms(conn, self.room_rows(new_rooms))
+                        rows += storage.write_rooms(conn, self.room_rows(self.dirty_rooms.difference(new_rooms)))
+                        rows += storage.write_allocations(conn, list(self.dirty_rooms),
+                                                          self.allocation_rows(self.dirty_rooms))
+                        for room_type, waitlist in self.waitlists.items():
+                            rows += storage.write_waitlist(conn, room_type, list(waitlist),
+                                                           self.saved_waitlists[room_type])
+                        storage.write_high_water(conn, self.ids.high_water)
+                        storage.write_journal_seq(conn, journal_seq)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+            remove_segments(folded)
+        self.mark_saved(path)
+        if self.stats is not None:
+            self.stats.add_rows("written", rows)
+        return "\nRecords created successfully! ({} rows written)\n".format(rows)
+
+    def people_rows(self, people):
+        """
+        :param people: IDs of the people
+        :return: (id_no, name, role) rows of the people
+        """
+        return [(id_no, self.employees[id_no], "fellow" if id_no in self.fellows else "staff")
+                for id_no in people]
+
+    def room_rows(self, rooms):
+        """
+        :param rooms: names of the rooms
+        :return: (name, room_type, capacity) rows of the rooms
+        """
+        return [(name, "livingspace" if name in self.accommodations else "office", self.room_capacity[name])
+                for name in rooms]
+
+    def allocation_rows(self, rooms):
+        """
+        :param rooms: names of the rooms
+        :return: (id_no, room_name) rows of all the occupants of the rooms
+        """
+        rows = []
+        for name in rooms:
+            occupants = self.accommodations[name] if name in self.accommodations else self.offices[name]
+            rows.extend((id_no, name) for id_no in occupants)
+        return rows
+
+    def state_rows(self):
+        """
+        :return: the whole state as rows, see amity.storage
+        """
+        return {"people": self.people_rows(self.employees),
+                "rooms": self.room_rows(self.rooms),
+                "allocations": self.allocation_rows(self.rooms),
+                "unallocated": list(self.waitlists["office"]),
+                "livingspace_waitlist": list(self.waitlists["livingspace"]),
+                "high_water": self.ids.high_water}
+
+    def mark_saved(self, path):
+        """
+        Records that the in memory state is the same as the state in a database
+        _____________________________________________________________________________________
+        :param path: path of the database
+        """
+        self.saved_to = path
+        self.saved_waitlists = dict((room_type, len(waitlist)) for room_type, waitlist in self.waitlists.items())
+        self.saved_rooms = len(self.rooms)
+        self.dirty_people = set()
+        self.dirty_rooms = set()
+
+    @exclusive
+    def load_state(self, filename=None, lazy=False, cache_size=10000):
+        """
+        Load application state that was saved in the database. Databases saved by older
+        versions of amity are first migrated to the current schema.
+        When lazy is True nothing is loaded up front, print_room and get_person_id read
+        the rooms and people they need from the database and keep the most recently used
+        ones in memory. Any other method loads the whole state the first time it is called.
+        Binary snapshots are loaded too, lazily they are mapped into memory and read in place
+        ___________________________________________________________________________________________________
+        When the database has a journal its changes are replayed on top of the snapshot,
+        which loads the whole state even when lazy is True, and journaling goes on
+        ___________________________________________________________________________________________________
+        :param filename: name of the database in data/states
+        :param lazy: whether to read rooms and people only when they are needed
+        :param cache_size: number of rooms and of people kept in memory in lazy mode
+        :return: success message
+        """
+        database_name = filename or 'amity.db'
+        path = data_path('states/' + database_name)
+        if not os.path.exists(path):
+            return Failed("The database " + database_name + " does not exist!")
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        self.close_journal()
+        if is_snapshot(path):
+            snapshot = Snapshot(path)
+            if lazy:
+                self.load_rows(storage.empty_state())
+                self.store = snapshot
+            else:
+                try:
+                    self.load_rows(snapshot.read_state())
+                finally:
+                    snapshot.close()
+            self.mark_saved(path)
+            return "\n app data successfully loaded!\n"
+        journal = [segment for number, segment in segments(path + ".journal")]
+        lazy = lazy and not journal
+        conn = sqlite3.connect(path)
+        conn.isolation_level = None
         try:
-            self.c.execute('''CREATE TABLE IF NOT EXISTS EMPLOYEES
-                                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                    NAME           TEXT ,
-                                    ID_NO            TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS FELLOWS
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        NAME           TEXT ,
-                        ID_NO            TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS STAFF
-                                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                    NAME           TEXT ,
-                                    ID_NO            TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS ROOMS
-                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            ROOMNAME           TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS OFFICES
-                                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                        ROOMNAME           TEXT ,
-                                        OCCUPANTS            TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS ACCOMMODATIONS
-                                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                        ROOMNAME           TEXT ,
-                                        OCCUPANTS            TEXT);''')
-
-            self.c.execute('''CREATE TABLE IF NOT EXISTS STATE
-                            (State BLOB);''')
-        except sqlite3.IntegrityError:
-            return False
+            storage.migrate(conn)
+            if not lazy:
+                state = storage.read_state(conn)
+                self.load_rows(state)
+        finally:
+            conn.close()
+        if lazy:
+            self.load_rows(storage.empty_state())
+            self.store = storage.LazyStore(path, cache_size)
+        self.mark_saved(path)
+        if not journal:
+            return "\n app data successfully loaded!\n"
+        # the replayed changes are not in the snapshot, mark_saved first keeps them dirty
+        journal_seq, replayed = self.replay(read_records(journal, state["journal_seq"]), state["journal_seq"])
+        self.open_journal(database_name, journal_seq)
+        return "\n app data successfully loaded!\n {} changes replayed from the journal\n".format(replayed)
 
-    def load_state(self, filename=None):
+    def convert_state(self, source, target):
         """
-        Load application state that was saved in the database
+        Converts a database in data/states to a binary snapshot, or a snapshot to a
+        database, without loading it into this instance
         ___________________________________________________________________________________________________
-        :param filename:
-        :return:
+        :param source: name of the database or snapshot in data/states
+        :param target: name of the snapshot or database to write in data/states
+        :return: success message with the number of rows written
         """
-        if filename is not None:
-            database_name = filename
-        self.conn = sqlite3.connect('data/states/' + database_name)
-        self.c = self.conn.cursor()
-        self.c.execute("SELECT State FROM STATE")
-        data = self.c.fetchone()[0]
-        state = pickle.loads(data)
-        self.rooms = state[0]
-        self.offices = state[1]
-        self.employees = state[2]
-        self.accommodations = state[3]
-        self.fellows = state[4]
-        self.staff = state[5]
-        self.allocated = state[6]
-        self.unallocated = state[7]
-        return "\n app data successfully loaded!\n"
+        source_path = data_path('states/' + source)
+        if not os.path.exists(source_path):
+            return Failed("The database " + source + " does not exist!")
+        rows = convert_state(source_path, data_path('states/' + target))
+        return "\n{} converted to {} ({} rows written)\n".format(source, target, rows)
+
+    def replay(self, records, journal_seq=0):
+        """
+        Applies the changes read from a journal to the state
+        ___________________________________________________________________________________________________
+        :param records: the changes, see amity.journal
+        :param journal_seq: sequence number of the last change already in the state
+        :return: (sequence number of the last change applied, number of changes applied)
+        """
+        replayed = 0
+        for record in records:
+            journal_seq, kind = record[0], record[1]
+            if kind == "room":
+                self.register_room(record[2], record[3], record[4])
+            elif kind == "person":
+                self.register_person(record[2], record[3], record[4])
+                if record[2].isdigit():
+                    self.ids.high_water = max(self.ids.high_water, int(record[2]))
+            elif kind == "move":
+                self.move(record[3], record[2], record[4])
+            elif kind == "wait":
+                self.waitlists[record[2]][record[3]] = None
+            elif kind == "ids":
+                self.ids.high_water = max(self.ids.high_water, record[2])
+            replayed += 1
+        return journal_seq, replayed
+
+    def open_journal(self, database_name, journal_seq=0):
+        """
+        Starts appending every change to the journal of a database
+        ___________________________________________________________________________________________________
+        :param database_name: name of the database in data/states
+        :param journal_seq: sequence number of the last change in the state
+        """
+        self.journal = Journal(data_path('states/' + database_name) + ".journal", journal_seq,
+                               compact_every=self.compact_every, on_full=self.compact_in_background)
+        self.journal_database = database_name
+
+    @exclusive
+    @hydrated
+    def enable_journal(self, filename=None):
+        """
+        Saves the state to a database and appends every change made after that to
+        the journal of the database, a file next to it. Changes are written to the
+        journal in small batches with one fsync each, load_state replays them on top
+        of the last snapshot saved to the database
+        ___________________________________________________________________________________________________
+        :param filename: name of the database in data/states
+        :return: success message
+        """
+        database_name = filename or 'amity.db'
+        path = data_path('states/' + database_name)
+        if os.path.exists(path) and is_snapshot(path):
+            return Failed("The journal needs a SQLite database, " + database_name + " is a snapshot")
+        if self.journal is not None and self.journal_database == database_name:
+            return "The journal of " + database_name + " is already on"
+        self.close_journal()
+        self.save_state(database_name)
+        self.open_journal(database_name)
+        return "Every change is now written to the journal of " + database_name
+
+    @exclusive
+    def disable_journal(self):
+        """
+        Folds the journal into a last snapshot of the state and stops journaling
+        ___________________________________________________________________________________________________
+        :return: success message
+        """
+        if self.journal is None:
+            return "The journal is off"
+        database_name = self.journal_database
+        self.save_state(database_name)
+        path = self.journal.path
+        self.close_journal()
+        remove_segments([segment for number, segment in segments(path)])
+        return "The journal is off, the state was saved to " + database_name
+
+    def close_journal(self):
+        """
+        Writes the changes still queued and stops appending to the journal. The
+        journal stays on disk and is replayed by the next load_state
+        ___________________________________________________________________________________________________
+        """
+        with self.journal_lock:
+            journal = self.journal
+            self.journal = None
+            self.journal_database = None
+            if journal is not None:
+                journal.close()
+
+    def compact_journal(self):
+        """
+        Folds the journal into a fresh snapshot in its database and deletes the
+        folded segments. The snapshot is rebuilt from the database and the journal
+        by another Amity instance, so changes to this one go on meanwhile
+        ___________________________________________________________________________________________________
+        :return: message with the number of changes folded into the snapshot
+        """
+        with self.journal_lock:
+            if self.journal is None:
+                return "The journal is off"
+            journal_seq, folded = self.journal.rotate()
+            path = data_path('states/' + self.journal_database)
+            conn = sqlite3.connect(path)
+            conn.isolation_level = None
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    state = storage.read_state(conn)
+                    replayed = 0
+                    if state["journal_seq"] < journal_seq:
+                        snapshot = Amity(self.strategy)
+                        snapshot.events.level = QUIET
+                        snapshot.load_rows(state)
+                        replayed = snapshot.replay(read_records(folded, state["journal_seq"]))[1]
+                        state = snapshot.state_rows()
+                        state["journal_seq"] = journal_seq
+                        storage.write_state(conn, state)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+            remove_segments(folded)
+            return "{} changes of the journal folded into {}".format(replayed, self.journal_database)
+
+    def compact_in_background(self):
+        """
+        Compacts the journal in a thread of its own, called by the journal once it
+        has compact_every changes
+        ___________________________________________________________________________________________________
+        """
+        compaction = threading.Thread(target=self.compact_journal)
+        compaction.daemon = True
+        compaction.start()
+
+    def hydrate(self):
+        """
+        Loads the whole state of a lazily loaded database into memory
+        ___________________________________________________________________________________________________
+        """
+        with self.lock_all():
+            store = self.store
+            if store is None:
+                return
+            self.store = None
+            try:
+                self.load_rows(store.read_state())
+            finally:
+                store.close()
+            self.mark_saved(store.path)
+
+    def load_rows(self, state):
+        """
+        Replaces the whole in memory state
+        ___________________________________________________________________________________________________
+        :param state: the state as rows, see amity.storage
+        """
+        self.employees = {}
+        self.fellows = {}
+        self.staff = {}
+        for id_no, name, role in state["people"]:
+            self.employees[id_no] = name
+            if role == "fellow":
+                self.fellows[id_no] = name
+            else:
+                self.staff[id_no] = name
+        self.rooms = []
+        self.offices = {}
+        self.accommodations = {}
+        self.room_capacity = {}
+        for name, room_type, capacity in state["rooms"]:
+            self.rooms.append(name)
+            self.room_capacity[name] = capacity
+            if room_type == "livingspace":
+                self.accommodations[name] = set()
+            else:
+                self.offices[name] = set()
+        self.room_names = set(self.rooms)
+        for id_no, room_name in state["allocations"]:
+            if room_name in self.accommodations:
+                self.accommodations[room_name].add(id_no)
+            else:
+                self.offices[room_name].add(id_no)
+        self.waitlists = {"office": OrderedDict((id_no, None) for id_no in state["unallocated"]),
+                          "livingspace": OrderedDict((id_no, None) for id_no in
+                                                     state.get("livingspace_waitlist", []))}
+        self.ids = IdAllocator(state.get("high_water", 0))
+        self.rebuild_vacancies()
+        self.rebuild_indexes()
+        self.rebuild_occupancy()
+        if self.stats is not None:
+            self.stats.add_rows("read", len(state["people"]) + len(state["rooms"]) +
+                                len(state["allocations"]) + len(state["unallocated"]) +
+                                len(state.get("livingspace_waitlist", [])))
@@ -0,0 +1,120 @@
+"""
+    events
+    ______________
+    The event log of amity. The core does not print anything, it logs what
+    happens as events and whoever uses amity decides what to show: the CLI
+    prints the events of a command before its result, programs embedding
+    amity read them with drain or turn them off.
+
+    An event is a tuple (level, kind, values) and is only turned into a
+    message when it is rendered, so logging one on the allocation path costs
+    a tuple and an append. Events below the level of the log are not kept at
+    all and the log keeps at most capacity events, dropping the oldest ones,
+    so a log nobody drains does not grow without bound.
+"""
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+QUIET = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "quiet": QUIET}
+
+ROOM_LABELS = {"office": "office", "livingspace": "living space"}
+NO_ROOM_LABELS = {"office": "office space", "livingspace": "accommodations"}
+
+MESSAGES = {
+    "allocated": lambda name, room_type, room_name:
+        name + " has successfully been allocated the " + ROOM_LABELS[room_type] + ": " + room_name,
+    "no_vacancy": lambda room_type: "The system has no available " + NO_ROOM_LABELS[room_type],
+}
+
+
+def render(event):
+    """
+    :param event: (level, kind, values)
+    :return: the message of the event
+    """
+    level, kind, values = event
+    return MESSAGES[kind](*values)
+
+
+class EventLog(object):
+    """
+        Class: EventLog
+        _______________
+        A bounded buffer of the events at or above level. dropped counts the
+        events that did not fit and were dropped
+    """
+    def __init__(self, level=INFO, capacity=10000):
+        self.level = level
+        self.events = deque(maxlen=capacity)
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def log(self, level, kind, *values):
+        """
+        Keeps an event when its level is at or above the level of the log
+        ______________________________________________________
+        :param level: DEBUG, INFO, WARNING or ERROR
+        :param kind: key of the message in MESSAGES
+        :param values: the values the message is made of
+        """
+        if level >= self.level:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append((level, kind, values))
+
+    def set_level(self, level):
+        """
+        :param level: debug, info, warning, error or quiet
+        :return: success message or an error message for an unknown level
+        """
+        if level not in LEVELS:
+            return "Unknown log level " + str(level) + ", use one of: debug, info, warning, error, quiet"
+        self.level = LEVELS[level]
+        return "Log level set to " + level
+
+    def drain(self):
+        """
+        :return: the events kept so far, oldest first, and forgets them
+        """
+        events = list(self.events)
+        self.events.clear()
+        self.dropped = 0
+        return events
+
+    def render(self):
+        """
+        :return: the messages of the events kept so far, and forgets them
+        """
+        return [render(event) for event in self.drain()]
+
+    def quiet(self):
+        """
+        :return: context manager turning the log off while it is held, for bulk loads
+        """
+        return Quiet(self)
+
+
+class Quiet(object):
+    """
+        Class: Quiet
+        ____________
+        Turns an event log off and back to its level
+    """
+    def __init__(self, log):
+        self.log = log
+        self.level = log.level
+
+    def __enter__(self):
+        self.level = self.log.level
+        self.log.level = QUIET
+        return self.log
+
+    def __exit__(self, *exc_info):
+        self.log.level = self.level
+        return False
@@ -0,0 +1,362 @@
+"""
+    facilities
+    ______________
+    Runs several facilities side by side, each one an Amity instance in a
+    worker process of its own so that the facilities do not share one core.
+
+    Operations on people and rooms are routed to the shard of the facility
+    they name. Queries over every facility, finding a person and listing the
+    unallocated people, are sent to all the shards before any answer is read
+    so the shards work on them in parallel. Every shard saves its state to a
+    database of its own, by default <facility>.db in data/states.
+
+        router = FacilityRouter(["NAIROBI", "LAGOS"])
+        router.create_room("NAIROBI", ["MARS"], "office")
+        router.add_person("NAIROBI", "fellow", "TONY CHOPPER", "Y")
+        print(router.get_person_id("TONY CHOPPER"))
+        router.save_state()
+        router.close()
+
+    Id numbers are handed out by every shard on its own, so two people in
+    different facilities can have the same id number. Answers of queries over
+    every facility therefore name the facility of every person.
+"""
+import json
+import multiprocessing
+import os
+
+from .amity import data_path
+from .allocation import STRATEGIES
+from . import reports
+
+FACILITY_UNALLOCATED_COLUMNS = ("facility",) + reports.UNALLOCATED_COLUMNS
+
+
+class ShardError(Exception):
+    """
+        Class: ShardError
+        _________________
+        An exception raised by a method of the Amity instance of a shard
+    """
+
+
+def run_shard(connection, strategy):
+    """
+    The loop of a shard worker process. Every request is a list of
+    (method, args, kwargs) calls that are run in order, the reply holds
+    (True, result) or (False, error message) for every call. None stops the
+    worker
+    ______________________________________________________
+    :param connection: the worker end of the pipe to the router
+    :param strategy: allocation strategy of the Amity instance
+    """
+    from .amity import Amity
+    amity = Amity(strategy)
+    amity.verbose = False
+    while True:
+        calls = connection.recv()
+        if calls is None:
+            break
+        replies = []
+        for method, args, kwargs in calls:
+            try:
+                replies.append((True, getattr(amity, method)(*args, **kwargs)))
+            except Exception as error:
+                replies.append((False, "{}: {}".format(type(error).__name__, error)))
+        connection.send(replies)
+    connection.close()
+
+
+class Shard(object):
+    """
+        Class: Shard
+        ____________
+        The worker process running the Amity instance of one facility
+    """
+    def __init__(self, facility, strategy):
+        self.facility = facility
+        self.connection, worker_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_shard, args=(worker_end, strategy),
+                                               name="amity-" + facility)
+        self.process.daemon = True
+        self.process.start()
+        worker_end.close()
+
+    def send(self, calls):
+        self.connection.send(calls)
+
+    def receive(self):
+        return self.connection.recv()
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(None)
+            self.process.join()
+        self.connection.close()
+
+
+def facility_unallocated_text(rows):
+    facility = None
+    for facility_name, id_no, name, role in rows:
+        if facility_name != facility:
+            facility = facility_name
+            yield "\nUNALLOCATED PEOPLE IN " + facility + "\n-------------------------------------\n"
+        yield name + "\n"
+    if facility is None:
+        yield "\nThere are no unallocated people\n"
+
+
+class FacilityRouter(object):
+    """
+        Class: FacilityRouter
+        _____________________
+        Owns one Amity shard per facility and routes every operation to the
+        shard of its facility
+
+        Data structures:
+        ______________________
+        facilities(list): names of the facilities in the order they were given
+        shards(dict): the Shard of every facility
+        database(str): name of the database of a facility, {facility} is replaced by its name
+    """
+    def __init__(self, facilities, strategy="random", database="{facility}.db"):
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown allocation strategy: " + str(strategy))
+        self.facilities = []
+        for facility in facilities:
+            if facility in self.facilities:
+                raise ValueError("The facility " + facility + " is given twice")
+            self.facilities.append(facility)
+        self.database = database
+        self.shards = {}
+        try:
+            for facility in self.facilities:
+                self.shards[facility] = Shard(facility, strategy)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Stops the worker processes, the state of the shards is not saved
+        """
+        for shard in self.shards.values():
+            shard.close()
+        self.shards = {}
+
+    def run(self, batches):
+        """
+        Sends the calls of every shard and then waits for all the replies, so
+        the shards run their calls at the same time
+        ______________________________________________________
+        :param batches: dict of facility -> list of (method, args, kwargs)
+        :return: dict of facility -> list of results in the order of the calls
+        """
+        for facility, calls in batches.items():
+            self.shards[facility].send(calls)
+        replies = {}
+        for facility in batches:
+            replies[facility] = self.shards[facility].receive()
+        results = {}
+        for facility, facility_replies in replies.items():
+            results[facility] = []
+            for succeeded, result in facility_replies:
+                if not succeeded:
+                    raise ShardError(facility + ": " + result)
+                results[facility].append(result)
+        return results
+
+    def call(self, facility, method, *args, **kwargs):
+        """
+        Calls a method of the Amity instance of a facility
+        ______________________________________________________
+        :param facility: name of the facility
+        :param method: name of the Amity method
+        :return: the result of the method
+        """
+        if facility not in self.shards:
+            return "The facility " + str(facility) + " does not exist"
+        return self.run({facility: [(method, args, kwargs)]})[facility][0]
+
+    def call_many(self, calls):
+        """
+        Runs many calls in one round trip to every shard, the shards run their
+        share of the calls in parallel
+        ______________________________________________________
+        :param calls: iterable of (facility, method, args)
+        :return: list of the results in the order of the calls
+        """
+        batches = {}
+        order = []
+        results = []
+        for facility, method, args in calls:
+            if facility not in self.shards:
+                order.append(None)
+                results.append("The facility " + str(facility) + " does not exist")
+                continue
+            batch = batches.setdefault(facility, [])
+            order.append((facility, len(batch)))
+            batch.append((method, tuple(args), {}))
+            results.append(None)
+        if batches:
+            replies = self.run(batches)
+            for position, routed in enumerate(order):
+                if routed is not None:
+                    results[position] = replies[routed[0]][routed[1]]
+        return results
+
+    def broadcast(self, method, *args, **kwargs):
+        """
+        Calls a method of the Amity instance of every facility in parallel
+        ______________________________________________________
+        :param method: name of the Amity method
+        :return: list of (facility, result) in the order of the facilities
+        """
+        results = self.run(dict((facility, [(method, args, kwargs)]) for facility in self.facilities))
+        return [(facility, results[facility][0]) for facility in self.facilities]
+
+    def create_room(self, facility, room_list, room_type):
+        return self.call(facility, "create_room", room_list, room_type)
+
+    def add_person(self, facility, role, name, accommodate="N"):
+        return self.call(facility, "add_person", role, name, accommodate)
+
+    def add_people(self, people):
+        """
+        Adds many people in one round trip to every shard
+        ______________________________________________________
+        :param people: iterable of (facility, role, name, accommodate)
+        :return: list of the messages of add_person in the order of people
+        """
+        return self.call_many((person[0], "add_person", person[1:]) for person in people)
+
+    def reallocate_person(self, facility, id_no, room_name):
+        return self.call(facility, "reallocate_person", id_no, room_name)
+
+    def print_room(self, facility, room_name):
+        return self.call(facility, "print_room", room_name)
+
+    def load_people(self, facility, textfile):
+        return self.call(facility, "load_people", textfile)
+
+    def print_allocations(self, facility, filename=None, fmt="text", room_type=None, sort=False):
+        return self.call(facility, "print_allocations", filename, fmt, room_type, sort)
+
+    def search_people(self, query, mode="exact", limit=20):
+        """
+        Searches the people of every facility by name
+        ______________________________________________________
+        :param query: the full name, the start of the name or a misspelt name
+        :param mode: exact, prefix or fuzzy
+        :param limit: maximum number of people returned, None for all of them
+        :return: list of dicts with the facility, id_no, name, role, office and livingspace
+        """
+        people = []
+        for facility, found in self.broadcast("search_people", query, mode, limit):
+            for person in found:
+                person["facility"] = facility
+                people.append(person)
+        return people[:limit]
+
+    def get_person_id(self, search_name):
+        """
+        Prints the facility and id number of every person with the name
+        ______________________________________________________
+        :param search_name: name of the person
+        :return: one line for every person with the name
+        """
+        people = self.search_people(search_name, "exact", None)
+        if not people:
+            return "The person is not in system"
+        return "\n".join("FACILITY: " + person["facility"] + " ID: " + person["id_no"] +
+                         " ROLE: " + person["role"].upper() + " NAME: " + person["name"]
+                         for person in people)
+
+    def find_person(self, query, mode="exact", limit=20):
+        """
+        Finds the people matching a name in every facility and prints their role and rooms
+        ______________________________________________________
+        :param query: the full name, the start of the name or a misspelt name
+        :param mode: exact, prefix or fuzzy
+        :param limit: maximum number of people printed
+        :return: one line for every person found
+        """
+        people = self.search_people(query, mode, limit)
+        if not people:
+            return "No person matching " + query.upper() + " in system"
+        return "\n".join("FACILITY: " + person["facility"] + " ID: " + person["id_no"] +
+                         " ROLE: " + person["role"].upper() + " NAME: " + person["name"] +
+                         " OFFICE: " + (person["office"] or "-") +
+                         " LIVING SPACE: " + (person["livingspace"] or "-")
+                         for person in people)
+
+    def unallocated_rows(self):
+        """
+        :return: generator of (facility, id_no, name, role) of the unallocated people of every facility
+        """
+        for facility, report in self.broadcast("print_unallocated", None, "ndjson"):
+            for line in report.splitlines():
+                person = json.loads(line)
+                yield (facility,) + tuple(person[column] for column in reports.UNALLOCATED_COLUMNS)
+
+    def write_unallocated(self, out, fmt="text"):
+        """
+        Streams the unallocated people of every facility to a file handle
+        ______________________________________________________
+        :param out: any object with a write method, e.g. sys.stdout or an open file
+        :param fmt: text, csv or ndjson
+        :return: number of people written
+        """
+        return reports.write_report(out, self.unallocated_rows(), FACILITY_UNALLOCATED_COLUMNS, fmt,
+                                    facility_unallocated_text)
+
+    def print_unallocated(self, filename=None, fmt="text"):
+        """
+        Prints the unallocated people of every facility and saves them to a file
+        ______________________________________________________
+        :param filename: file in data/output the report is written to
+        :param fmt: text, csv or ndjson
+        :return: the report, or where it was saved when filename is given
+        """
+        if fmt not in reports.FORMATS:
+            return "Unknown format " + fmt + ", use one of: " + ", ".join(reports.FORMATS)
+        if filename is not None:
+            if not os.path.isdir(data_path("output")):
+                os.makedirs(data_path("output"))
+            with open(data_path("output/" + filename), "w") as outfile:
+                self.write_unallocated(outfile, fmt)
+            return "\nUnallocated people saved to: {}\n".format(filename)
+        output = reports.StringOut()
+        self.write_unallocated(output, fmt)
+        return output.getvalue()
+
+    def database_of(self, facility):
+        return self.database.format(facility=facility)
+
+    def save_state(self):
+        """
+        Saves every facility to its own database, in parallel
+        ______________________________________________________
+        :return: the message of save_state of every facility
+        """
+        results = self.run(dict((facility, [("save_state", (self.database_of(facility),), {})])
+                                for facility in self.facilities))
+        return "".join(facility + ": " + results[facility][0].strip() + "\n" for facility in self.facilities)
+
+    def load_state(self, lazy=False):
+        """
+        Loads every facility from its own database, in parallel
+        ______________________________________________________
+        :param lazy: whether the shards read rooms and people only when they are needed
+        :return: the message of load_state of every facility
+        """
+        results = self.run(dict((facility, [("load_state", (self.database_of(facility),), {"lazy": lazy})])
+                                for facility in self.facilities))
+        return "".join(facility + ": " + results[facility][0].strip() + "\n" for facility in self.facilities)
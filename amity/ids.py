@@ -0,0 +1,31 @@
+class IdAllocator(object):
+    """
+        Class: IdAllocator
+        __________________
+        Hands out the id numbers of the people in amity. Id numbers are
+        consecutive so they never collide, and a whole block of them can be
+        reserved at once for a worker that creates people on its own.
+        high_water is the largest id number handed out so far and is saved
+        with the rest of the state.
+    """
+
+    def __init__(self, high_water=0):
+        self.high_water = high_water
+
+    def next_id(self):
+        """
+        :return: a new id number as a string
+        """
+        self.high_water += 1
+        return str(self.high_water)
+
+    def reserve_block(self, size):
+        """
+        Reserves size consecutive id numbers
+        ______________________________________________________
+        :param size: number of id numbers to reserve
+        :return: the first reserved id number, the rest follow it
+        """
+        first = self.high_water + 1
+        self.high_water += size
+        return first
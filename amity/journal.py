@@ -0,0 +1,180 @@
+"""
+    journal
+    ______________
+    The append-only journal of the changes made to amity since its last
+    snapshot in SQLite. Every change is a JSON array on a line of its own,
+    starting with a sequence number and the kind of change:
+
+        [seq, "room", name, room_type, capacity]    a room was created
+        [seq, "person", id_no, name, role]          a person was added
+        [seq, "move", id_no, room_type, room_name]  a person was put in a room
+        [seq, "wait", room_type, id_no]             a person joined a waitlist
+        [seq, "ids", high_water]                    a block of ids was reserved
+
+    The journal of <database> is kept in the segment files
+    <database>.journal.1, <database>.journal.2, ... next to the database. Only
+    the last segment is written to, older segments are closed and deleted once
+    their changes are in the snapshot, whose META table holds the sequence
+    number of the last change it has.
+
+    Appending a change only queues it. A flusher thread writes the changes
+    queued during a short window and fsyncs them together, so a burst of
+    changes costs one fsync instead of one each (group commit). A crash loses
+    at most the changes of the last window.
+"""
+import json
+import os
+import threading
+import time
+
+
+def segment_path(path, number):
+    return "{}.{}".format(path, number)
+
+
+def segments(path):
+    """
+    :param path: path of the journal, i.e. of the database followed by .journal
+    :return: sorted list of (number, path) of the segments of the journal
+    """
+    directory, prefix = os.path.split(path)
+    found = []
+    for name in os.listdir(directory or "."):
+        number = name[len(prefix) + 1:]
+        if name.startswith(prefix + ".") and number.isdigit():
+            found.append((int(number), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def read_records(paths, after=0):
+    """
+    Reads the changes of some segments. A segment stops at its first line that
+    is not valid JSON, the torn last write of a crash
+    ______________________________________________________
+    :param paths: paths of the segments in order
+    :param after: sequence number of the last change already in the snapshot
+    :return: generator of the changes with a larger sequence number, as lists
+    """
+    for path in paths:
+        with open(path) as segment:
+            for line in segment:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record[0] > after:
+                    yield record
+
+
+def remove_segments(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class Journal(object):
+    """
+        Class: Journal
+        ______________
+        Appends changes to the last segment of a journal. seq is the sequence
+        number of the last change appended, window the seconds the flusher
+        waits for more changes before it writes and fsyncs them. on_full is
+        called from the flusher thread once compact_every changes were
+        written to the segment
+    """
+    def __init__(self, path, seq=0, window=0.005, compact_every=100000, on_full=None):
+        self.path = path
+        self.seq = seq
+        self.window = window
+        self.compact_every = compact_every
+        self.on_full = on_full
+        self.pending = []
+        self.written = 0
+        self.closed = False
+        self.lock = threading.Lock()     # guards seq and pending
+        self.io_lock = threading.Lock()  # guards the segment file
+        self.wakeup = threading.Event()
+        existing = segments(path)
+        self.number = existing[-1][0] + 1 if existing else 1
+        self.file = open(segment_path(path, self.number), "a")
+        self.flusher = threading.Thread(target=self.run)
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def append(self, kind, *values):
+        """
+        Queues a change, it is on disk within the window of the flusher
+        """
+        with self.lock:
+            self.seq += 1
+            self.pending.append(json.dumps([self.seq, kind] + list(values), separators=(",", ":")))
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            if self.closed:
+                return
+            time.sleep(self.window)
+            self.sync()
+            if self.on_full is not None and self.written >= self.compact_every:
+                self.written = -1  # until the next rotate
+                self.on_full()
+
+    def write_pending(self):
+        """
+        Writes and fsyncs the queued changes, the caller holds io_lock
+        ______________________________________________________
+        :return: sequence number of the last change on disk
+        """
+        with self.lock:
+            lines = self.pending
+            self.pending = []
+            if not self.closed:
+                self.wakeup.clear()
+            seq = self.seq
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if self.written >= 0:
+                self.written += len(lines)
+        return seq
+
+    def sync(self):
+        """
+        Writes the queued changes without waiting for the window
+        ______________________________________________________
+        :return: sequence number of the last change on disk
+        """
+        with self.io_lock:
+            return self.write_pending()
+
+    def rotate(self):
+        """
+        Closes the segment being written and starts a new one
+        ______________________________________________________
+        :return: (seq, paths), the sequence number of the last change in the
+                 closed segments and the paths of all the closed segments
+        """
+        with self.io_lock:
+            seq = self.write_pending()
+            self.file.close()
+            closed = [path for number, path in segments(self.path) if number <= self.number]
+            self.number += 1
+            self.file = open(segment_path(self.path, self.number), "a")
+            self.written = 0
+        return seq, closed
+
+    def close(self):
+        """
+        Writes the queued changes and stops the flusher
+        """
+        with self.lock:
+            self.closed = True
+            self.wakeup.set()
+        if self.flusher is not threading.current_thread():
+            self.flusher.join()
+        with self.io_lock:
+            self.write_pending()
+            self.file.close()
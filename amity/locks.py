@@ -0,0 +1,89 @@
+"""
+    locks
+    ______________
+    The locks of the thread safe mode of Amity. Until thread safety is turned
+    on Amity holds NO_LOCK wherever it would hold a lock, so the same code
+    runs without paying for locking.
+
+    Locks are always taken in this order so that two threads never wait for
+    each other: the people lock, the office lock, the living space lock and
+    last the locks of single rooms in name order.
+"""
+import threading
+
+
+class NoLock(object):
+    """
+        Class: NoLock
+        _____________
+        A lock that does nothing
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_LOCK = NoLock()
+
+
+class AllOf(object):
+    """
+        Class: AllOf
+        ____________
+        Holds several locks at once, they are taken in the order given and
+        released in the reverse order
+    """
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for position, lock in enumerate(self.locks):
+            try:
+                lock.__enter__()
+            except BaseException:
+                for taken in reversed(self.locks[:position]):
+                    taken.__exit__(None, None, None)
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.__exit__(None, None, None)
+        return False
+
+
+class RoomLocks(object):
+    """
+        Class: RoomLocks
+        ________________
+        One lock per room guarding the set of its occupants. The lock of a
+        room is created the first time the room is locked
+    """
+    def __init__(self):
+        self.locks = {}
+        self.guard = threading.Lock()
+        self.enabled = False
+
+    def lock(self, room_name):
+        """
+        :param room_name: name of the room
+        :return: the lock of the room, NO_LOCK while thread safety is off
+        """
+        if not self.enabled:
+            return NO_LOCK
+        lock = self.locks.get(room_name)
+        if lock is None:
+            with self.guard:
+                lock = self.locks.setdefault(room_name, threading.Lock())
+        return lock
+
+    def hold(self, *room_names):
+        """
+        :param room_names: names of rooms, None is skipped
+        :return: context manager holding the locks of all the rooms
+        """
+        if not self.enabled:
+            return NO_LOCK
+        return AllOf([self.lock(name) for name in sorted(set(room_names) - set([None]))])
@@ -0,0 +1,109 @@
+"""
+    occupancy
+    ______________
+    Counters of the rooms, seats and people of amity that are kept up to date
+    as rooms are created and people are added and moved, so questions such as
+    how many office seats are free or how many fellows still wait for a living
+    space are answered without walking the rooms.
+"""
+ROOM_TYPES = ("office", "livingspace")
+ROLES = ("fellow", "staff")
+
+
+def bucket(occupants, capacity):
+    """
+    :return: full, empty or partial
+    """
+    if occupants >= capacity:
+        return "full"
+    return "partial" if occupants else "empty"
+
+
+class Occupancy(object):
+    """
+        Class: Occupancy
+        ________________
+        rooms holds for every room type the number of rooms, seats and
+        occupied seats and the number of full, empty and partially filled
+        rooms, people the number of people of every role and allocated the
+        number of people of every role with a room of every type.
+
+        The counters of a room type are only changed by the code holding the
+        lock of that room type and the people counters by the code holding
+        the people lock, so they stay right in thread safe mode.
+    """
+    def __init__(self):
+        self.rooms = dict((room_type, {"rooms": 0, "seats": 0, "occupied": 0, "full": 0, "partial": 0, "empty": 0})
+                          for room_type in ROOM_TYPES)
+        self.people = dict((role, 0) for role in ROLES)
+        self.allocated = dict((room_type, dict((role, 0) for role in ROLES)) for room_type in ROOM_TYPES)
+
+    def add_room(self, room_type, capacity, occupants=0):
+        """
+        Counts a new room
+        ______________________________________________________
+        :param room_type: office or livingspace
+        :param capacity: maximum number of occupants
+        :param occupants: number of people already in the room
+        """
+        counts = self.rooms[room_type]
+        counts["rooms"] += 1
+        counts["seats"] += capacity
+        counts["occupied"] += occupants
+        counts[bucket(occupants, capacity)] += 1
+
+    def add_person(self, role):
+        self.people[role] += 1
+
+    def change(self, room_type, capacity, before, after):
+        """
+        Counts a person moving in or out of a room
+        ______________________________________________________
+        :param room_type: office or livingspace
+        :param capacity: maximum number of occupants of the room
+        :param before: number of occupants before the move
+        :param after: number of occupants after the move
+        """
+        counts = self.rooms[room_type]
+        counts["occupied"] += after - before
+        counts[bucket(before, capacity)] -= 1
+        counts[bucket(after, capacity)] += 1
+
+    def allocate(self, room_type, role):
+        """
+        Counts a person getting their first room of a type
+        """
+        self.allocated[room_type][role] += 1
+
+    def summary(self, waitlists):
+        """
+        :param waitlists: dict of the waitlist of every room type
+        :return: dict of the counters of every room type, the people of every role
+                 and the people of every role with a room of every type
+        """
+        summary = {"people": dict(self.people)}
+        for room_type in ROOM_TYPES:
+            counts = dict(self.rooms[room_type])
+            counts["free"] = counts["seats"] - counts["occupied"]
+            counts["waiting"] = len(waitlists[room_type])
+            counts["allocated"] = dict(self.allocated[room_type])
+            summary[room_type] = counts
+        return summary
+
+    def report(self, waitlists):
+        """
+        :param waitlists: dict of the waitlist of every room type
+        :return: table of the counters of every room type and a line of the people of every role
+        """
+        summary = self.summary(waitlists)
+        row = "{:<12} {:>7} {:>8} {:>8} {:>6} {:>8} {:>6} {:>8}\n"
+        output = row.format("ROOM TYPE", "ROOMS", "SEATS", "FREE", "FULL", "PARTIAL", "EMPTY", "WAITING")
+        for room_type in ROOM_TYPES:
+            counts = summary[room_type]
+            output += row.format(room_type, counts["rooms"], counts["seats"], counts["free"], counts["full"],
+                                 counts["partial"], counts["empty"], counts["waiting"])
+        for role in ROLES:
+            output += "{}: {} ({} with an office, {} with a living space)\n".format(
+                role, summary["people"][role], summary["office"]["allocated"][role],
+                summary["livingspace"]["allocated"][role])
+        return output
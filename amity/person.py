@@ -1,9 +1,28 @@
 
-import random
 from abc import ABCMeta
 from abc import abstractmethod
 
 
+class Role(object):
+    """
+        class Role:
+        ______________
+        Small integer codes for the roles of people, used where a role is
+        stored for millions of people and a string per person is too big
+    """
+    FELLOW = 0
+    STAFF = 1
+    NAMES = ("fellow", "staff")
+
+    @classmethod
+    def code(cls, role):
+        return cls.NAMES.index(role.lower())
+
+    @classmethod
+    def name(cls, code):
+        return cls.NAMES[code]
+
+
 class Person(object):
     """
         class Person:
@@ -13,12 +32,13 @@ class Person(object):
         the child classes Fellow and Office
     """
     __metaclass__ = ABCMeta
+    __slots__ = ("name", "role", "id_no")
 
     @abstractmethod
-    def __init__(self, name, role):
+    def __init__(self, name, role, id_no=None):
         self.name = name
         self.role = role
-        self.id_no = str(random.choice(range(1, 10000000)))
+        self.id_no = id_no
 
 
 class Fellow(Person):
@@ -30,9 +50,10 @@ class Fellow(Person):
         so as to dictate how the Person is created. It also handles
         other responsibilities related to a Fellow.
     """
+    __slots__ = ()
 
-    def __init__(self, name):
-        super(Fellow, self).__init__(name, "fellow")
+    def __init__(self, name, id_no=None):
+        super(Fellow, self).__init__(name, "fellow", id_no)
 
 
 class Staff(Person):
@@ -44,5 +65,6 @@ class Staff(Person):
         so as to dictate how the Person is created. It also handles
         other responsibilities related to a Staff.
     """
-    def __init__(self, name):
-        super(Staff, self).__init__(name, "staff")
+    __slots__ = ()
+    def __init__(self, name, id_no=None):
+        super(Staff, self).__init__(name, "staff", id_no)
@@ -0,0 +1,164 @@
+"""
+    reports
+    ______________
+    The reports printed by amity. Every report is a generator of rows that
+    is rendered by one of the FORMATS and written to a file handle through
+    a ChunkedWriter, so a report is never built up in memory as a whole.
+"""
+import csv
+import json
+
+FORMATS = ("text", "csv", "ndjson")
+
+ALLOCATION_COLUMNS = ("room_name", "room_type", "id_no", "name")
+UNALLOCATED_COLUMNS = ("id_no", "name", "role")
+
+ROOM_RULE = "-----------------------------------------------\n"
+
+
+class ChunkedWriter(object):
+    """
+        Class: ChunkedWriter
+        ____________________
+        Collects small writes and passes them on to a file handle in chunks
+        of about chunk_size characters
+    """
+    def __init__(self, out, chunk_size=65536):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.size = 0
+
+    def write(self, text):
+        self.pending.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.out.write("".join(self.pending))
+            self.pending = []
+            self.size = 0
+
+
+class StringOut(object):
+    """
+        Class: StringOut
+        ________________
+        A file handle that keeps what is written to it, for reports that are
+        returned as a string
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+
+def allocation_rows(amity, room_type=None, sort=False):
+    """
+    Yields a row for every person allocated a room
+    ______________________________________________________
+    :param amity: the Amity instance
+    :param room_type: only rooms of this type (office|livingspace) when given
+    :param sort: whether rooms and people are sorted by name instead of creation order
+    :return: generator of (room_name, room_type, id_no, name)
+    """
+    room_names = sorted(amity.rooms) if sort else amity.rooms
+    for room_name in room_names:
+        if room_name in amity.accommodations:
+            occupants = amity.accommodations[room_name]
+            kind = "livingspace"
+        else:
+            occupants = amity.offices.get(room_name, ())
+            kind = "office"
+        if room_type is not None and room_type != kind:
+            continue
+        people = [(id_no, amity.employees[id_no]) for id_no in occupants]
+        if sort:
+            people.sort(key=lambda person: person[1])
+        for id_no, name in people:
+            yield room_name, kind, id_no, name
+
+
+def unallocated_rows(amity):
+    """
+    :param amity: the Amity instance
+    :return: generator of (id_no, name, role) of the unallocated people
+    """
+    for id_no in amity.unallocated:
+        yield id_no, amity.employees[id_no], "fellow" if id_no in amity.fellows else "staff"
+
+
+def allocation_text(rows):
+    room = None
+    for room_name, room_type, id_no, name in rows:
+        if room is None:
+            yield "ROOM ALLOCATIONS\n"
+        if room_name != room:
+            room = room_name
+            yield "\n" + room_name.upper() + "\n" + ROOM_RULE
+        yield name + "\n"
+    if room is None:
+        yield "There are no occupied rooms in amity!\n"
+
+
+def room_text(rows):
+    header = True
+    for room_name, room_type, id_no, name in rows:
+        if header:
+            header = False
+            yield "The members of room " + room_name + ":\n"
+            yield "------------------------------------------\n"
+        yield name.upper() + "\n"
+
+
+def unallocated_text(rows):
+    empty = True
+    for id_no, name, role in rows:
+        if empty:
+            empty = False
+            yield "\nUNALLOCATED PEOPLE\n-------------------------------------\n"
+        yield name + "\n"
+    if empty:
+        yield "\nThere are no unallocated people\n"
+
+
+def write_report(out, rows, columns, fmt="text", text=None, chunk_size=65536):
+    """
+    Writes the rows of a report to a file handle
+    ______________________________________________________
+    :param out: any object with a write method, e.g. sys.stdout or an open file
+    :param rows: iterable of tuples
+    :param columns: names of the values in every row
+    :param fmt: text, csv or ndjson
+    :param text: function turning the rows into the lines of the text format
+    :param chunk_size: number of characters collected before writing to out
+    :return: number of rows written
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Unknown report format " + fmt + ", use one of: " + ", ".join(FORMATS))
+    writer = ChunkedWriter(out, chunk_size)
+    counted = [0]
+
+    def count(rows):
+        for row in rows:
+            counted[0] += 1
+            yield row
+
+    if fmt == "text":
+        for line in text(count(rows)):
+            writer.write(line)
+    elif fmt == "csv":
+        csv_writer = csv.writer(writer, lineterminator="\n")
+        csv_writer.writerow(columns)
+        csv_writer.writerows(count(rows))
+    else:
+        for row in count(rows):
+            writer.write(json.dumps(dict(zip(columns, row))) + "\n")
+    writer.flush()
+    return counted[0]
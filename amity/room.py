@@ -11,6 +11,7 @@ class Room(object):
         the child classes LivingSpace and Office
     """
     __metaclass__ = ABCMeta
+    __slots__ = ("room_name", "room_type", "capacity")
 
     @abstractmethod
     def __init__(self, room_name, room_type, capacity):
@@ -26,9 +27,10 @@ class Office(Room):
         class Office is child class that inherits from the Person class.
         it contains the specific attributes related to a room of type office
     """
+    __slots__ = ()
 
-    def __init__(self, room_name):
-        super(Office, self).__init__(room_name, "office", capacity=6)
+    def __init__(self, room_name, capacity=6):
+        super(Office, self).__init__(room_name, "office", capacity)
 
 
 class LivingSpace(Room):
@@ -38,6 +40,7 @@ class LivingSpace(Room):
         class LivingSpace is child class that inherits from the Person class.
         it contains the specific attributes related to a room of type LivingSpace
     """
+    __slots__ = ()
 
-    def __init__(self, room_name):
-        super(LivingSpace, self).__init__(room_name, "livingspace", capacity=4)
+    def __init__(self, room_name, capacity=4):
+        super(LivingSpace, self).__init__(room_name, "livingspace", capacity)
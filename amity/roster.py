@@ -0,0 +1,138 @@
+"""
+    roster
+    ______________
+    Helpers for reading people from roster text files and rooms from room
+    manifests. Every line of a roster looks like:
+
+        FELLOW OLUWAFEMI SULE Y
+        STAFF DOMINIC WALTERS
+
+    and every line of a room manifest has the name, type and optionally the
+    capacity of a room:
+
+        MARS office 8
+        EARTH livingspace
+
+    The helpers are generators so that a file is read one line at a time
+    and never held in memory as a whole.
+"""
+import os
+
+ROLES = ("FELLOW", "STAFF")
+ROOM_TYPES = ("office", "livingspace")
+SHORTEST_LINE = len("STAFF A B\n")
+
+
+def parse_person(line):
+    """
+    Parses one roster line
+    ______________________________________________________
+    :param line: line from the roster file
+    :return: (role, name, accommodate) tuple
+    :raises ValueError: with the reason when the line is malformed
+    """
+    details = line.split()
+    if len(details) < 3:
+        raise ValueError("expected <role> <firstname> <surname> [<accommodate>]")
+    if len(details) > 4:
+        raise ValueError("too many values")
+    role = details[0].upper()
+    if role not in ROLES:
+        raise ValueError("unknown role " + details[0])
+    name = details[1].upper() + " " + details[2].upper()
+    accommodate = details[3].upper() if len(details) > 3 else "N"
+    if accommodate not in ("Y", "N"):
+        raise ValueError("accommodate must be Y or N not " + details[3])
+    return role, name, accommodate
+
+
+def iter_people(lines):
+    """
+    Parses roster lines lazily, skipping blank lines
+    ______________________________________________________
+    :param lines: any iterable of lines, e.g. an open file
+    :return: generator of (line_no, person, error) where exactly one of
+             person and error is None
+    """
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, parse_person(line), None
+        except ValueError as error:
+            yield line_no, None, str(error)
+
+
+def parse_room(line):
+    """
+    Parses one room manifest line
+    ______________________________________________________
+    :param line: line from the manifest
+    :return: (name, room_type, capacity) tuple, capacity is None when not given
+    :raises ValueError: with the reason when the line is malformed
+    """
+    details = line.split()
+    if len(details) < 2:
+        raise ValueError("expected <room_name> <room_type> [<capacity>]")
+    if len(details) > 3:
+        raise ValueError("too many values")
+    room_type = details[1].lower()
+    if room_type not in ROOM_TYPES:
+        raise ValueError("unknown room type " + details[1])
+    capacity = None
+    if len(details) > 2:
+        if not details[2].isdigit() or int(details[2]) < 1:
+            raise ValueError("capacity must be a positive number not " + details[2])
+        capacity = int(details[2])
+    return details[0].upper(), room_type, capacity
+
+
+def iter_rooms(lines):
+    """
+    Parses room manifest lines lazily, skipping blank lines and comments
+    ______________________________________________________
+    :param lines: any iterable of lines, e.g. an open file
+    :return: generator of (line_no, room, error) where exactly one of
+             room and error is None
+    """
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            yield line_no, parse_room(line), None
+        except ValueError as error:
+            yield line_no, None, str(error)
+
+
+def max_people(path):
+    """
+    The largest number of people a roster file can hold, used to reserve
+    id numbers for the file before it is parsed
+    ______________________________________________________
+    :param path: path of the roster file
+    :return: number of people
+    """
+    return os.path.getsize(path) // SHORTEST_LINE + 1
+
+
+def parse_roster_file(task):
+    """
+    Parses a whole roster file, used by the worker processes of a
+    parallel load so it has to stay a module level function
+    ______________________________________________________
+    :param task: (path, first_id) where first_id starts the block of
+                 max_people(path) id numbers reserved for the file
+    :return: (path, people, errors) where people is a list of
+             (id_no, role, name, accommodate) and errors of (line_no, reason)
+    """
+    path, next_id = task
+    people = []
+    errors = []
+    with open(path, 'r') as roster:
+        for line_no, person, error in iter_people(roster):
+            if error is None:
+                people.append((str(next_id),) + person)
+                next_id += 1
+            else:
+                errors.append((line_no, error))
+    return path, people, errors
@@ -0,0 +1,168 @@
+from bisect import bisect_left
+
+
+def edit_distance(first, second, limit=1):
+    """
+    Counts the insertions, deletions, substitutions and swaps of adjacent
+    characters needed to turn one word into the other
+    ______________________________________________________
+    :param first: first word
+    :param second: second word
+    :param limit: the count stops at limit + 1 since only small distances matter
+    :return: the distance, or limit + 1 when it is larger than limit
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = None
+    current = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return min(current[-1], limit + 1)
+
+
+def deletions(word):
+    """
+    The word itself and every word made by deleting one of its characters
+    ______________________________________________________
+    :param word: the word to vary
+    :return: set of variations
+    """
+    variations = set([word])
+    for i in range(len(word)):
+        variations.add(word[:i] + word[i + 1:])
+    return variations
+
+
+class NameIndex(object):
+    """
+        Class: NameIndex
+        ________________
+        Maps the names of people in amity to their id numbers. Besides exact
+        lookups it answers prefix queries through a sorted list of names and
+        typo tolerant queries through an index of the words in the names.
+
+        The sorted list is not re-sorted on every insert, new names wait in
+        a pending list that prefix queries scan directly until it grows past
+        merge_threshold. The word index is only built the first time a typo
+        tolerant query is made.
+    """
+    merge_threshold = 1024
+
+    def __init__(self):
+        self.ids = {}
+        self.sorted_names = []
+        self.pending = []
+        self.words = None
+        self.word_deletions = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, name, id_no):
+        """
+        Adds a person to the index
+        ______________________________________________________
+        :param name: name of the person
+        :param id_no: id number of the person
+        """
+        name = name.upper()
+        if name in self.ids:
+            self.ids[name].append(id_no)
+            return
+        self.ids[name] = [id_no]
+        self.pending.append(name)
+        if self.words is not None:
+            self.index_words(name)
+
+    def merge(self):
+        """
+        Merges the pending names into the sorted list
+        ______________________________________________________
+        """
+        if self.pending:
+            self.sorted_names.extend(self.pending)
+            self.sorted_names.sort()
+            self.pending = []
+
+    def exact(self, name):
+        """
+        :param name: the full name
+        :return: list of the id numbers of the people with the name
+        """
+        return list(self.ids.get(name.upper(), []))
+
+    def prefix(self, prefix, limit=None):
+        """
+        Finds the people whose names start with prefix
+        ______________________________________________________
+        :param prefix: the start of the name
+        :param limit: maximum number of id numbers to return
+        :return: list of id numbers in name order
+        """
+        prefix = prefix.upper()
+        if len(self.pending) > self.merge_threshold:
+            self.merge()
+        names = []
+        position = bisect_left(self.sorted_names, prefix)
+        while position < len(self.sorted_names) and self.sorted_names[position].startswith(prefix):
+            names.append(self.sorted_names[position])
+            if limit is not None and len(names) >= limit:
+                break
+            position += 1
+        names.extend(name for name in self.pending if name.startswith(prefix))
+        found = []
+        for name in sorted(names):
+            found.extend(self.ids[name])
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        return found
+
+    def index_words(self, name):
+        for word in name.split():
+            if word not in self.words:
+                self.words[word] = set()
+                for variation in deletions(word):
+                    self.word_deletions.setdefault(variation, set()).add(word)
+            self.words[word].add(name)
+
+    def similar_words(self, word):
+        similar = set()
+        for variation in deletions(word):
+            similar.update(self.word_deletions.get(variation, ()))
+        return [candidate for candidate in similar if edit_distance(word, candidate) <= 1]
+
+    def fuzzy(self, name, limit=None):
+        """
+        Finds the people whose names match name with at most one typo in
+        every word of the name
+        ______________________________________________________
+        :param name: the name, possibly misspelt
+        :param limit: maximum number of id numbers to return
+        :return: list of id numbers in name order
+        """
+        if self.words is None:
+            self.words = {}
+            self.word_deletions = {}
+            for indexed_name in self.ids:
+                self.index_words(indexed_name)
+        words = name.upper().split()
+        candidates = None
+        for word in words:
+            names = set()
+            for similar in self.similar_words(word):
+                names.update(self.words[similar])
+            candidates = names if candidates is None else candidates & names
+            if not candidates:
+                return []
+        found = []
+        for candidate in sorted(candidates):
+            if len(candidate.split()) == len(words):
+                found.extend(self.ids[candidate])
+        return found if limit is None else found[:limit]
@@ -0,0 +1,224 @@
+"""
+    server
+    ______________
+    Serves one Amity instance to other programs over TCP or a Unix socket so
+    they do not have to shell out to the CLI or load the state themselves.
+    Needs Python 3.7 or newer:
+
+        python3 -m amity.server --port 8700 --db amity.db
+
+    Requests and responses are JSON objects, one per line. params is a list
+    of positional arguments or an object of keyword arguments:
+
+        {"id": 1, "method": "add_person", "params": ["fellow", "TONY CHOPPER", "Y"]}
+        {"id": 1, "result": "The fellow TONY CHOPPER has been added successfully to the system\\n"}
+        {"id": 2, "error": "unknown method load_people"}
+
+    A client may send any number of requests without waiting for the
+    responses, they are answered in the order they were sent. Requests are
+    run one at a time on the event loop since Amity is not thread safe, the
+    concurrency limit caps the requests read from all the clients that have
+    not been answered yet so that clients that do not read their responses
+    are slowed down instead of filling up memory. On SIGINT or SIGTERM the
+    server stops accepting connections, answers the requests it has read and
+    saves the state before it exits.
+
+    The files save_state, print_allocations and print_unallocated write are
+    always in the data directory, a filename with a path is refused.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import threading
+
+from .amity import Amity, data_path
+
+METHODS = ("add_person", "create_room", "reallocate_person", "get_person_id", "find_person",
+           "print_room", "print_allocations", "print_unallocated", "drain_unallocated", "summary",
+           "save_state")
+# the methods that write a file in the data directory and the position of their filename parameter
+FILE_METHODS = {"save_state": 0, "print_allocations": 0, "print_unallocated": 0}
+
+
+def is_plain_filename(filename):
+    """
+    :param filename: file name sent by a client
+    :return: whether it names a file right inside its data directory, without any path
+    """
+    if filename is None:
+        return True
+    return (isinstance(filename, str) and filename not in ("", ".", "..") and
+            "/" not in filename and "\\" not in filename)
+
+
+class AmityServer(object):
+    """
+        Class: AmityServer
+        __________________
+        Answers JSON requests with the methods of one Amity instance
+    """
+    def __init__(self, amity, database=None, concurrency=64):
+        self.amity = amity
+        self.database = database
+        self.concurrency = concurrency
+        self.limit = None
+        self.server = None
+        self.loop = None
+        self.stopping = None
+        self.started = threading.Event()
+        self.connections = set()
+
+    def handle(self, line):
+        """
+        Runs one request
+        ______________________________________________________
+        :param line: the request as a line of JSON
+        :return: the response as a dict
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return {"id": None, "error": "invalid JSON: " + str(error)}
+        if not isinstance(request, dict):
+            return {"id": None, "error": "a request has to be a JSON object"}
+        request_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params", [])
+        if method not in METHODS:
+            return {"id": request_id, "error": "unknown method " + str(method)}
+        if method in FILE_METHODS:
+            position = FILE_METHODS[method]
+            if isinstance(params, dict):
+                filename = params.get("filename")
+            else:
+                filename = params[position] if len(params) > position else None
+            if not is_plain_filename(filename):
+                return {"id": request_id, "error": "filename has to be a file name without a path"}
+        try:
+            if isinstance(params, dict):
+                result = getattr(self.amity, method)(**params)
+            else:
+                result = getattr(self.amity, method)(*params)
+        except Exception as error:
+            return {"id": request_id, "error": "{}: {}".format(type(error).__name__, error)}
+        return {"id": request_id, "result": result}
+
+    async def serve_client(self, reader, writer):
+        self.connections.add(asyncio.current_task())
+        responses = asyncio.Queue()
+        sender = asyncio.ensure_future(self.send(responses, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await self.limit.acquire()
+                responses.put_nowait(self.handle(line))
+                # let other clients in between the requests of a long pipeline
+                await asyncio.sleep(0)
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            responses.put_nowait(None)
+            await sender
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def send(self, responses, writer):
+        while True:
+            response = await responses.get()
+            if response is None:
+                return
+            try:
+                writer.write(json.dumps(response, default=str).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                self.limit.release()
+
+    async def start(self, host="127.0.0.1", port=8700, path=None):
+        """
+        Starts listening on a TCP port, or on a Unix socket when path is given
+        """
+        self.loop = asyncio.get_running_loop()
+        self.limit = asyncio.Semaphore(self.concurrency)
+        self.stopping = asyncio.Event()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.serve_client, path=path)
+        else:
+            self.server = await asyncio.start_server(self.serve_client, host, port)
+        self.started.set()
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    def stop(self):
+        """
+        Asks the server to shut down, can be called from any thread
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def shutdown(self):
+        """
+        Stops accepting connections, answers the requests already read and
+        saves the state
+        ______________________________________________________
+        :return: the message of save_state or None when nothing was saved
+        """
+        self.server.close()
+        clients = list(self.connections)
+        for client in clients:
+            client.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        await self.server.wait_closed()
+        if self.database is not None:
+            return self.amity.save_state(self.database)
+
+    async def run(self, host="127.0.0.1", port=8700, path=None, handle_signals=True):
+        """
+        Serves until stop is called or the process gets SIGINT or SIGTERM
+        """
+        await self.start(host, port, path)
+        if handle_signals:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                self.loop.add_signal_handler(signal_number, self.stopping.set)
+        await self.stopping.wait()
+        return await self.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves amity as JSON over a socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--db", default="amity.db", help="database in data/states loaded at start and saved at exit")
+    parser.add_argument("--no-save", action="store_true", help="do not save the state at exit")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="requests read but not answered yet across all clients [default: 64]")
+    parser.add_argument("--strategy", default="random", help="random, least-loaded or pack-first")
+    parser.add_argument("--journal", action="store_true",
+                        help="write every change to the journal of the database as it happens")
+    args = parser.parse_args(argv)
+
+    amity = Amity(args.strategy)
+    amity.verbose = False
+    if os.path.exists(data_path("states/" + args.db)):
+        print(amity.load_state(args.db).strip())
+    if args.journal:
+        print(amity.enable_journal(args.db))
+    server = AmityServer(amity, None if args.no_save else args.db, args.concurrency)
+    print("Serving amity on " + (args.unix or "{}:{}".format(args.host, args.port)))
+    saved = asyncio.run(server.run(args.host, args.port, args.unix))
+    amity.close_journal()
+    if saved:
+        print(saved.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+    snapshot
+    ______________
+    A binary snapshot of the state that is opened with mmap and read in place,
+    so a state with millions of people can be queried right after it is
+    opened instead of after every row was read into dicts. The file is:
+
+        header          HEADER: magic, the number of people, rooms, occupants
+                        and people on the office and living space waitlists,
+                        and the largest id number handed out so far
+        people          PERSON per person in the order they were added: the
+                        heap offset and length of the id number and of the
+                        name, the role code and the office and living space
+                        as room numbers, NOBODY for none
+        rooms           ROOM per room in the order they were created: the heap
+                        offset and length of the name, the index of the type
+                        in ROOM_TYPES, the capacity and the number and first
+                        entry of the occupants
+        id index        person numbers sorted by id number
+        name index      person numbers sorted by lower case name, then by the
+                        order they were added
+        room index      room numbers sorted by name
+        occupants       person numbers of the occupants, room after room
+        waitlists       person numbers waiting for an office, then for a
+                        living space, first come first
+        heap            the UTF-8 strings
+
+    All numbers are little endian, person and room numbers are 32 bit. Lookups
+    by id number, name or room name are binary searches of the indexes.
+"""
+import mmap
+import os
+import sqlite3
+import struct
+
+from .person import Role
+from .journal import segments, remove_segments
+from . import storage
+
+MAGIC = b"AMITYSN1"
+HEADER = struct.Struct("<8sIIIIIQ")
+PERSON = struct.Struct("<IIIIBxxxii")
+ROOM = struct.Struct("<IIBxxxIII")
+NUMBER = struct.Struct("<I")
+ROOM_TYPES = ("office", "livingspace")
+NOBODY = -1
+
+
+def is_snapshot(path):
+    """
+    :param path: path of a state file
+    :return: whether the file is a snapshot rather than a SQLite database
+    """
+    with open(path, "rb") as state_file:
+        return state_file.read(len(MAGIC)) == MAGIC
+
+
+def numbers(values):
+    return struct.pack("<{}I".format(len(values)), *values)
+
+
+def write_snapshot(path, state):
+    """
+    Writes a state to a snapshot file. The snapshot is written next to path
+    and then renamed over it, so snapshots mapped by a Snapshot stay intact
+    ______________________________________________________
+    :param path: path of the snapshot
+    :param state: dict of rows, see amity.storage
+    :return: number of rows written
+    """
+    heap = []
+    heap_size = [0]
+
+    def intern(text):
+        data = text.encode("utf-8")
+        heap.append(data)
+        heap_size[0] += len(data)
+        return heap_size[0] - len(data), len(data)
+
+    room_number = {}
+    room_types = []
+    for room, (name, room_type, capacity) in enumerate(state["rooms"]):
+        room_number[name] = room
+        room_types.append(ROOM_TYPES.index(room_type))
+    person_number = {}
+    person_rooms = []
+    for person, (id_no, name, role) in enumerate(state["people"]):
+        person_number[id_no] = person
+        person_rooms.append([NOBODY, NOBODY])
+    occupants = [[] for room in state["rooms"]]
+    for id_no, room_name in state["allocations"]:
+        room = room_number[room_name]
+        occupants[room].append(person_number[id_no])
+        person_rooms[person_number[id_no]][room_types[room]] = room
+
+    people = []
+    for person, (id_no, name, role) in enumerate(state["people"]):
+        people.append(PERSON.pack(*(intern(id_no) + intern(name) +
+                                    (Role.code(role),) + tuple(person_rooms[person]))))
+    rooms = []
+    first = 0
+    for room, (name, room_type, capacity) in enumerate(state["rooms"]):
+        rooms.append(ROOM.pack(*(intern(name) + (room_types[room], capacity, len(occupants[room]), first))))
+        first += len(occupants[room])
+    id_index = sorted(range(len(people)), key=lambda person: state["people"][person][0].encode("utf-8"))
+    name_index = sorted(range(len(people)), key=lambda person: state["people"][person][1].encode("utf-8").lower())
+    room_index = sorted(range(len(rooms)), key=lambda room: state["rooms"][room][0].encode("utf-8"))
+    office_wait = [person_number[id_no] for id_no in state["unallocated"]]
+    livingspace_wait = [person_number[id_no] for id_no in state.get("livingspace_waitlist", [])]
+    with open(path + ".tmp", "wb") as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, len(people), len(rooms), first, len(office_wait),
+                                   len(livingspace_wait), state.get("high_water", 0)))
+        snapshot.write(b"".join(people))
+        snapshot.write(b"".join(rooms))
+        for section in (id_index, name_index, room_index, [person for room in occupants for person in room],
+                        office_wait, livingspace_wait):
+            snapshot.write(numbers(section))
+        snapshot.write(b"".join(heap))
+    getattr(os, "replace", os.rename)(path + ".tmp", path)
+    return len(people) + len(rooms) + first + len(office_wait) + len(livingspace_wait)
+
+
+class Snapshot(object):
+    """
+        Class: Snapshot
+        _______________
+        A snapshot file mapped into memory. Answers the same lookups as
+        storage.LazyStore by reading the fields it needs straight from the
+        mapping, so it can be used as the store of a lazily loaded Amity
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot:
+            self.map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.people, self.rooms, self.occupants, self.office_wait,
+         self.livingspace_wait, self.high_water) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(path + " is not an amity snapshot")
+        self.people_start = HEADER.size
+        self.rooms_start = self.people_start + self.people * PERSON.size
+        self.id_index = self.rooms_start + self.rooms * ROOM.size
+        self.name_index = self.id_index + self.people * NUMBER.size
+        self.room_index = self.name_index + self.people * NUMBER.size
+        self.occupants_start = self.room_index + self.rooms * NUMBER.size
+        self.waitlists_start = self.occupants_start + self.occupants * NUMBER.size
+        self.heap = self.waitlists_start + (self.office_wait + self.livingspace_wait) * NUMBER.size
+
+    def number(self, section, position):
+        return NUMBER.unpack_from(self.map, section + position * NUMBER.size)[0]
+
+    def text(self, offset, length):
+        return self.map[self.heap + offset:self.heap + offset + length]
+
+    def person_at(self, person):
+        """
+        :param person: person number
+        :return: (id_no, name, role, office, livingspace) with the rooms as room numbers
+        """
+        id_offset, id_length, name_offset, name_length, role, office, livingspace = \
+            PERSON.unpack_from(self.map, self.people_start + person * PERSON.size)
+        return (self.text(id_offset, id_length).decode("utf-8"), self.text(name_offset, name_length).decode("utf-8"),
+                Role.name(role), office, livingspace)
+
+    def room_at(self, room):
+        """
+        :param room: room number
+        :return: (name, room_type, capacity, count, first)
+        """
+        name_offset, name_length, room_type, capacity, count, first = \
+            ROOM.unpack_from(self.map, self.rooms_start + room * ROOM.size)
+        return self.text(name_offset, name_length).decode("utf-8"), ROOM_TYPES[room_type], capacity, count, first
+
+    def search(self, index, count, key, key_of):
+        """
+        :return: the first position in an index whose key is not below key
+        """
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if key_of(self.number(index, middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def person_key(self, person):
+        return self.text(*PERSON.unpack_from(self.map, self.people_start + person * PERSON.size)[:2])
+
+    def name_key(self, person):
+        return self.text(*PERSON.unpack_from(self.map, self.people_start + person * PERSON.size)[2:4]).lower()
+
+    def room_key(self, room):
+        return self.text(*ROOM.unpack_from(self.map, self.rooms_start + room * ROOM.size)[:2])
+
+    def person(self, id_no):
+        """
+        :param id_no: id number of the person
+        :return: (name, role) of the person or None
+        """
+        key = id_no.encode("utf-8")
+        position = self.search(self.id_index, self.people, key, self.person_key)
+        if position == self.people or self.person_key(self.number(self.id_index, position)) != key:
+            return None
+        return self.person_at(self.number(self.id_index, position))[1:3]
+
+    def room(self, name):
+        """
+        :param name: name of the room
+        :return: (room_type, capacity, occupants) of the room or None
+        """
+        key = name.encode("utf-8")
+        position = self.search(self.room_index, self.rooms, key, self.room_key)
+        if position == self.rooms or self.room_key(self.number(self.room_index, position)) != key:
+            return None
+        name, room_type, capacity, count, first = self.room_at(self.number(self.room_index, position))
+        return room_type, capacity, [self.person_at(self.number(self.occupants_start, first + occupant))[0]
+                                     for occupant in range(count)]
+
+    def find(self, name):
+        """
+        :param name: the full name, ignoring case
+        :return: (id_no, name, role) of every person with the name
+        """
+        key = name.encode("utf-8").lower()
+        found = []
+        position = self.search(self.name_index, self.people, key, self.name_key)
+        while position < self.people and self.name_key(self.number(self.name_index, position)) == key:
+            found.append(self.person_at(self.number(self.name_index, position))[:3])
+            position += 1
+        return found
+
+    def read_state(self):
+        """
+        :return: the whole state as rows, see amity.storage
+        """
+        people = [self.person_at(person) for person in range(self.people)]
+        rooms = [self.room_at(room) for room in range(self.rooms)]
+        allocations = []
+        for name, room_type, capacity, count, first in rooms:
+            allocations.extend((people[self.number(self.occupants_start, first + occupant)][0], name)
+                               for occupant in range(count))
+        waitlist = [people[self.number(self.waitlists_start, position)][0]
+                    for position in range(self.office_wait + self.livingspace_wait)]
+        return {"people": [person[:3] for person in people],
+                "rooms": [room[:3] for room in rooms],
+                "allocations": allocations,
+                "unallocated": waitlist[:self.office_wait],
+                "livingspace_waitlist": waitlist[self.office_wait:],
+                "high_water": self.high_water}
+
+    def close(self):
+        self.map.close()
+
+
+def convert_state(source, target):
+    """
+    Converts a SQLite database to a snapshot or a snapshot to a SQLite
+    database, depending on the format of source. The journal of a database
+    is not converted, a journal left next to the target database is deleted
+    ______________________________________________________
+    :param source: path of the database or snapshot to read
+    :param target: path of the snapshot or database to write
+    :return: number of rows written
+    """
+    if is_snapshot(source):
+        snapshot = Snapshot(source)
+        try:
+            state = snapshot.read_state()
+        finally:
+            snapshot.close()
+        conn = sqlite3.connect(target)
+        conn.isolation_level = None
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN")
+            try:
+                rows = storage.write_state(conn, state)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        remove_segments([segment for number, segment in segments(target + ".journal")])
+        return rows
+    conn = sqlite3.connect(source)
+    conn.isolation_level = None
+    try:
+        storage.migrate(conn)
+        state = storage.read_state(conn)
+    finally:
+        conn.close()
+    return write_snapshot(target, state)
@@ -0,0 +1,110 @@
+"""
+    stats
+    ______________
+    Call counts and latencies of the methods of an Amity instance. Nothing is
+    measured until Stats.instrument wraps the methods of an instance, so the
+    methods cost nothing extra while statistics are off.
+"""
+import functools
+import time
+from collections import deque
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+def percentile(latencies, fraction):
+    """
+    :param latencies: sorted list of seconds
+    :param fraction: e.g. 0.5 for the median
+    :return: the latency below which fraction of the latencies fall
+    """
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class Stats(object):
+    """
+        Class: Stats
+        ____________
+        Counts the calls and the seconds spent in every instrumented method
+        and keeps the latencies of the last window calls of every method for
+        the percentiles. rows holds the number of rows read and written by
+        load_state and save_state.
+    """
+    window = 10000
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.latencies = {}
+        self.rows = {"read": 0, "written": 0}
+        self.wrapped = []
+
+    def instrument(self, instance, names):
+        """
+        Replaces methods of an instance with timed versions
+        ______________________________________________________
+        :param instance: the object whose methods are timed
+        :param names: names of the methods
+        """
+        for name in names:
+            setattr(instance, name, self.timed(name, getattr(instance, name)))
+            self.wrapped.append(name)
+
+    def remove(self, instance):
+        """
+        Restores the methods wrapped by instrument
+        ______________________________________________________
+        :param instance: the object passed to instrument
+        """
+        for name in self.wrapped:
+            instance.__dict__.pop(name, None)
+        self.wrapped = []
+
+    def timed(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, timer() - start)
+        return wrapper
+
+    def record(self, name, seconds):
+        if name not in self.calls:
+            self.calls[name] = 0
+            self.seconds[name] = 0.0
+            self.latencies[name] = deque(maxlen=self.window)
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+        self.latencies[name].append(seconds)
+
+    def add_rows(self, kind, rows):
+        """
+        :param kind: read or written
+        :param rows: number of rows
+        """
+        self.rows[kind] += rows
+
+    def reset(self):
+        self.calls = {}
+        self.seconds = {}
+        self.latencies = {}
+        self.rows = {"read": 0, "written": 0}
+
+    def report(self):
+        """
+        :return: table of the methods called so far, the slowest in total first
+        """
+        if not self.calls:
+            output = "No calls recorded yet\n"
+        else:
+            row = "{:<24} {:>9} {:>11} {:>10} {:>10}\n"
+            output = row.format("METHOD", "CALLS", "TOTAL s", "P50 ms", "P99 ms")
+            for name in sorted(self.calls, key=lambda name: -self.seconds[name]):
+                latencies = sorted(self.latencies[name])
+                output += row.format(name, self.calls[name], "{:.4f}".format(self.seconds[name]),
+                                     "{:.4f}".format(percentile(latencies, 0.50) * 1000),
+                                     "{:.4f}".format(percentile(latencies, 0.99) * 1000))
+        output += "rows read: {} rows written: {}\n".format(self.rows["read"], self.rows["written"])
+        return output
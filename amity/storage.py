@@ -0,0 +1,363 @@
+"""
+    storage
+    ______________
+    The SQLite schema amity saves its state to and the migrations from the
+    older layouts. The version of the schema of a database is kept in its
+    user_version:
+
+        0   a pickled STATE blob next to the EMPLOYEES, FELLOWS, STAFF, ROOMS,
+            OFFICES and ACCOMMODATIONS tables, or an empty database
+        1   the same tables keyed by ID_NO and ROOMNAME plus an UNALLOCATED
+            table, without the STATE blob
+        2   PEOPLE, ROOMS and an ALLOCATIONS junction table
+        3   the same tables with an index on the names of PEOPLE
+        4   a META table with the largest id number handed out so far
+        5   UNALLOCATED holds the waitlist of every room type, keyed by
+            ROOM_TYPE and POSITION
+
+    State is passed around as a dict of lists of rows so that the same
+    writers are used for saving and for migrating:
+
+        people:         (id_no, name, role)
+        rooms:          (name, room_type, capacity)
+        allocations:    (id_no, room_name)
+        unallocated:    id_no of the people waiting for an office, first come first
+        livingspace_waitlist:   id_no of the fellows waiting for a living space, optional
+        high_water:     the largest id number handed out so far, optional
+        journal_seq:    sequence number of the last change of the journal in the
+                        snapshot, see amity.journal, optional
+"""
+import pickle
+import sqlite3
+from collections import OrderedDict
+
+SCHEMA_VERSION = 5
+
+TABLES = ["EMPLOYEES", "FELLOWS", "STAFF", "ROOMS", "OFFICES", "ACCOMMODATIONS", "STATE",
+          "PEOPLE", "ALLOCATIONS", "UNALLOCATED", "META"]
+
+CAPACITY = {"office": 6, "livingspace": 4}
+
+
+def schema_version(conn):
+    """
+    :param conn: connection to a database
+    :return: the version of the schema of the database
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def table_exists(conn, table):
+    found = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return found.fetchone() is not None
+
+
+def create_tables(conn):
+    """
+    Drops the tables of any older schema and creates the current one
+    ______________________________________________
+    :param conn: connection with an open transaction
+    """
+    for table in TABLES:
+        conn.execute("DROP TABLE IF EXISTS " + table)
+    conn.execute('''CREATE TABLE PEOPLE
+                    (ID_NO          TEXT PRIMARY KEY,
+                    NAME            TEXT NOT NULL,
+                    ROLE            TEXT NOT NULL);''')
+    conn.execute('''CREATE TABLE ROOMS
+                    (NAME           TEXT PRIMARY KEY,
+                    TYPE            TEXT NOT NULL,
+                    CAPACITY        INTEGER NOT NULL);''')
+    conn.execute('''CREATE TABLE ALLOCATIONS
+                    (ID_NO          TEXT NOT NULL REFERENCES PEOPLE(ID_NO),
+                    ROOMNAME        TEXT NOT NULL REFERENCES ROOMS(NAME),
+                    PRIMARY KEY (ID_NO, ROOMNAME));''')
+    conn.execute("CREATE INDEX ALLOCATIONS_ROOMNAME ON ALLOCATIONS(ROOMNAME)")
+    conn.execute("CREATE INDEX PEOPLE_NAME ON PEOPLE(NAME COLLATE NOCASE)")
+    create_waitlist_table(conn)
+    create_meta_table(conn)
+    conn.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+
+
+def create_waitlist_table(conn):
+    conn.execute('''CREATE TABLE UNALLOCATED
+                    (ROOM_TYPE      TEXT NOT NULL,
+                    POSITION        INTEGER NOT NULL,
+                    ID_NO           TEXT NOT NULL,
+                    PRIMARY KEY (ROOM_TYPE, POSITION));''')
+
+
+def create_meta_table(conn):
+    conn.execute('''CREATE TABLE META
+                    (KEY            TEXT PRIMARY KEY,
+                    VALUE           INTEGER NOT NULL);''')
+
+
+def write_people(conn, people):
+    conn.executemany("INSERT OR REPLACE INTO PEOPLE(ID_NO, NAME, ROLE) VALUES(?, ?, ?)", people)
+    return len(people)
+
+
+def write_rooms(conn, rooms):
+    conn.executemany("INSERT OR IGNORE INTO ROOMS(NAME, TYPE, CAPACITY) VALUES(?, ?, ?)", rooms)
+    conn.executemany("UPDATE ROOMS SET TYPE = ?, CAPACITY = ? WHERE NAME = ?",
+                     [(room_type, capacity, name) for name, room_type, capacity in rooms])
+    return len(rooms)
+
+
+def write_allocations(conn, room_names, allocations):
+    """
+    Replaces the occupants of the given rooms
+    ______________________________________________
+    :param conn: connection with an open transaction
+    :param room_names: names of the rooms whose occupants are replaced
+    :param allocations: (id_no, room_name) of all the occupants of those rooms
+    :return: number of rows written
+    """
+    conn.executemany("DELETE FROM ALLOCATIONS WHERE ROOMNAME = ?", [(name,) for name in room_names])
+    conn.executemany("INSERT INTO ALLOCATIONS(ID_NO, ROOMNAME) VALUES(?, ?)", allocations)
+    return len(allocations)
+
+
+def write_waitlist(conn, room_type, waitlist, start=0):
+    """
+    Replaces the waitlist of a room type from the given position on
+    ______________________________________________
+    :param conn: connection with an open transaction
+    :param room_type: office or livingspace
+    :param waitlist: all the ids waiting for a room of the type, first come first
+    :param start: number of ids at the head of the waitlist already in the database
+    :return: number of rows written
+    """
+    conn.execute("DELETE FROM UNALLOCATED WHERE ROOM_TYPE = ? AND POSITION >= ?", (room_type, start))
+    rows = [(room_type, position, id_no) for position, id_no in enumerate(waitlist) if position >= start]
+    conn.executemany("INSERT INTO UNALLOCATED(ROOM_TYPE, POSITION, ID_NO) VALUES(?, ?, ?)", rows)
+    return len(rows)
+
+
+def read_waitlist(conn, room_type):
+    return [row[0] for row in conn.execute("SELECT ID_NO FROM UNALLOCATED WHERE ROOM_TYPE = ? "
+                                           "ORDER BY POSITION", (room_type,))]
+
+
+def largest_id(conn):
+    """
+    :param conn: connection to a database with a PEOPLE table
+    :return: the largest numeric id number of the people in the database
+    """
+    found = conn.execute("SELECT MAX(CAST(ID_NO AS INTEGER)) FROM PEOPLE WHERE ID_NO GLOB '[0-9]*'")
+    return found.fetchone()[0] or 0
+
+
+def write_high_water(conn, high_water):
+    conn.execute("INSERT OR REPLACE INTO META(KEY, VALUE) VALUES('id_high_water', ?)", (high_water,))
+
+
+def read_high_water(conn):
+    found = conn.execute("SELECT VALUE FROM META WHERE KEY = 'id_high_water'").fetchone()
+    return found[0] if found else largest_id(conn)
+
+
+def write_journal_seq(conn, seq):
+    conn.execute("INSERT OR REPLACE INTO META(KEY, VALUE) VALUES('journal_seq', ?)", (seq,))
+
+
+def read_journal_seq(conn):
+    found = conn.execute("SELECT VALUE FROM META WHERE KEY = 'journal_seq'").fetchone()
+    return found[0] if found else 0
+
+
+def write_state(conn, state):
+    """
+    Writes a whole state to freshly created tables
+    ______________________________________________
+    :param conn: connection with an open transaction
+    :param state: dict of rows, see the module docstring
+    :return: number of rows written
+    """
+    create_tables(conn)
+    rows = write_people(conn, state["people"])
+    rows += write_rooms(conn, state["rooms"])
+    rows += write_allocations(conn, [], state["allocations"])
+    rows += write_waitlist(conn, "office", state["unallocated"])
+    rows += write_waitlist(conn, "livingspace", state.get("livingspace_waitlist", []))
+    write_high_water(conn, max(state.get("high_water", 0), largest_id(conn)))
+    write_journal_seq(conn, state.get("journal_seq", 0))
+    return rows
+
+
+def read_state(conn):
+    """
+    Reads a whole state with one SELECT per table
+    ______________________________________________
+    :param conn: connection to a database at SCHEMA_VERSION
+    :return: dict of rows, see the module docstring
+    """
+    return {
+        "people": conn.execute("SELECT ID_NO, NAME, ROLE FROM PEOPLE").fetchall(),
+        "rooms": conn.execute("SELECT NAME, TYPE, CAPACITY FROM ROOMS ORDER BY rowid").fetchall(),
+        "allocations": conn.execute("SELECT ID_NO, ROOMNAME FROM ALLOCATIONS").fetchall(),
+        "unallocated": read_waitlist(conn, "office"),
+        "livingspace_waitlist": read_waitlist(conn, "livingspace"),
+        "high_water": read_high_water(conn),
+        "journal_seq": read_journal_seq(conn),
+    }
+
+
+def rows_from_dicts(rooms, offices, accommodations, fellows, staff, unallocated):
+    """
+    Turns the containers of the older layouts into a state dict
+    """
+    state = {"people": [], "rooms": [], "allocations": [], "unallocated": list(unallocated)}
+    for role, people in (("fellow", fellows), ("staff", staff)):
+        state["people"].extend((id_no, name, role) for id_no, name in people.items())
+    for name in rooms:
+        room_type = "livingspace" if name in accommodations else "office"
+        state["rooms"].append((name, room_type, CAPACITY[room_type]))
+    for occupants in (offices, accommodations):
+        for name, ids in occupants.items():
+            state["allocations"].extend((id_no, name) for id_no in ids)
+    return state
+
+
+def empty_state():
+    return rows_from_dicts([], {}, {}, {}, {}, [])
+
+
+def read_version_0(conn):
+    data = conn.execute("SELECT State FROM STATE").fetchone()[0]
+    rooms, offices, employees, accommodations, fellows, staff, allocated, unallocated = pickle.loads(bytes(data))
+    return rows_from_dicts(rooms, offices, accommodations, fellows, staff, unallocated)
+
+
+def read_version_1(conn):
+    def occupants(table):
+        return dict((name, [id_no for id_no in ids.split(",") if id_no])
+                    for name, ids in conn.execute("SELECT ROOMNAME, OCCUPANTS FROM " + table))
+    return rows_from_dicts([row[0] for row in conn.execute("SELECT ROOMNAME FROM ROOMS ORDER BY rowid")],
+                           occupants("OFFICES"), occupants("ACCOMMODATIONS"),
+                           dict(conn.execute("SELECT ID_NO, NAME FROM FELLOWS")),
+                           dict(conn.execute("SELECT ID_NO, NAME FROM STAFF")),
+                           [row[0] for row in conn.execute("SELECT ID_NO FROM UNALLOCATED ORDER BY POSITION")])
+
+
+def migrate(conn):
+    """
+    Upgrades a database to SCHEMA_VERSION in a single transaction. The
+    connection has to be in autocommit mode (isolation_level None)
+    ______________________________________________
+    :param conn: connection to the database
+    :return: the version the database had before
+    """
+    version = schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+    conn.execute("BEGIN")
+    try:
+        if version >= 2:
+            if version < 3:
+                conn.execute("CREATE INDEX PEOPLE_NAME ON PEOPLE(NAME COLLATE NOCASE)")
+            if version < 4:
+                create_meta_table(conn)
+                write_high_water(conn, largest_id(conn))
+            if version < 5:
+                # the people without any room wait for an office
+                unallocated = [row[0] for row in conn.execute("SELECT ID_NO FROM UNALLOCATED ORDER BY POSITION")]
+                conn.execute("DROP TABLE UNALLOCATED")
+                create_waitlist_table(conn)
+                write_waitlist(conn, "office", unallocated)
+            conn.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+        elif table_exists(conn, "UNALLOCATED"):
+            version = 1
+            write_state(conn, read_version_1(conn))
+        elif table_exists(conn, "STATE") and conn.execute("SELECT COUNT(*) FROM STATE").fetchone()[0]:
+            write_state(conn, read_version_0(conn))
+        else:
+            write_state(conn, empty_state())
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+
+class LRUCache(object):
+    """
+        Class: LRUCache
+        _______________
+        A dict that holds at most size items and forgets the least recently
+        used item when it is full
+    """
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        value = self.items.pop(key)
+        self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+
+class LazyStore(object):
+    """
+        Class: LazyStore
+        ________________
+        Reads people and rooms from a saved database the first time they are
+        asked for instead of loading the whole state, and keeps the ones read
+        most recently in LRU caches
+    """
+    def __init__(self, path, cache_size=10000):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.people = LRUCache(cache_size)
+        self.rooms = LRUCache(cache_size)
+
+    def person(self, id_no):
+        """
+        :param id_no: id number of the person
+        :return: (name, role) of the person or None
+        """
+        if id_no not in self.people:
+            self.people.put(id_no, self.conn.execute("SELECT NAME, ROLE FROM PEOPLE WHERE ID_NO = ?",
+                                                     (id_no,)).fetchone())
+        return self.people.get(id_no)
+
+    def room(self, name):
+        """
+        :param name: name of the room
+        :return: (room_type, capacity, occupants) of the room or None
+        """
+        if name not in self.rooms:
+            room = self.conn.execute("SELECT TYPE, CAPACITY FROM ROOMS WHERE NAME = ?", (name,)).fetchone()
+            if room is not None:
+                occupants = [row[0] for row in
+                             self.conn.execute("SELECT ID_NO FROM ALLOCATIONS WHERE ROOMNAME = ?", (name,))]
+                room = (room[0], room[1], occupants)
+            self.rooms.put(name, room)
+        return self.rooms.get(name)
+
+    def find(self, name):
+        """
+        :param name: the full name, ignoring case
+        :return: (id_no, name, role) of every person with the name
+        """
+        return self.conn.execute("SELECT ID_NO, NAME, ROLE FROM PEOPLE WHERE NAME = ? COLLATE NOCASE "
+                                 "ORDER BY rowid", (name,)).fetchall()
+
+    def read_state(self):
+        return read_state(self.conn)
+
+    def close(self):
+        self.conn.close()
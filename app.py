@@ -5,7 +5,8 @@ Amity is a simple Commandline room alloaction application
 Usage:
     app.py create_room <room_name>...[--ls|--o]
     app.py add_person <role> <firstname> <surname> [<Accomodation>]
-    app.py (-i | --interactive)
+    app.py (-i | --interactive) [--strategy=<name>] [--stats] [--no-banner] [--quiet]
+    app.py run [<script>] [--keep-going] [--strategy=<name>] [--stats] [--quiet]
     app.py (-h | --help)
     app.py (-v | --version)
     app.py quit
@@ -16,9 +17,15 @@ arguments:
     <firstname>         First name of the Person
     <surname>           The surname of the Person
     <Accomodation>      Whether Person wants accomodation or not i.e 'N' or 'Y'
+    <script>            File of amity commands, one per line, read from stdin when left out or -
 
 Options:
     -i --interactive        Interactive Mode
+    --strategy=<name>       How rooms are picked: random, least-loaded or pack-first [default: random]
+    --stats                 Count and time every call, see the stats command
+    --no-banner             Start without clearing the screen and printing the banner
+    --keep-going            Run the rest of a script after a command fails
+    --quiet                 Only print the results of commands, not every allocation
     -h --help               Show this screen and exit
     -v --version
     --ls --LivingSpace
@@ -26,17 +33,55 @@ Options:
 
 """
 
-import os
 import sys
 import cmd
-import signal
-from termcolor import cprint, colored
-from pyfiglet import figlet_format
-from docopt import docopt, DocoptExit
+from docopt import docopt, DocoptExit, Dict
 
-from amity.amity import Amity
-from amity.person import Person,Fellow,Staff
-from amity.room import Room,LivingSpace,Office
+from amity.amity import Amity, Failed
+from amity.events import LEVELS
+from amity.reports import FORMATS, ChunkedWriter
+
+
+CLEAR_SCREEN = "\033[2J\033[H"
+BOLD_GREEN = "\033[1m\033[32m"
+RESET = "\033[0m"
+
+def split_add_person(words):
+    """
+    :param words: the arguments of an add_person line
+    :return: the arguments docopt would parse them to, None for lines only docopt can parse
+    """
+    if len(words) not in (3, 4) or any(word.startswith("-") for word in words):
+        return None
+    return Dict([("<role>", words[0]), ("<firstname>", words[1]), ("<surname>", words[2]),
+                 ("<accommodate>", words[3] if len(words) == 4 else None)])
+
+
+def split_create_room(words):
+    """
+    :param words: the arguments of a create_room line
+    :return: the arguments docopt would parse them to, None for lines only docopt can parse
+    """
+    names = [word for word in words if word not in ("--ls", "--o")]
+    flags = len(words) - len(names)
+    if not names or flags > 1 or any(name.startswith("-") for name in names):
+        return None
+    return Dict([("<room_name>", names), ("--ls", "--ls" in words), ("--o", "--o" in words)])
+
+
+# provisioning scripts are thousands of add_person and create_room lines, their plain
+# lines are split directly instead of parsing the usage with docopt every time
+SPLIT_ARGS = {"do_add_person": split_add_person, "do_create_room": split_create_room}
+
+
+def parse_args(func, doc, args):
+    """
+    Parses the arguments of a command with its split function when it has one
+    and the line is plain, with docopt otherwise
+    """
+    split = SPLIT_ARGS.get(func.__name__)
+    opt = split(args.split()) if split is not None else None
+    return opt if opt is not None else docopt(doc, args)
 
 
 def docopt_cmd(func):
@@ -46,9 +91,10 @@ def docopt_cmd(func):
     """
     def fn(self, args):
         try:
-            opt = docopt(fn.__doc__, args)
+            opt = parse_args(func, fn.__doc__, args)
         except DocoptExit as error:
             # The DocoptExit is thrown when the args do not match
+            self.failed = True
             print('The command entered is invalid!')
             print(error)
             return
@@ -65,9 +111,13 @@ def docopt_cmd(func):
 def app_header():
     """
         This function creates the header that is displayed when the app
-        launches
+        launches. pyfiglet takes longer to import than the rest of the app
+        together so it is only imported here
    """
-    os.system("clear")
+    from termcolor import cprint
+    from pyfiglet import figlet_format
+    if sys.stdout.isatty():
+        sys.stdout.write(CLEAR_SCREEN)
     print("\n")
     cprint(figlet_format('AMITY', font='epic'), 'yellow')
     cprint('--------------------------------------------------------------------------', 'red')
@@ -78,6 +128,7 @@ def app_header():
 
 def custom_print(arg, color='green'):
     """ This is a simple print function that adds color to printed output. """
+    from termcolor import cprint
     cprint("\n" + arg + "\n", color)
 
 
@@ -85,8 +136,26 @@ class AmityCLI(cmd.Cmd):
     """
         This class creates Amity Command Line Interface for user interaction
     """
-    app_prompt = colored('Amity => ', 'green', attrs=['bold'])
+    app_prompt = BOLD_GREEN + 'Amity => ' + RESET
     prompt = app_prompt
+    failed = False
+
+    def show(self, result):
+        """
+        Prints the events amity logged while running a command, such as the
+        allocations made, and then the result of the command, which fails the
+        command when it is an error
+        """
+        for message in amity.events.render():
+            print(message)
+        print(result)
+        if isinstance(result, Failed):
+            self.failed = True
+
+    def default(self, line):
+        """ Called for unknown commands """
+        self.failed = True
+        print("Unknown command " + line.split()[0] + ", type 'help' to see a full list of commands")
 
     @docopt_cmd
     def do_add_person(self, args):
@@ -102,6 +171,7 @@ class AmityCLI(cmd.Cmd):
                   "\n- <role> can either be 'Fellow' or 'Staff' "
                   "only.\n- Type 'help add_person' for more information",
                   'red')
+            self.failed = True
             return
         accommodate = args['<accommodate>'] or 'N'
         accommodate = accommodate.upper()
@@ -110,8 +180,9 @@ class AmityCLI(cmd.Cmd):
                   "\n- <Accommodate> can either be 'Y' or "
                   "'N' only.\n- Type 'help add_person' for "
                   "more information", 'red')
+            self.failed = True
             return
-        print(amity.add_person(role, name, accommodate))
+        self.show(amity.add_person(role, name, accommodate))
 
     @docopt_cmd
     def do_create_room(self, args):
@@ -133,7 +204,7 @@ class AmityCLI(cmd.Cmd):
             room_type = "office"
         else:
             room_type = "office"
-        print(amity.create_room(room_args, room_type))
+        self.show(amity.create_room(room_args, room_type))
 
     @docopt_cmd
     def do_reallocate_person(self, args):
@@ -145,39 +216,100 @@ class AmityCLI(cmd.Cmd):
         """
         id_no = args["<id_no>"]
         room_name = args["<room_name>"]
-        print(amity.reallocate_person(id_no, room_name))
+        self.show(amity.reallocate_person(id_no, room_name))
+
+    @docopt_cmd
+    def do_reallocate_many(self, args):
+        """
+        Applies a file of moves from data/input. Every line
+        of the file is an id_no followed by a room_name.
+        -----------------------------------------------------
+        Usage: reallocate_many <filename>
+        """
+        self.show(amity.reallocate_many(args["<filename>"]))
+
+    @docopt_cmd
+    def do_drain_unallocated(self, args):
+        """
+        Places the people waiting for an office or a living
+        space in the rooms that have space, first come first.
+        With --dry-run it only lists who would be placed.
+        -----------------------------------------------------
+        Usage: drain_unallocated [--dry-run]
+        """
+        self.show(amity.drain_unallocated(args["--dry-run"]))
+
+    @docopt_cmd
+    def do_set_strategy(self, args):
+        """
+        Sets how amity picks rooms when allocating people.
+        random spreads people at random, least-loaded picks the
+        emptiest room and pack-first fills rooms before using new ones.
+        -----------------------------------------------------
+        Usage: set_strategy <strategy>
+        """
+        self.show(amity.set_strategy(args['<strategy>'].lower()))
 
     @docopt_cmd
     def do_load_people(self, args):
         """
-        Adds people to rooms from a text file
+        Adds people to rooms from a text file. <filename> can
+        also be a directory or a glob pattern such as 'cohort*.txt'
+        in which case all the files are parsed in parallel.
         -----------------------------------------------------
         usage: load_people <filename>
         """
 
-        print(amity.load_people(args['<filename>']))
+        self.show(amity.load_people(args['<filename>']))
+
+    @docopt_cmd
+    def do_load_rooms(self, args):
+        """
+        Creates rooms from a manifest in data/input. Every
+        line has a room name, its type (office or livingspace)
+        and optionally its capacity.
+        -----------------------------------------------------
+        usage: load_rooms <filename>
+        """
+        self.show(amity.load_rooms(args['<filename>']))
 
     @docopt_cmd
     def do_print_allocations(self, args):
         """
         Prints a list of allocations onto the screen.
         Specifying the optional -o option here outputs
-        the registered allocations to a txt file.
+        the registered allocations to a file.
+        --format is text, csv or ndjson and --type limits
+        the list to office or livingspace rooms.
         -----------------------------------------------------
-        usage: print_allocations [--o=filename]
+        usage: print_allocations [--o=filename] [--format=<fmt>] [--type=<room_type>] [--sort]
         """
-        print(amity.print_allocations(args['--o']))
+        fmt = args['--format'] or "text"
+        if args['--o'] is not None:
+            self.show(amity.print_allocations(args['--o'], fmt, args['--type'], args['--sort']))
+        elif fmt not in FORMATS:
+            self.failed = True
+            print("Unknown format " + fmt + ", use one of: " + ", ".join(FORMATS))
+        else:
+            amity.write_allocations(sys.stdout, fmt, args['--type'], args['--sort'])
 
     @docopt_cmd
     def do_print_unallocated(self, args):
         """
-        Prints a list of allocations onto the screen.
+        Prints a list of unallocated people onto the screen.
         Specifying the optional -o option here outputs
-        the registered allocations to a txt file
+        the unallocated people to a file
         -----------------------------------------------------
-        usage: print_unallocated [--o=filename]
+        usage: print_unallocated [--o=filename] [--format=<fmt>]
         """
-        print(amity.print_unallocated(args['--o']))
+        fmt = args['--format'] or "text"
+        if args['--o'] is not None:
+            self.show(amity.print_unallocated(args['--o'], fmt))
+        elif fmt not in FORMATS:
+            self.failed = True
+            print("Unknown format " + fmt + ", use one of: " + ", ".join(FORMATS))
+        else:
+            amity.write_unallocated(sys.stdout, fmt)
 
     @docopt_cmd
     def do_print_room(self, arg):
@@ -187,31 +319,61 @@ class AmityCLI(cmd.Cmd):
         -----------------------------------------------------
         usage: print_room <room_name>
         """
-        print(amity.print_room(arg['<room_name>']))
+        self.show(amity.print_room(arg['<room_name>']))
 
     @docopt_cmd
     def do_save_state(self, args):
         """
         Persists all the data stored in the app to a
         SQLite database. Specifying the --db parameter explicitly stores the data in the
-        SQlite database specified.
+        SQlite database specified. With --snapshot the state is
+        saved as a binary snapshot that load_state maps into memory.
         -----------------------------------------------------
-        usage: save_state [--db=sqlite_database]
+        usage: save_state [--db=sqlite_database] [--snapshot]
         """
         if not args['--db']:
             args['--db'] = 'amity.db'
-        print(amity.save_state(args['--db']))
+        self.show(amity.save_state(args['--db'], snapshot=args['--snapshot']))
+
+    @docopt_cmd
+    def do_convert_state(self, args):
+        """
+        Converts a SQLite database in data/states to a binary
+        snapshot, or a binary snapshot to a SQLite database.
+        -----------------------------------------------------
+        usage: convert_state <source> <target>
+        """
+        self.show(amity.convert_state(args['<source>'], args['<target>']))
 
     @docopt_cmd
     def do_load_state(self, args):
         """
         Loads data from a database into the application.
+        With --lazy rooms and people are only read from the
+        database when a command needs them.
         -----------------------------------------------------
-        usage: load_state [--db=sqlite_database]
+        usage: load_state [--db=sqlite_database] [--lazy]
         """
         if not args['--db']:
             args['--db'] = 'amity.db'
-        print(amity.load_state(args['--db']))
+        self.show(amity.load_state(args['--db'], lazy=args['--lazy']))
+
+    @docopt_cmd
+    def do_journal(self, args):
+        """
+        Saves the state to a database and writes every change made
+        after that to its journal, which load_state replays.
+        With --compact the journal is folded into the database now
+        and with --off the state is saved and journaling stops.
+        -----------------------------------------------------
+        usage: journal [--db=sqlite_database] [--off | --compact]
+        """
+        if args['--off']:
+            self.show(amity.disable_journal())
+        elif args['--compact']:
+            self.show(amity.compact_journal())
+        else:
+            self.show(amity.enable_journal(args['--db'] or 'amity.db'))
 
     @docopt_cmd
     def do_get_id(self, args):
@@ -222,17 +384,155 @@ class AmityCLI(cmd.Cmd):
         """
         search_name = args['<firstname>'].upper()
         search_name += " " + args['<surname>'].upper()
-        print(amity.get_person_id(search_name))
+        self.show(amity.get_person_id(search_name))
+
+    @docopt_cmd
+    def do_find_person(self, args):
+        """
+        Finds all the people whose name matches and prints their
+        id number, role and rooms. --prefix matches the start of
+        the name and --fuzzy allows a typo in every word.
+        _________________________________________________________
+        Usage: find_person <name>... [--prefix | --fuzzy] [--limit=<n>]
+        """
+        mode = "exact"
+        if args['--prefix']:
+            mode = "prefix"
+        elif args['--fuzzy']:
+            mode = "fuzzy"
+        limit = int(args['--limit'] or 20)
+        self.show(amity.find_person(" ".join(args['<name>']), mode, limit))
+
+    @docopt_cmd
+    def do_stats(self, args):
+        """
+        Prints the number of calls and the total, median and 99th
+        percentile time of every amity method called so far and the
+        rows read and written by load_state and save_state.
+        --on and --off turn the statistics on and off, --reset
+        starts counting from zero again.
+        _________________________________________________________
+        Usage: stats [--on | --off] [--reset]
+        """
+        if args['--on']:
+            self.show(amity.enable_stats())
+        elif args['--off']:
+            self.show(amity.disable_stats())
+            return
+        self.show(amity.print_stats(args['--reset']))
+
+    @docopt_cmd
+    def do_summary(self, args):
+        """
+        Prints the rooms, seats and free seats of every room type,
+        how many rooms are full, partially filled or empty, the
+        people waiting for every room type and the people of
+        every role.
+        _________________________________________________________
+        Usage: summary
+        """
+        self.show(amity.print_summary())
+
+    @docopt_cmd
+    def do_log_level(self, args):
+        """
+        Sets which events are printed before the result of every
+        command: debug, info (the default) prints every allocation,
+        warning only rooms running out and quiet nothing at all.
+        _________________________________________________________
+        Usage: log_level <level>
+        """
+        level = args['<level>'].lower()
+        if level not in LEVELS:
+            self.failed = True
+        print(amity.events.set_level(level))
+
+    @docopt_cmd
+    def do_profile(self, args):
+        """
+        Runs a single command under cProfile and prints the 20
+        functions it spent the most time in. --o saves the full
+        profile to data/output for pstats or snakeviz instead.
+        _________________________________________________________
+        Usage: profile [--o=filename] <command>...
+        """
+        # the profiler is only imported when it is used, pstats alone takes
+        # a good part of the start up time of the app
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(self.onecmd, " ".join(args['<command>']))
+        if args['--o']:
+            profiler.dump_stats(amity.output_path(args['--o']))
+            print("\nProfile saved to: {}\n".format(args['--o']))
+        else:
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(20)
 
     def do_quit(self, args):
         """ Quits the interactive mode """
         print("Goodbye!")
         print("Closing Amity...")
+        amity.close_journal()
         exit()
 
+def run_script(lines, keep_going=False):
+    """
+    Runs a file of commands, one per line, against the amity instance. Blank
+    lines and lines starting with # are skipped. Output is buffered and
+    written in chunks
+    ____________________________________________________________________
+    :param lines: any iterable of lines, e.g. an open file or sys.stdin
+    :param keep_going: whether to run the rest of the script after a command fails
+    :return: number of commands that failed
+    """
+    cli = AmityCLI()
+    stdout = sys.stdout
+    sys.stdout = ChunkedWriter(stdout)
+    failed = 0
+    try:
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            cli.failed = False
+            try:
+                cli.onecmd(line)
+            except SystemExit:
+                break
+            except Exception as error:
+                cli.failed = True
+                print("Error: " + str(error))
+            if cli.failed:
+                failed += 1
+                sys.stdout.flush()
+                sys.stderr.write("line {}: {} failed\n".format(line_no, line))
+                if not keep_going:
+                    break
+    finally:
+        sys.stdout.flush()
+        sys.stdout = stdout
+    return failed
+
+
 opt = docopt(__doc__, sys.argv[1:])
 
 if opt['--interactive']:
-    app_header()
-    amity = Amity()
+    if not opt['--no-banner'] and sys.stdin.isatty():
+        app_header()
+    amity = Amity(opt['--strategy'])
+    amity.verbose = not opt['--quiet']
+    if opt['--stats']:
+        amity.enable_stats()
     AmityCLI().cmdloop()
+elif opt['run']:
+    amity = Amity(opt['--strategy'])
+    amity.verbose = not opt['--quiet']
+    if opt['--stats']:
+        amity.enable_stats()
+    if opt['<script>'] in (None, '-'):
+        failures = run_script(sys.stdin, opt['--keep-going'])
+    else:
+        with open(opt['<script>']) as script:
+            failures = run_script(script, opt['--keep-going'])
+    amity.close_journal()
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+    bench_amity
+    ______________
+    Benchmarks the core operations of amity at 1k, 100k and 1M people and
+    compares the results with a stored baseline.
+
+    Every size runs in a fresh worker process with a fixed seed so that the
+    peak memory of one size does not leak into the next and two runs on the
+    same machine allocate the same rooms. For every operation the suite
+    reports the calls per second, the 50th, 95th and 99th percentile latency
+    of a call and the peak memory of the whole size. Operations that are run
+    once, such as save_state, report the time of that one call instead.
+    With --repeat every size is run several times and the median of every
+    measurement is kept, which evens out a machine whose speed varies.
+
+    The baseline holds the results of every interpreter separately since
+    the results of one are not comparable with another. A run that finds
+    no baseline to compare with for its interpreter fails.
+
+    Usage:
+        python benchmarks/bench_amity.py                     compare with baseline.json
+        python benchmarks/bench_amity.py --sizes 1k,100k
+        python benchmarks/bench_amity.py --save-baseline     record a new baseline
+
+    The exit status is 1 when an operation got slower, or a size used more
+    memory, than the baseline by more than --tolerance.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import string
+import sys
+import time
+from multiprocessing import Pool
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from amity.amity import Amity, data_path
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+DEFAULT_SIZES = "1k,100k,1m"
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+FIRST_NAMES = ["NAMI", "ZORO", "SANJI", "BROOK", "FRANKY", "ROBIN", "USSOP", "CHOPPER", "JINBE", "LAW",
+               "KIZARU", "AKAINU", "DRAGON", "SHANKS", "BUGGY", "SMOKER", "TASHIGI", "VIVI", "ACE", "SABO"]
+SAMPLES = 10000
+ROSTER = "bench_roster.txt"
+DATABASE = "bench.db"
+REPORT = "bench_allocations.txt"
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+def random_name():
+    surname = "".join(random.choice(string.ascii_uppercase) for _ in range(random.randint(5, 9)))
+    return random.choice(FIRST_NAMES) + " " + surname
+
+
+def random_person():
+    """
+    :return: (role, name, accommodate), half fellows of which half want a living space
+    """
+    if random.random() < 0.5:
+        return "FELLOW", random_name(), random.choice("YN")
+    return "STAFF", random_name(), "N"
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def measure(results, operation, calls):
+    """
+    Times every call and records the throughput and latency percentiles, or
+    the time of the call for operations called once
+    ______________________________________________________
+    :param results: dict the measurements are added to
+    :param operation: name of the operation
+    :param calls: iterable of functions taking no arguments
+    """
+    latencies = []
+    # collect the garbage of the previous operation so that it is not
+    # charged to the first calls of this one
+    gc.collect()
+    for call in calls:
+        start = timer()
+        call()
+        latencies.append(timer() - start)
+    latencies.sort()
+    total = sum(latencies)
+    if len(latencies) == 1:
+        results[operation] = {"calls": 1, "ms": round(total * 1000, 4)}
+        return
+    results[operation] = {
+        "calls": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 1) if total else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+def peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def run_size(people, seed):
+    """
+    Runs every benchmark for one facility size, in a worker process
+    ______________________________________________________
+    :param people: number of people added with add_person
+    :param seed: seed of the random module
+    :return: dict with the measurements of every operation and the peak memory
+    """
+    random.seed(seed)
+    results = {}
+    amity = Amity()
+    amity.verbose = False
+    # enough rooms for everybody plus the people loaded from the roster
+    offices = ["OFFICE" + str(number) for number in range(people // 5 + 1)]
+    living_spaces = ["LIVINGSPACE" + str(number) for number in range(people // 12 + 1)]
+    measure(results, "create_room",
+            [lambda name=name: amity.create_room([name], "office") for name in offices] +
+            [lambda name=name: amity.create_room([name], "livingspace") for name in living_spaces])
+
+    measure(results, "add_person",
+            (lambda person=random_person(): amity.add_person(*person) for _ in range(people)))
+
+    roster = data_path("input/" + ROSTER)
+    with open(roster, "w") as lines:
+        for _ in range(max(people // 10, 100)):
+            lines.write(" ".join(random_person()) + "\n")
+    try:
+        measure(results, "load_people", [lambda: amity.load_people(ROSTER)])
+    finally:
+        os.remove(roster)
+
+    ids = sorted(amity.employees)
+    moves = [(random.choice(ids), random.choice(offices)) for _ in range(min(people, SAMPLES))]
+    measure(results, "reallocate_person",
+            (lambda move=move: amity.reallocate_person(*move) for move in moves))
+
+    names = [amity.employees[random.choice(ids)] for _ in range(min(people, SAMPLES))]
+    measure(results, "get_person_id", (lambda name=name: amity.get_person_id(name) for name in names))
+
+    try:
+        measure(results, "print_allocations", [lambda: amity.print_allocations(REPORT)])
+    finally:
+        os.remove(data_path("output/" + REPORT))
+
+    database = data_path("states/" + DATABASE)
+    try:
+        measure(results, "save_state", [lambda: amity.save_state(DATABASE)])
+        amity = ids = names = None
+        measure(results, "load_state", [lambda: Amity().load_state(DATABASE)])
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+    return {"people": people, "peak_memory_mb": peak_memory_mb(), "operations": results}
+
+
+def median(values):
+    values = sorted(value for value in values if value is not None)
+    return values[len(values) // 2] if values else None
+
+
+def median_run(runs):
+    """
+    :param runs: the results of several runs of one size
+    :return: the results with every measurement the median of the runs
+    """
+    result = dict(runs[0])
+    result["peak_memory_mb"] = median([run["peak_memory_mb"] for run in runs])
+    result["operations"] = {}
+    for operation, measured in runs[0]["operations"].items():
+        result["operations"][operation] = dict(
+            (key, median([run["operations"][operation][key] for run in runs])) for key in measured)
+    return result
+
+
+def run(sizes, seed, repeat=1):
+    python = platform.python_implementation() + " " + platform.python_version()
+    report = {"python": python, "seed": seed, "sizes": {}}
+    for size in sizes:
+        runs = []
+        for _ in range(repeat):
+            pool = Pool(1)
+            try:
+                runs.append(pool.apply(run_size, (SIZES[size], seed)))
+            finally:
+                pool.close()
+                pool.join()
+        report["sizes"][size] = median_run(runs)
+    return report
+
+
+def speedup(result, old):
+    """
+    :param result: the measurement of an operation in this run
+    :param old: the measurement of the operation in the baseline
+    :return: how many times faster this run is, None when there is nothing to compare
+    """
+    if not old or ("ms" in result) != ("ms" in old):
+        return None
+    if "ms" in result:
+        return old["ms"] / result["ms"] if result["ms"] and old["ms"] else None
+    return result["ops_per_sec"] / old["ops_per_sec"] if result["ops_per_sec"] and old["ops_per_sec"] else None
+
+
+def compare(report, baseline, tolerance):
+    """
+    Prints the measurements next to the baseline of the same interpreter
+    ______________________________________________________
+    :param report: the measurements of this run
+    :param baseline: the baselines of every interpreter
+    :param tolerance: fraction a measurement may be worse than the baseline
+    :return: (list of regressions, list of the sizes that had no baseline)
+    """
+    regressions = []
+    missing = []
+    recorded = baseline.get("interpreters", {}).get(report["python"], {})
+    row = "{:<6} {:<18} {:>12} {:>10} {:>10} {:>10} {:>9}"
+    print(row.format("size", "operation", "ops/s", "p50 ms", "p95 ms", "p99 ms", "change"))
+    for size, measured in sorted(report["sizes"].items(), key=lambda item: item[1]["people"]):
+        before = recorded.get(size, {})
+        if not before:
+            missing.append(size)
+        for operation, result in sorted(measured["operations"].items()):
+            old = before.get("operations", {}).get(operation)
+            once = "ms" in result
+            ratio = speedup(result, old)
+            change = ""
+            if ratio is not None:
+                change = "{:+.0%}".format(ratio - 1)
+                if ratio < 1 - tolerance:
+                    key, unit = ("ms", "ms") if once else ("ops_per_sec", "ops/s")
+                    regressions.append("{} {}: {} {}, baseline {} {}".format(
+                        size, operation, result[key], unit, old[key], unit))
+            if once:
+                # one call has no percentiles, its time is printed in the p50 column
+                print(row.format(size, operation, "-", result["ms"], "-", "-", change))
+            else:
+                print(row.format(size, operation, result["ops_per_sec"], result["p50_ms"], result["p95_ms"],
+                                 result["p99_ms"], change))
+        memory = "{:<6} {:<18} {:>10} MB".format(size, "peak memory", measured["peak_memory_mb"])
+        if before.get("peak_memory_mb"):
+            ratio = measured["peak_memory_mb"] / before["peak_memory_mb"]
+            memory += " {:+.0%}".format(ratio - 1)
+            if ratio > 1 + tolerance:
+                regressions.append("{} peak memory: {} MB, baseline {} MB".format(
+                    size, measured["peak_memory_mb"], before["peak_memory_mb"]))
+        print(memory)
+    return regressions, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the core operations of amity")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma separated sizes out of " + ", ".join(sorted(SIZES, key=SIZES.get)))
+    parser.add_argument("--seed", type=int, default=254)
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run every size this many times and keep the median of every measurement")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction a result may be worse than the baseline [default: 0.25]")
+    args = parser.parse_args(argv)
+    sizes = args.sizes.split(",")
+    for size in sizes:
+        if size not in SIZES:
+            parser.error("unknown size " + size)
+
+    report = run(sizes, args.seed, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as stored:
+            baseline = json.load(stored)
+    regressions, missing = compare(report, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True, separators=(",", ": "))
+    if args.save_baseline:
+        baseline.setdefault("interpreters", {}).setdefault(report["python"], {}).update(report["sizes"])
+        baseline["seed"] = report["seed"]
+        with open(args.baseline, "w") as stored:
+            json.dump(baseline, stored, indent=2, sort_keys=True, separators=(",", ": "))
+            stored.write("\n")
+        return 0
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    for size in missing:
+        print("NOT COMPARED {}: no baseline for {}, record one with --save-baseline".format(size, report["python"]))
+    if len(missing) == len(report["sizes"]):
+        print("FAILED nothing was compared")
+        return 1
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import unittest
+
+from amity.allocation import VacancyPool, LeastLoadedStrategy, PackFirstStrategy
+
+
+class TestVacancyPool(unittest.TestCase):
+    """
+    Tests the pool of rooms with free space used by amity to allocate rooms
+    """
+    def setUp(self):
+        self.pool = VacancyPool()
+
+    def test_add_does_not_duplicate_rooms(self):
+        self.pool.add("MARS")
+        self.pool.add("MARS")
+        self.assertEqual(1, len(self.pool))
+
+    def test_discard_keeps_the_index_consistent(self):
+        for name in ["MARS", "EARTH", "VENUS"]:
+            self.pool.add(name)
+        self.pool.discard("MARS")
+        self.pool.discard("PLUTO")
+        self.assertNotIn("MARS", self.pool)
+        self.assertEqual(sorted(["EARTH", "VENUS"]), sorted(self.pool.rooms))
+        for name in self.pool.rooms:
+            self.assertEqual(name, self.pool.rooms[self.pool.positions[name]])
+
+    def test_choice_on_empty_pool(self):
+        self.assertIsNone(self.pool.choice())
+
+    def test_choice_returns_a_vacant_room(self):
+        self.pool.add("MARS")
+        self.pool.add("EARTH")
+        self.assertIn(self.pool.choice(), ["MARS", "EARTH"])
+
+
+class TestHeapStrategies(unittest.TestCase):
+    """
+    Tests the least-loaded and pack-first allocation strategies
+    """
+    def test_least_loaded_picks_the_emptiest_room(self):
+        strategy = LeastLoadedStrategy()
+        strategy.update("MARS", 3, 6)
+        strategy.update("EARTH", 1, 6)
+        strategy.update("VENUS", 2, 6)
+        self.assertEqual("EARTH", strategy.choice())
+        strategy.update("EARTH", 4, 6)
+        self.assertEqual("VENUS", strategy.choice())
+
+    def test_pack_first_fills_rooms_before_opening_new_ones(self):
+        strategy = PackFirstStrategy()
+        strategy.update("MARS", 0, 4)
+        strategy.update("EARTH", 0, 4)
+        self.assertEqual("MARS", strategy.choice())
+        strategy.update("MARS", 3, 4)
+        self.assertEqual("MARS", strategy.choice())
+        strategy.update("MARS", 4, 4)
+        self.assertNotIn("MARS", strategy)
+        self.assertEqual("EARTH", strategy.choice())
+
+    def test_choice_on_full_rooms(self):
+        strategy = LeastLoadedStrategy()
+        strategy.update("MARS", 6, 6)
+        self.assertIsNone(strategy.choice())
+
+if __name__ == '__main__':
+    unittest.main()
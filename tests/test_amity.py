@@ -1,11 +1,13 @@
 # coding=utf-8
 import os
+import shutil
+import threading
 import unittest
 import sqlite3
+import pickle
 
-from amity.amity import Amity
-from amity.person import Person
-from amity.room import Room
+from amity.amity import Amity, Failed, data_path
+from amity import storage
 
 class TestAmity(unittest.TestCase):
     """
@@ -78,15 +80,77 @@ class TestAmity(unittest.TestCase):
         response = self.amity.reallocate_person(id_no, "venus")
         self.assertIn("has been successfully moved", response)
 
+    def test_reallocate_person_moves_out_of_the_old_room(self):
+        self.amity.create_room(["KRYPTON"], "livingspace")
+        self.amity.add_person("fellow", "portgas ace", "Y")
+        id_no = self.amity.get_person_id("PORTGAS ACE").split()[1]
+        self.amity.create_room(["XANDAR"], "livingspace")
+        response = self.amity.reallocate_person(id_no, "xandar")
+        self.assertIn("has been successfully moved", response)
+        self.assertEqual(set(), self.amity.accommodations["KRYPTON"])
+        self.assertEqual({"livingspace": "XANDAR"}, self.amity.person_rooms[id_no])
+
+    def test_reallocate_staff_to_living_space(self):
+        self.amity.create_room(["KRYPTON"], "livingspace")
+        self.amity.add_person("staff", "marshall teach")
+        id_no = self.amity.get_person_id("MARSHALL TEACH").split()[1]
+        response = self.amity.reallocate_person(id_no, "KRYPTON")
+        self.assertIn("Staff can not be allocated a living space", response)
+        self.assertIsInstance(response, Failed)
+
+    def test_errors_are_returned_as_failed(self):
+        self.assertIsInstance(self.amity.add_person("wizard", "x y"), Failed)
+        self.assertIsInstance(self.amity.load_people("nosuch.txt"), Failed)
+        self.assertIsInstance(self.amity.reallocate_person("99", "PLUTO"), Failed)
+        self.assertNotIsInstance(self.amity.add_person("staff", "x y"), Failed)
+
+    def test_reallocate_many(self):
+        self.amity.create_room(["KRYPTON"], "office")
+        self.amity.add_person("staff", "marshall teach")
+        self.amity.add_person("fellow", "jinbe knight")
+        self.amity.create_room(["XANDAR"], "office")
+        teach = self.amity.get_person_id("MARSHALL TEACH").split()[1]
+        jinbe = self.amity.get_person_id("JINBE KNIGHT").split()[1]
+        with open(data_path("input/moves.txt"), "w") as plan:
+            plan.write(teach + " xandar\n" + jinbe + " XANDAR\n" + jinbe + " PLUTO\n")
+        try:
+            response = self.amity.reallocate_many("moves.txt")
+        finally:
+            os.remove(data_path("input/moves.txt"))
+        self.assertIn("2 people have been successfully moved, 1 moves failed", response)
+        self.assertEqual(set([teach, jinbe]), self.amity.offices["XANDAR"])
+
     def test_print_room(self):
         response = self.amity.print_room("void")
         self.assertIn("VOID", response)
 
+    def test_print_room_lists_the_occupants(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("staff", "Monkey Dragon")
+        response = self.amity.print_room("mars")
+        self.assertEqual("The members of room MARS:", response.splitlines()[0])
+        self.assertIn("MONKEY DRAGON", response)
+
     def test_get_person_id(self):
         self.amity.add_person("FELLOW", "SOGEKING USSOP", "Y")
         response = self.amity.get_person_id("SOGEKING USSOP")
         self.assertIn("SOGEKING USSOP", response)
 
+    def test_get_person_id_returns_everyone_with_the_name(self):
+        self.amity.add_person("FELLOW", "SOGEKING USSOP", "Y")
+        self.amity.add_person("STAFF", "SOGEKING USSOP")
+        response = self.amity.get_person_id("SOGEKING USSOP")
+        self.assertEqual(2, len(response.splitlines()))
+
+    def test_find_person_shows_the_rooms(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.create_room(["EARTH"], "livingspace")
+        self.amity.add_person("FELLOW", "TONY CHOPPER", "Y")
+        response = self.amity.find_person("tony ch", "prefix")
+        self.assertIn("OFFICE: MARS LIVING SPACE: EARTH", response)
+        response = self.amity.find_person("TONI CHOPER", "fuzzy")
+        self.assertIn("TONY CHOPPER", response)
+
     def test_print_room_empty_room(self):
         self.amity.create_room(["JUPITER"], "livingspace")
         response = self.amity.print_room("jupiter")
@@ -106,10 +170,208 @@ class TestAmity(unittest.TestCase):
         response = self.amity.load_people("people.txt")
         self.assertIn("successfully", response)
 
+    def test_load_people_skips_malformed_lines(self):
+        """Test that a malformed line is reported instead of stopping the load"""
+        with open(data_path("input/malformed.txt"), "w") as roster:
+            roster.write("FELLOW TANA LOPEZ Y\nSTAFF KELLY\nSTAFF LEIGH RILEY\n")
+        try:
+            response = self.amity.load_people("malformed.txt")
+        finally:
+            os.remove(data_path("input/malformed.txt"))
+        self.assertIn("2 people loaded, 1 lines skipped", response)
+        self.assertEqual(2, self.amity.load_errors[0][0])
+        self.assertEqual(2, len(self.amity.employees))
+
+    def test_duplicate_room_keeps_its_occupants(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("staff", "Monkey Garp")
+        response = self.amity.create_room(["MARS", "VENUS"], "office")
+        self.assertIn("The room MARS already exists", response)
+        self.assertEqual(["MARS", "VENUS"], self.amity.rooms)
+        self.assertEqual(1, len(self.amity.offices["MARS"]))
+
+    def test_load_rooms(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("fellow", "Nico Robin", "Y")
+        with open(data_path("input/rooms.txt"), "w") as manifest:
+            manifest.write("# name type capacity\nEARTH livingspace 2\nVENUS office\nMARS office\n"
+                           "VENUS livingspace\nPLUTO attic\n")
+        try:
+            response = self.amity.load_rooms("rooms.txt")
+        finally:
+            os.remove(data_path("input/rooms.txt"))
+        self.assertIn("1 offices and 1 living spaces created, 2 duplicates and 1 lines skipped", response)
+        self.assertIn("line 4: the room MARS already exists", response)
+        self.assertIn("line 6: unknown room type attic", response)
+        self.assertIn("1 people on the waitlist have been placed", response)
+        self.assertEqual(["MARS", "EARTH", "VENUS"], self.amity.rooms)
+        self.assertEqual(2, self.amity.room_capacity["EARTH"])
+        self.assertEqual(set(["1"]), self.amity.accommodations["EARTH"])
+
+    def test_load_people_from_a_directory(self):
+        """Test that amity loads every roster in a directory using worker processes"""
+        os.mkdir(data_path("input/cohorts"))
+        try:
+            with open(data_path("input/cohorts/cohort1.txt"), "w") as roster:
+                roster.write("FELLOW TANA LOPEZ Y\nSTAFF LEIGH RILEY\n")
+            with open(data_path("input/cohorts/cohort2.txt"), "w") as roster:
+                roster.write("STAFF KELLY\nFELLOW MARI LAWRENCE N\n")
+            response = self.amity.load_people("cohorts", processes=2)
+        finally:
+            shutil.rmtree(data_path("input/cohorts"))
+        self.assertIn("3 people loaded, 1 lines skipped", response)
+        self.assertEqual("cohort2.txt:1", self.amity.load_errors[0][0])
+        self.assertEqual(3, len(self.amity.employees))
+
+    def test_parallel_load_reserves_id_blocks(self):
+        """Test that the people of every roster get distinct id numbers"""
+        os.mkdir(data_path("input/blocks"))
+        try:
+            for cohort in range(3):
+                with open(data_path("input/blocks/cohort{}.txt".format(cohort)), "w") as roster:
+                    roster.write("FELLOW TANA LOPEZ Y\nSTAFF LEIGH RILEY\n")
+            self.amity.load_people("blocks", processes=2)
+        finally:
+            shutil.rmtree(data_path("input/blocks"))
+        self.amity.add_person("staff", "Monkey Garp")
+        self.assertEqual(7, len(self.amity.employees))
+
     def test_save_state(self):
         response = self.amity.save_state("test.db")
         self.assertIn("Records created successfully!", response)
 
+    def test_save_state_only_writes_changes(self):
+        """Tests that saving again to the same database only writes what changed"""
+        self.amity = Amity(strategy="pack-first")
+        self.amity.create_room(["MARS", "EARTH"], "office")
+        self.amity.add_person("staff", "Monkey Garp")
+        self.amity.add_person("staff", "Kuzan Aokiji")
+        try:
+            self.amity.save_state("incremental.db")
+            self.amity.add_person("fellow", "Koby Marine", "N")
+            response = self.amity.save_state("incremental.db")
+            self.assertIn("(5 rows written)", response)
+            amity = Amity()
+            amity.load_state("incremental.db")
+        finally:
+            os.remove(data_path("states/incremental.db"))
+        self.assertEqual(self.amity.employees, amity.employees)
+        self.assertEqual(self.amity.offices, amity.offices)
+        self.assertEqual(["MARS", "EARTH"], amity.rooms)
+
+    def test_incremental_save_keeps_the_room_order(self):
+        """Tests that rooms created between two saves are loaded in the order they were created"""
+        rooms = ["A" + str(number) for number in range(10)]
+        try:
+            self.amity.save_state("ordered.db")
+            self.amity.create_room(rooms, "office")
+            self.amity.save_state("ordered.db")
+            amity = Amity()
+            amity.load_state("ordered.db")
+        finally:
+            os.remove(data_path("states/ordered.db"))
+        self.assertEqual(rooms, amity.rooms)
+
+    def test_load_state_migrates_pickled_state(self):
+        """Tests that a database with the old pickled STATE is migrated and loaded"""
+        conn = sqlite3.connect(data_path("states/legacy.db"))
+        conn.execute("CREATE TABLE STATE (State BLOB)")
+        state = (["MARS", "EARTH"], {"MARS": ["1", "2"]}, {"1": "MONKEY GARP", "2": "NICO ROBIN"},
+                 {"EARTH": ["2"]}, {"2": "NICO ROBIN"}, {"1": "MONKEY GARP"}, True, [])
+        conn.execute("INSERT INTO STATE(State) VALUES(?)", (sqlite3.Binary(pickle.dumps(state)),))
+        conn.commit()
+        conn.close()
+        try:
+            response = self.amity.load_state("legacy.db")
+            conn = sqlite3.connect(data_path("states/legacy.db"))
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.close()
+        finally:
+            os.remove(data_path("states/legacy.db"))
+        self.assertIn("app data successfully loaded", response)
+        self.assertEqual(storage.SCHEMA_VERSION, version)
+        self.assertEqual(set(["1", "2"]), self.amity.offices["MARS"])
+        self.assertEqual({"office": "MARS", "livingspace": "EARTH"}, self.amity.person_rooms["2"])
+        self.assertEqual(["2"], self.amity.names.exact("NICO ROBIN"))
+
+    def test_lazy_load_state(self):
+        """Tests that a lazily loaded state reads only what it needs from the database"""
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("staff", "Monkey Garp")
+        self.amity.add_person("fellow", "Nico Robin", "N")
+        amity = Amity()
+        try:
+            self.amity.save_state("lazy.db")
+            amity.load_state("lazy.db", lazy=True, cache_size=1)
+            self.assertEqual({}, amity.employees)
+            self.assertIn("ROLE: STAFF NAME: Monkey Garp", amity.get_person_id("MONKEY GARP"))
+            self.assertEqual(2, len(amity.occupants_of("MARS")))
+            self.assertEqual("Nico Robin", amity.name_of(self.amity.names.exact("NICO ROBIN")[0]))
+            self.assertEqual(1, len(amity.store.people))
+            amity.add_person("staff", "Kuzan Aokiji")
+        finally:
+            if amity.store is not None:
+                amity.store.close()
+            os.remove(data_path("states/lazy.db"))
+        self.assertIsNone(amity.store)
+        self.assertEqual(3, len(amity.employees))
+        self.assertEqual(3, len(amity.offices["MARS"]))
+
+    def test_id_high_water_survives_save_and_load(self):
+        self.amity.add_person("staff", "Monkey Garp")
+        self.amity.add_person("staff", "Kuzan Aokiji")
+        amity = Amity()
+        try:
+            self.amity.save_state("ids.db")
+            amity.load_state("ids.db")
+        finally:
+            os.remove(data_path("states/ids.db"))
+        amity.add_person("staff", "Bosalino Kizaru")
+        self.assertEqual(["3"], amity.names.exact("BOSALINO KIZARU"))
+
+    def test_new_rooms_are_filled_from_the_waitlists(self):
+        self.amity.add_person("staff", "Monkey Garp")
+        self.amity.add_person("fellow", "Nico Robin", "Y")
+        self.amity.add_person("staff", "Kuzan Aokiji")
+        self.assertEqual(["1", "2", "3"], self.amity.unallocated)
+        response = self.amity.create_room(["EARTH"], "livingspace")
+        self.assertIn("1 people on the waitlist have been placed", response)
+        self.assertEqual(set(["2"]), self.amity.accommodations["EARTH"])
+        self.assertEqual(["1", "3"], self.amity.unallocated)
+        self.amity.create_room(["MARS"], "office")
+        self.assertEqual(set(["1", "2", "3"]), self.amity.offices["MARS"])
+        self.assertEqual([], self.amity.unallocated)
+        self.assertEqual(0, len(self.amity.waitlists["office"]) + len(self.amity.waitlists["livingspace"]))
+
+    def test_drain_unallocated_is_first_come_first(self):
+        for number in range(8):
+            self.amity.add_person("staff", "Staff " + str(number))
+        self.amity.add_rooms(["MARS"], "office")
+        response = self.amity.drain_unallocated(dry_run=True)
+        self.assertIn("Staff 5 would get an office", response)
+        self.assertNotIn("Staff 6", response)
+        self.assertIn("6 would get an office, 2 still waiting", response)
+        self.assertEqual(set(), self.amity.offices["MARS"])
+        response = self.amity.drain_unallocated()
+        self.assertIn("Staff 0 has been placed in: MARS", response)
+        self.assertIn("6 got an office, 2 still waiting", response)
+        self.assertEqual(["7", "8"], self.amity.unallocated)
+
+    def test_waitlists_survive_save_and_load(self):
+        self.amity.add_person("fellow", "Nico Robin", "Y")
+        self.amity.add_person("staff", "Monkey Garp")
+        amity = Amity()
+        try:
+            self.amity.save_state("waitlists.db")
+            self.amity.create_room(["EARTH"], "livingspace")
+            self.amity.save_state("waitlists.db")
+            amity.load_state("waitlists.db")
+        finally:
+            os.remove(data_path("states/waitlists.db"))
+        self.assertEqual(["1", "2"], list(amity.waitlists["office"]))
+        self.assertEqual([], list(amity.waitlists["livingspace"]))
+        self.assertEqual(["2"], amity.unallocated)
+
     def test_load_state(self):
         database_name = "test.db"
         self.amity.load_state(database_name)
@@ -124,6 +386,132 @@ class TestAmity(unittest.TestCase):
         response = self.amity.print_allocations()
         self.assertIn("ROOM ALLOCATIONS", response)
 
+    def test_print_allocations_filters_and_formats(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.create_room(["EARTH"], "livingspace")
+        self.amity.add_person("fellow", "Tony Chopper", "Y")
+        response = self.amity.print_allocations(fmt="csv", room_type="livingspace")
+        self.assertEqual(["room_name,room_type,id_no,name", "EARTH,livingspace,1,Tony Chopper"],
+                         response.splitlines())
+        self.assertIn("Unknown format", self.amity.print_allocations(fmt="xml"))
+
+    def test_print_allocations_to_file(self):
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("staff", "Monkey Dragon")
+        response = self.amity.print_allocations("allocations.json", fmt="ndjson")
+        try:
+            with open(data_path("output/allocations.json")) as report:
+                self.assertIn('"name": "Monkey Dragon"', report.read())
+        finally:
+            os.remove(data_path("output/allocations.json"))
+        self.assertIn("saved to: allocations.json", response)
+
+    def test_stats_count_calls_and_rows(self):
+        self.assertIn("Statistics are off", self.amity.print_stats())
+        self.amity.enable_stats()
+        self.amity.create_room(["MARS"], "office")
+        self.amity.add_person("staff", "Monkey Dragon")
+        self.amity.add_person("staff", "Sakazuki Akainu")
+        try:
+            self.amity.save_state("stats.db")
+        finally:
+            os.remove(data_path("states/stats.db"))
+        self.assertEqual(2, self.amity.stats.calls["add_person"])
+        self.assertEqual(5, self.amity.stats.rows["written"])
+        response = self.amity.print_stats(reset=True)
+        self.assertIn("add_person", response)
+        self.assertNotIn("add_person", self.amity.print_stats())
+        self.amity.disable_stats()
+        self.assertNotIn("add_person", vars(self.amity))
+
+    def test_add_people_concurrently_never_overfills_rooms(self):
+        self.amity.verbose = False
+        self.amity.create_room(["MARS", "VENUS"], "office")
+        self.amity.create_room(["EARTH"], "livingspace")
+        people = [("fellow", "FELLOW " + str(number), "Y") for number in range(40)]
+        responses = self.amity.add_people_concurrently(people, workers=8)
+        self.assertEqual(40, len(responses))
+        self.assertTrue(self.amity.thread_safe)
+        self.assertEqual(40, len(set(self.amity.employees)))
+        self.assertEqual(6, len(self.amity.offices["MARS"]))
+        self.assertEqual(6, len(self.amity.offices["VENUS"]))
+        self.assertEqual(4, len(self.amity.accommodations["EARTH"]))
+        self.assertEqual(28, len(self.amity.unallocated))
+
+    def test_concurrent_reallocations_respect_capacity(self):
+        self.amity = Amity(thread_safe=True)
+        self.amity.verbose = False
+        self.amity.create_room(["MARS"], "office")
+        for number in range(6):
+            self.amity.add_person("staff", "STAFF " + str(number))
+        self.amity.create_room(["VENUS"], "office")
+        threads = [threading.Thread(target=self.amity.reallocate_person, args=(str(number), "VENUS"))
+                   for number in range(1, 7)] + \
+                  [threading.Thread(target=self.amity.add_person, args=("staff", "LATE " + str(number)))
+                   for number in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(12, len(self.amity.offices["MARS"]) + len(self.amity.offices["VENUS"]))
+        self.assertTrue(len(self.amity.offices["VENUS"]) <= 6)
+
+    def test_prefix_search_keeps_names_added_concurrently(self):
+        self.amity = Amity(thread_safe=True)
+        self.amity.verbose = False
+        self.amity.names.merge_threshold = 0
+        self.amity.add_person("staff", "NAMI 1")
+        late = threading.Thread(target=self.amity.add_person, args=("staff", "NAMI 2"))
+
+        class SlowSort(list):
+            def sort(self):
+                # another thread adds a name while the pending names are merged
+                if late.ident is None:
+                    late.start()
+                    late.join(0.2)
+                list.sort(self)
+
+        self.amity.names.sorted_names = SlowSort()
+        self.amity.search_people("NAMI", "prefix")
+        late.join()
+        self.assertEqual(2, len(self.amity.search_people("NAMI", "prefix")))
+
+    def test_full_rooms_leave_the_vacancy_pool(self):
+        """Tests that a room is no longer offered once it is full"""
+        self.amity.create_room(["saturn"], "livingspace")
+        for name in ["nami", "zoro", "sanji", "brook"]:
+            self.amity.add_person("fellow", name + " mugiwara", "Y")
+        self.assertNotIn("saturn", self.amity.vacancies["livingspace"])
+        self.amity.add_person("fellow", "franky cutty", "Y")
+        franky = self.amity.names.exact("FRANKY CUTTY")[0]
+        self.assertNotIn(franky, self.amity.accommodations["saturn"])
+        self.assertEqual(4, len(self.amity.accommodations["saturn"]))
+        self.assertNotIn("saturn", self.amity.vacancies["livingspace"])
+
+    def test_reallocation_frees_space_in_the_vacancy_pool(self):
+        """Tests that moving a person out of a full room makes it vacant again"""
+        self.amity.create_room(["NEPTUNE"], "office")
+        for name in ["a", "b", "c", "d", "e", "f"]:
+            self.amity.add_person("staff", name + " vegapunk")
+        self.assertNotIn("NEPTUNE", self.amity.vacancies["office"])
+        self.amity.create_room(["URANUS"], "office")
+        id_no = list(self.amity.offices["NEPTUNE"])[0]
+        self.amity.reallocate_person(id_no, "URANUS")
+        self.assertIn("NEPTUNE", self.amity.vacancies["office"])
+
+    def test_pack_first_strategy_fills_rooms_in_order(self):
+        """Tests that the pack-first strategy fills one room before the next"""
+        amity = Amity(strategy="pack-first")
+        amity.create_room(["MERCURY", "MARS"], "livingspace")
+        for name in ["a", "b", "c", "d", "e"]:
+            amity.add_person("fellow", name + " nefertari", "Y")
+        self.assertEqual(4, len(amity.accommodations["MERCURY"]))
+        self.assertEqual(1, len(amity.accommodations["MARS"]))
+
+    def test_set_unknown_strategy(self):
+        response = self.amity.set_strategy("round-robin")
+        self.assertIn("Unknown allocation strategy", response)
+
     def tearDown(self):
         self.amity = None
 
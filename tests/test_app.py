@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import unittest
+
+try:
+    import docopt
+except ImportError:
+    docopt = None
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@unittest.skipIf(docopt is None, "the command line app needs docopt")
+class TestRunScript(unittest.TestCase):
+    """
+    Tests running a script of commands with app.py run
+    """
+    def run_script(self, script, *options):
+        app = subprocess.Popen([sys.executable, APP, "run"] + list(options), stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        output, errors = app.communicate(script)
+        return app.returncode, output, errors
+
+    def test_script_stops_at_the_first_error(self):
+        status, output, errors = self.run_script("create_room MARS\nload_people nosuch.txt\ncreate_room VENUS\n")
+        self.assertEqual(1, status)
+        self.assertIn("The file does not exist!", output)
+        self.assertNotIn("VENUS", output)
+        self.assertEqual("line 2: load_people nosuch.txt failed\n", errors)
+
+    def test_keep_going_counts_every_error(self):
+        status, output, errors = self.run_script("reallocate_person 99 PLUTO\nadd_person wizard x y\n"
+                                                 "create_room MARS\nadd_person staff x y\n", "--keep-going")
+        self.assertEqual(1, status)
+        self.assertIn("The staff X Y has been added successfully", output)
+        self.assertEqual(["line 1: reallocate_person 99 PLUTO failed", "line 2: add_person wizard x y failed"],
+                         errors.splitlines())
+
+    def test_split_lines_parse_like_docopt(self):
+        status, output, errors = self.run_script("create_room MARS --ls\ncreate_room VENUS EARTH\n"
+                                                 "add_person fellow x y Y\nadd_person staff x y n\n"
+                                                 "create_room PLUTO --ls --o\nadd_person staff x y n z\n",
+                                                 "--keep-going")
+        self.assertIn("The living space has been created successfully!", output)
+        self.assertIn("2 offices have been successfully created", output)
+        self.assertIn("X Y has successfully been allocated the living space: MARS", output)
+        self.assertEqual(["line 5: create_room PLUTO --ls --o failed", "line 6: add_person staff x y n z failed"],
+                         errors.splitlines())
+
+    def test_script_without_errors(self):
+        status, output, errors = self.run_script("create_room MARS\nadd_person staff x y\nadd_person staff x y\n")
+        self.assertEqual(0, status)
+        self.assertEqual("", errors)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from amity.amity import Amity
+from amity.events import EventLog, INFO, WARNING, QUIET, render
+
+
+class TestEventLog(unittest.TestCase):
+    """
+    Tests the event log the core logs allocations to instead of printing
+    """
+    def setUp(self):
+        self.amity = Amity()
+        self.amity.create_room(["MARS"], "office")
+
+    def test_allocations_are_logged_not_printed(self):
+        self.amity.add_person("fellow", "TONY CHOPPER", "Y")
+        self.assertEqual(["TONY CHOPPER has successfully been allocated the office: MARS",
+                          "The system has no available accommodations"], self.amity.events.render())
+        self.assertEqual(0, len(self.amity.events))
+
+    def test_levels_and_quiet_mode(self):
+        self.assertEqual("Log level set to warning", self.amity.events.set_level("warning"))
+        self.amity.add_person("fellow", "TONY CHOPPER", "Y")
+        self.assertEqual([(WARNING, "no_vacancy", ("livingspace",))], self.amity.events.drain())
+        self.amity.verbose = False
+        self.assertEqual(QUIET, self.amity.events.level)
+        self.amity.add_person("fellow", "SABO", "Y")
+        self.assertEqual([], self.amity.events.drain())
+        self.assertIn("Unknown log level", self.amity.events.set_level("loud"))
+
+    def test_bulk_loads_log_nothing(self):
+        with self.amity.events.quiet():
+            self.amity.add_person("staff", "NICO ROBIN")
+        self.assertEqual(INFO, self.amity.events.level)
+        self.assertEqual([], self.amity.events.drain())
+
+    def test_log_is_bounded(self):
+        events = EventLog(capacity=2)
+        for room_type in ("office", "livingspace", "office"):
+            events.log(WARNING, "no_vacancy", room_type)
+        self.assertEqual(1, events.dropped)
+        self.assertEqual(["The system has no available accommodations", "The system has no available office space"],
+                         [render(event) for event in events.drain()])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from amity.amity import Amity, data_path
+from amity.facilities import FacilityRouter, ShardError
+
+
+class TestFacilityRouter(unittest.TestCase):
+    """
+    Tests routing to the shards of several facilities
+    """
+    def setUp(self):
+        self.router = FacilityRouter(["NAIROBI", "LAGOS", "KIGALI"], "pack-first", database="router_{facility}.db")
+        self.router.create_room("NAIROBI", ["MARS"], "office")
+        self.router.create_room("LAGOS", ["VENUS"], "office")
+
+    def tearDown(self):
+        self.router.close()
+        for facility in ("NAIROBI", "LAGOS", "KIGALI"):
+            for suffix in ("", "-wal", "-shm"):
+                path = data_path("states/router_" + facility + ".db" + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def test_operations_are_routed_by_facility(self):
+        self.assertIn("has been added successfully", self.router.add_person("NAIROBI", "staff", "NICO ROBIN"))
+        self.router.add_person("LAGOS", "staff", "NICO ROBIN")
+        self.assertIn("NICO ROBIN", self.router.print_room("NAIROBI", "MARS"))
+        self.assertIn("NICO ROBIN", self.router.print_room("LAGOS", "VENUS"))
+        self.assertIn("does not exist", self.router.reallocate_person("NAIROBI", "1", "VENUS"))
+        self.assertEqual("The facility MOMBASA does not exist", self.router.add_person("MOMBASA", "staff", "NAMI"))
+
+    def test_queries_fan_out_to_every_facility(self):
+        self.router.add_people([("NAIROBI", "fellow", "TONY CHOPPER", "Y"), ("LAGOS", "staff", "TONY CHOPPER", "N"),
+                                ("LAGOS", "staff", "BROOK", "N"), ("KIGALI", "fellow", "SABO", "Y")])
+        self.assertEqual("FACILITY: NAIROBI ID: 1 ROLE: FELLOW NAME: TONY CHOPPER\n"
+                         "FACILITY: LAGOS ID: 1 ROLE: STAFF NAME: TONY CHOPPER",
+                         self.router.get_person_id("TONY CHOPPER"))
+        self.assertIn("FACILITY: LAGOS ID: 2 ROLE: STAFF NAME: BROOK OFFICE: VENUS", self.router.find_person("BROOK"))
+        report = self.router.print_unallocated()
+        self.assertEqual("\nUNALLOCATED PEOPLE IN KIGALI\n-------------------------------------\nSABO\n", report)
+        self.assertEqual("facility,id_no,name,role\nKIGALI,1,SABO,fellow\n",
+                         self.router.print_unallocated(fmt="csv"))
+
+    def test_every_facility_saves_its_own_database(self):
+        self.router.add_person("NAIROBI", "staff", "NICO ROBIN")
+        self.assertIn("LAGOS: Records created successfully!", self.router.save_state())
+        nairobi = Amity()
+        nairobi.load_state("router_NAIROBI.db")
+        self.assertEqual({"1": "NICO ROBIN"}, nairobi.employees)
+        lagos = Amity()
+        lagos.load_state("router_LAGOS.db")
+        self.assertEqual({}, lagos.employees)
+
+    def test_errors_in_a_shard_are_raised(self):
+        with self.assertRaises(ShardError):
+            self.router.call("NAIROBI", "add_person", colour="red")
+        self.assertIn("NICO ROBIN", self.router.add_person("NAIROBI", "staff", "NICO ROBIN"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+from amity.ids import IdAllocator
+
+
+class TestIdAllocator(unittest.TestCase):
+    """
+    Tests the allocator of the id numbers of people
+    """
+    def test_ids_are_consecutive(self):
+        ids = IdAllocator()
+        self.assertEqual(["1", "2", "3"], [ids.next_id() for _ in range(3)])
+
+    def test_blocks_do_not_overlap(self):
+        ids = IdAllocator(10)
+        self.assertEqual(11, ids.reserve_block(5))
+        self.assertEqual(16, ids.reserve_block(5))
+        self.assertEqual("21", ids.next_id())
+
+if __name__ == '__main__':
+    unittest.main()
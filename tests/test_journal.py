@@ -0,0 +1,109 @@
+import os
+import time
+import unittest
+
+from amity.amity import Amity, data_path
+from amity.journal import Journal, segments, read_records
+
+JOURNAL = data_path("states/journal.db.journal")
+
+
+class TestJournal(unittest.TestCase):
+    """
+    Tests the journal of the changes made since the last snapshot
+    """
+    def setUp(self):
+        self.amity = Amity()
+        self.amity.verbose = False
+        self.amity.create_room(["MARS"], "office")
+        self.amity.enable_journal("journal.db")
+
+    def tearDown(self):
+        self.amity.close_journal()
+        for number, segment in segments(JOURNAL):
+            os.remove(segment)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(data_path("states/journal.db" + suffix)):
+                os.remove(data_path("states/journal.db" + suffix))
+
+    def test_load_state_replays_the_journal(self):
+        self.amity.create_room(["OCCULUS"], "livingspace")
+        self.amity.add_person("fellow", "TONY CHOPPER", "Y")
+        self.amity.add_person("staff", "NICO ROBIN")
+        self.amity.reallocate_person("2", "MARS")
+        self.amity.close_journal()
+        restored = Amity()
+        self.assertIn("6 changes replayed", restored.load_state("journal.db"))
+        self.assertEqual({"MARS": {"1", "2"}}, restored.offices)
+        self.assertEqual({"OCCULUS": {"1"}}, restored.accommodations)
+        self.assertEqual(2, restored.ids.high_water)
+        restored.add_person("staff", "BROOK")
+        restored.close_journal()
+        again = Amity()
+        again.load_state("journal.db")
+        self.assertEqual({"1", "2", "3"}, set(again.employees))
+        again.close_journal()
+
+    def test_waitlists_are_replayed(self):
+        self.amity.add_person("fellow", "SABO", "Y")
+        self.amity.close_journal()
+        restored = Amity()
+        restored.load_state("journal.db")
+        self.assertEqual(["1"], list(restored.waitlists["livingspace"]))
+        restored.close_journal()
+
+    def test_save_state_folds_the_journal(self):
+        self.amity.add_person("staff", "NICO ROBIN")
+        self.amity.save_state("journal.db")
+        self.amity.add_person("staff", "BROOK")
+        self.amity.close_journal()
+        self.assertEqual(1, len(segments(JOURNAL)))
+        restored = Amity()
+        self.assertIn("2 changes replayed", restored.load_state("journal.db"))
+        self.assertEqual({"1": "NICO ROBIN", "2": "BROOK"}, restored.employees)
+        restored.close_journal()
+
+    def test_compact_journal(self):
+        self.amity.add_person("staff", "NICO ROBIN")
+        self.assertEqual("2 changes of the journal folded into journal.db", self.amity.compact_journal())
+        self.amity.close_journal()
+        restored = Amity()
+        self.assertIn("0 changes replayed", restored.load_state("journal.db"))
+        self.assertEqual({"MARS": {"1"}}, restored.offices)
+        restored.close_journal()
+
+    def test_journal_is_compacted_in_the_background(self):
+        self.amity.close_journal()
+        self.amity.compact_every = 10
+        self.amity.load_state("journal.db")
+        for number in range(20):
+            self.amity.add_person("staff", "PERSON " + str(number))
+        deadline = time.time() + 5
+        while len(segments(JOURNAL)) > 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.amity.close_journal()
+        restored = Amity()
+        restored.load_state("journal.db")
+        self.assertEqual(20, len(restored.employees))
+        self.assertEqual(6, len(restored.offices["MARS"]))
+        restored.close_journal()
+
+    def test_disable_journal(self):
+        self.amity.add_person("staff", "NICO ROBIN")
+        self.assertEqual("The journal is off, the state was saved to journal.db", self.amity.disable_journal())
+        self.assertEqual([], segments(JOURNAL))
+        restored = Amity()
+        self.assertEqual("\n app data successfully loaded!\n", restored.load_state("journal.db"))
+        self.assertEqual({"1": "NICO ROBIN"}, restored.employees)
+
+    def test_torn_last_line_is_skipped(self):
+        journal = Journal(JOURNAL, 7)
+        journal.append("room", "VENUS", "office", 6)
+        journal.close()
+        path = segments(JOURNAL)[-1][1]
+        with open(path, "a") as segment:
+            segment.write('[9,"room","PLU')
+        self.assertEqual([[8, "room", "VENUS", "office", 6]], list(read_records([path])))
+
+if __name__ == '__main__':
+    unittest.main()
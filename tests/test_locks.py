@@ -0,0 +1,32 @@
+import threading
+import unittest
+
+from amity.locks import NO_LOCK, AllOf, RoomLocks
+
+
+class TestLocks(unittest.TestCase):
+    """
+    Tests the locks of the thread safe mode
+    """
+    def test_room_locks_are_off_by_default(self):
+        locks = RoomLocks()
+        self.assertIs(NO_LOCK, locks.lock("MARS"))
+        self.assertIs(NO_LOCK, locks.hold("MARS", "VENUS"))
+
+    def test_hold_takes_the_locks_in_name_order(self):
+        locks = RoomLocks()
+        locks.enabled = True
+        held = locks.hold("VENUS", None, "MARS", "VENUS")
+        self.assertEqual([locks.lock("MARS"), locks.lock("VENUS")], held.locks)
+        with held:
+            self.assertFalse(locks.lock("MARS").acquire(False))
+        self.assertTrue(locks.lock("MARS").acquire(False))
+
+    def test_all_of_releases_in_reverse(self):
+        first, second = threading.Lock(), threading.Lock()
+        with AllOf([first, second]):
+            self.assertTrue(first.locked() and second.locked())
+        self.assertFalse(first.locked() or second.locked())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from amity.amity import Amity
+from amity.occupancy import Occupancy
+
+
+class TestOccupancy(unittest.TestCase):
+    """
+    Tests the occupancy counters kept up to date on every change
+    """
+    def setUp(self):
+        self.amity = Amity()
+        self.amity.verbose = False
+        self.amity.create_room(["MARS"], "office")
+        self.amity.create_room(["OCCULUS"], "livingspace")
+        self.amity.register_room("PLUTO", "office", 1)
+
+    def counted(self):
+        """Counts the occupancy by walking the rooms"""
+        occupancy = Occupancy()
+        occupancy.people = {"fellow": len(self.amity.fellows), "staff": len(self.amity.staff)}
+        for room_type, rooms in (("office", self.amity.offices), ("livingspace", self.amity.accommodations)):
+            for room_name, occupants in rooms.items():
+                occupancy.add_room(room_type, self.amity.room_capacity[room_name], len(occupants))
+        return occupancy.summary(self.amity.waitlists)
+
+    def test_counters_follow_allocations(self):
+        for number in range(8):
+            self.amity.add_person("fellow", "FELLOW " + str(number), "Y")
+        self.amity.add_person("staff", "NICO ROBIN")
+        summary = self.amity.summary()
+        self.assertEqual({"fellow": 8, "staff": 1}, summary["people"])
+        self.assertEqual(2, summary["office"]["rooms"])
+        self.assertEqual(7, summary["office"]["seats"])
+        self.assertEqual(0, summary["office"]["free"])
+        self.assertEqual(2, summary["office"]["full"])
+        self.assertEqual(2, summary["office"]["waiting"])
+        self.assertEqual({"fellow": 7, "staff": 0}, summary["office"]["allocated"])
+        self.assertEqual(4, summary["livingspace"]["waiting"])
+        self.assertEqual(1, summary["livingspace"]["full"])
+        for room_type in ("office", "livingspace"):
+            for counter in ("rooms", "seats", "occupied", "free", "full", "partial", "empty", "waiting"):
+                self.assertEqual(self.counted()[room_type][counter], summary[room_type][counter])
+
+    def test_counters_follow_moves_and_new_rooms(self):
+        self.amity.add_person("staff", "NICO ROBIN")
+        self.amity.add_person("staff", "BROOK")
+        robin = self.amity.names.exact("NICO ROBIN")[0]
+        office = self.amity.person_rooms[robin]["office"]
+        self.amity.reallocate_person(robin, "MARS" if office == "PLUTO" else "PLUTO")
+        self.amity.create_room(["EARTH"], "office")
+        summary = self.amity.summary()
+        self.assertEqual(3, summary["office"]["rooms"])
+        self.assertEqual(11, summary["office"]["free"])
+        self.assertEqual({"fellow": 0, "staff": 2}, summary["office"]["allocated"])
+        for counter in ("full", "partial", "empty"):
+            self.assertEqual(self.counted()["office"][counter], summary["office"][counter])
+
+    def test_counters_are_rebuilt_on_load(self):
+        self.amity.add_person("fellow", "TONY CHOPPER", "Y")
+        state = self.amity.state_rows()
+        amity = Amity()
+        amity.load_rows(state)
+        self.assertEqual(self.amity.summary(), amity.summary())
+        self.assertIn("fellow: 1 (1 with an office, 1 with a living space)", amity.print_summary())
+
+if __name__ == '__main__':
+    unittest.main()
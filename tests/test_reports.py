@@ -0,0 +1,48 @@
+import json
+import unittest
+
+from amity.reports import ChunkedWriter, StringOut, write_report, allocation_text
+
+ROWS = [("MARS", "office", "1", "NAMI MUGIWARA"),
+        ("MARS", "office", "2", "ZORO MUGIWARA"),
+        ("EARTH", "livingspace", "1", "NAMI MUGIWARA")]
+COLUMNS = ("room_name", "room_type", "id_no", "name")
+
+
+class TestReports(unittest.TestCase):
+    """
+    Tests the formats reports are written in
+    """
+    def test_chunked_writer_writes_in_chunks(self):
+        out = []
+        writer = ChunkedWriter(StringOut(), chunk_size=10)
+        writer.out.write = out.append
+        for _ in range(7):
+            writer.write("abc")
+        self.assertEqual(["abcabcabcabc"], out)
+        writer.flush()
+        self.assertEqual("abc" * 7, "".join(out))
+
+    def test_text_groups_people_by_room(self):
+        out = StringOut()
+        self.assertEqual(3, write_report(out, iter(ROWS), COLUMNS, "text", allocation_text))
+        self.assertEqual("ROOM ALLOCATIONS\n\nMARS\n", out.getvalue()[:len("ROOM ALLOCATIONS\n\nMARS\n")])
+        self.assertEqual(2, out.getvalue().count("\n-----"))
+
+    def test_csv_and_ndjson(self):
+        out = StringOut()
+        write_report(out, iter(ROWS), COLUMNS, "csv")
+        self.assertEqual("room_name,room_type,id_no,name\nMARS,office,1,NAMI MUGIWARA\n",
+                         "".join(out.getvalue().splitlines(True)[:2]))
+        out = StringOut()
+        write_report(out, iter(ROWS), COLUMNS, "ndjson")
+        lines = out.getvalue().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertEqual("EARTH", json.loads(lines[2])["room_name"])
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, write_report, StringOut(), iter(ROWS), COLUMNS, "xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from amity.roster import parse_person, iter_people, parse_room, iter_rooms
+
+
+class TestRoster(unittest.TestCase):
+    """
+    Tests the parsing of roster files used by load_people
+    """
+    def test_parse_person(self):
+        self.assertEqual(("FELLOW", "TANA LOPEZ", "Y"), parse_person("fellow Tana Lopez y\n"))
+        self.assertEqual(("STAFF", "LEIGH RILEY", "N"), parse_person("STAFF LEIGH RILEY"))
+
+    def test_parse_person_rejects_malformed_lines(self):
+        self.assertRaises(ValueError, parse_person, "FELLOW TANA")
+        self.assertRaises(ValueError, parse_person, "INTERN TANA LOPEZ")
+        self.assertRaises(ValueError, parse_person, "FELLOW TANA LOPEZ MAYBE")
+
+    def test_iter_people_reports_errors_with_line_numbers(self):
+        lines = ["STAFF LEIGH RILEY\n", "\n", "FELLOW TANA\n", "FELLOW MARI LAWRENCE Y\n"]
+        parsed = list(iter_people(lines))
+        self.assertEqual(3, len(parsed))
+        self.assertEqual(3, parsed[1][0])
+        self.assertIsNone(parsed[1][1])
+        self.assertEqual(("FELLOW", "MARI LAWRENCE", "Y"), parsed[2][1])
+
+    def test_parse_room(self):
+        self.assertEqual(("MARS", "office", 8), parse_room("mars Office 8\n"))
+        self.assertEqual(("EARTH", "livingspace", None), parse_room("EARTH livingspace"))
+        self.assertRaises(ValueError, parse_room, "MARS")
+        self.assertRaises(ValueError, parse_room, "MARS kitchen")
+        self.assertRaises(ValueError, parse_room, "MARS office 0")
+
+    def test_iter_rooms_skips_comments(self):
+        parsed = list(iter_rooms(["# name type capacity\n", "MARS office\n", "\n", "EARTH attic\n"]))
+        self.assertEqual([2, 4], [line_no for line_no, room, error in parsed])
+        self.assertEqual("unknown room type attic", parsed[1][2])
+
+if __name__ == '__main__':
+    unittest.main()
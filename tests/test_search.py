@@ -0,0 +1,39 @@
+import unittest
+
+from amity.search import NameIndex, edit_distance
+
+
+class TestNameIndex(unittest.TestCase):
+    """
+    Tests the name index used to search for people in amity
+    """
+    def setUp(self):
+        self.index = NameIndex()
+        self.index.add("MONKEY LUFFY", "1")
+        self.index.add("MONKEY GARP", "2")
+        self.index.add("MONKEY LUFFY", "3")
+        self.index.add("NICO ROBIN", "4")
+
+    def test_exact_returns_everyone_with_the_name(self):
+        self.assertEqual(["1", "3"], self.index.exact("monkey luffy"))
+        self.assertEqual([], self.index.exact("MONKEY DRAGON"))
+
+    def test_prefix(self):
+        self.assertEqual(["2", "1", "3"], self.index.prefix("MONKEY"))
+        self.assertEqual(["2"], self.index.prefix("MONKEY", limit=1))
+        self.index.add("MONKEY DRAGON", "5")
+        self.assertEqual(["5", "2"], self.index.prefix("MONKEY", limit=2))
+
+    def test_fuzzy_allows_one_typo_per_word(self):
+        self.assertEqual(["4"], self.index.fuzzy("NCIO ROBN"))
+        self.assertEqual(["2"], self.index.fuzzy("MONKY GRAP"))
+        self.assertEqual([], self.index.fuzzy("NICO ROBINSON"))
+
+    def test_edit_distance(self):
+        self.assertEqual(0, edit_distance("ROBIN", "ROBIN"))
+        self.assertEqual(1, edit_distance("ROBIN", "ROBN"))
+        self.assertEqual(1, edit_distance("ROBIN", "RBOIN"))
+        self.assertEqual(2, edit_distance("ROBIN", "RBN"))
+
+if __name__ == '__main__':
+    unittest.main()
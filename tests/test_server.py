@@ -0,0 +1,80 @@
+import json
+import os
+import socket
+import sys
+import threading
+import unittest
+
+from amity.amity import Amity, data_path
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from amity.server import AmityServer
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "the server needs asyncio")
+class TestServer(unittest.TestCase):
+    """
+    Tests the JSON server against a real socket
+    """
+    def setUp(self):
+        self.amity = Amity("pack-first")
+        self.amity.verbose = False
+        self.server = AmityServer(self.amity, "server.db", concurrency=4)
+        self.saved = []
+        self.thread = threading.Thread(target=lambda: self.saved.append(
+            asyncio.run(self.server.run(port=0, handle_signals=False))))
+        self.thread.start()
+        self.server.started.wait(5)
+        self.client = socket.create_connection(self.server.address()[:2])
+        self.lines = self.client.makefile("r")
+
+    def tearDown(self):
+        self.client.close()
+        if self.thread.is_alive():
+            self.server.stop()
+            self.thread.join(5)
+        if os.path.exists(data_path("states/server.db")):
+            os.remove(data_path("states/server.db"))
+
+    def send(self, *requests):
+        self.client.sendall("".join(json.dumps(request) + "\n" for request in requests).encode())
+        return [json.loads(self.lines.readline()) for _ in requests]
+
+    def test_pipelined_requests_are_answered_in_order(self):
+        requests = [{"id": 0, "method": "create_room", "params": [["MARS"], "office"]}]
+        requests += [{"id": number, "method": "add_person", "params": ["staff", "STAFF " + str(number)]}
+                     for number in range(1, 20)]
+        requests.append({"id": 20, "method": "print_allocations", "params": {"fmt": "csv"}})
+        responses = self.send(*requests)
+        self.assertEqual(list(range(21)), [response["id"] for response in responses])
+        self.assertIn("MARS,office,1,STAFF 1", responses[-1]["result"])
+
+    def test_errors(self):
+        responses = self.send({"id": 1, "method": "load_people", "params": ["people.txt"]},
+                              {"id": 2, "method": "add_person", "params": {"colour": "red"}})
+        self.assertIn("unknown method", responses[0]["error"])
+        self.assertIn("TypeError", responses[1]["error"])
+        self.client.sendall(b"not json\n")
+        self.assertIn("invalid JSON", json.loads(self.lines.readline())["error"])
+
+    def test_filenames_with_a_path_are_refused(self):
+        responses = self.send({"id": 1, "method": "save_state", "params": ["../../x.db"]},
+                              {"id": 2, "method": "print_allocations", "params": {"filename": "/tmp/x.txt"}},
+                              {"id": 3, "method": "print_unallocated", "params": [".."]})
+        for response in responses:
+            self.assertIn("without a path", response["error"])
+        self.assertFalse(os.path.exists(data_path("../x.db")))
+
+    def test_shutdown_saves_the_state(self):
+        self.send({"id": 1, "method": "add_person", "params": ["fellow", "TONY CHOPPER"]})
+        self.server.stop()
+        self.thread.join(5)
+        self.assertIn("Records created successfully", self.saved[0])
+        amity = Amity()
+        amity.load_state("server.db")
+        self.assertIn("TONY CHOPPER", amity.get_person_id("TONY CHOPPER"))
+
+
+if __name__ == '__main__':
+    unittest.main()
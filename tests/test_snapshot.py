@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from amity.amity import Amity, data_path
+from amity.snapshot import Snapshot, is_snapshot, write_snapshot
+
+STATE = {
+    "people": [("1", "MONKEY GARP", "staff"), ("2", "NICO ROBIN", "fellow"), ("10", "Nico Robin", "fellow")],
+    "rooms": [("MARS", "office", 6), ("VENUS", "livingspace", 4), ("EARTH", "office", 2)],
+    "allocations": [("1", "MARS"), ("2", "MARS"), ("2", "VENUS")],
+    "unallocated": ["10"],
+    "livingspace_waitlist": ["10"],
+    "high_water": 10,
+}
+
+
+class TestSnapshot(unittest.TestCase):
+    """
+    Tests the memory mapped binary snapshot of the state
+    """
+    def setUp(self):
+        self.path = data_path("states/test.snap")
+        write_snapshot(self.path, STATE)
+        self.snapshot = Snapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        for name in ("test.snap", "converted.db", "converted.snap"):
+            if os.path.exists(data_path("states/" + name)):
+                os.remove(data_path("states/" + name))
+
+    def test_state_round_trip(self):
+        state = self.snapshot.read_state()
+        self.assertEqual(STATE["people"], state["people"])
+        self.assertEqual(STATE["rooms"], state["rooms"])
+        self.assertEqual(sorted(STATE["allocations"]), sorted(state["allocations"]))
+        self.assertEqual(["10"], state["unallocated"])
+        self.assertEqual(["10"], state["livingspace_waitlist"])
+        self.assertEqual(10, state["high_water"])
+
+    def test_lookups_read_in_place(self):
+        self.assertEqual(("NICO ROBIN", "fellow"), self.snapshot.person("2"))
+        self.assertIsNone(self.snapshot.person("3"))
+        self.assertEqual(("office", 6, ["1", "2"]), self.snapshot.room("MARS"))
+        self.assertEqual(("office", 2, []), self.snapshot.room("EARTH"))
+        self.assertIsNone(self.snapshot.room("PLUTO"))
+        self.assertEqual([("2", "NICO ROBIN", "fellow"), ("10", "Nico Robin", "fellow")],
+                         self.snapshot.find("nico robin"))
+
+    def test_amity_loads_a_snapshot_lazily(self):
+        amity = Amity()
+        amity.verbose = False
+        amity.load_state("test.snap", lazy=True)
+        self.assertEqual({}, amity.employees)
+        self.assertIn("ROLE: STAFF NAME: MONKEY GARP", amity.get_person_id("MONKEY GARP"))
+        self.assertEqual(2, len(amity.occupants_of("MARS")))
+        amity.add_person("staff", "BROOK")
+        self.assertIsNone(amity.store)
+        self.assertEqual("BROOK", amity.employees["11"])
+        self.assertIn("Snapshot saved", amity.save_state("test.snap"))
+        self.assertTrue(is_snapshot(self.path))
+        self.assertEqual(4, len(Snapshot(self.path).read_state()["people"]))
+
+    def test_convert_state(self):
+        amity = Amity()
+        self.assertIn("rows written", amity.convert_state("test.snap", "converted.db"))
+        self.assertFalse(is_snapshot(data_path("states/converted.db")))
+        amity.load_state("converted.db")
+        self.assertEqual({"MARS": {"1", "2"}, "EARTH": set()}, amity.offices)
+        amity.convert_state("converted.db", "converted.snap")
+        self.assertEqual(self.snapshot.read_state()["people"],
+                         Snapshot(data_path("states/converted.snap")).read_state()["people"])
+
+if __name__ == '__main__':
+    unittest.main()
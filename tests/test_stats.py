@@ -0,0 +1,42 @@
+import unittest
+
+from amity.stats import Stats
+
+
+class Counter(object):
+    def add(self, value):
+        return value + 1
+
+
+class TestStats(unittest.TestCase):
+    """
+    Tests the call counts and latencies of instrumented methods
+    """
+    def test_instrument_counts_calls(self):
+        counter = Counter()
+        stats = Stats()
+        stats.instrument(counter, ["add"])
+        self.assertEqual(3, counter.add(2))
+        counter.add(3)
+        self.assertEqual(2, stats.calls["add"])
+        self.assertIn("add", stats.report())
+
+    def test_remove_restores_the_methods(self):
+        counter = Counter()
+        stats = Stats()
+        stats.instrument(counter, ["add"])
+        stats.remove(counter)
+        counter.add(1)
+        self.assertEqual({}, stats.calls)
+
+    def test_latency_window(self):
+        stats = Stats()
+        stats.window = 2
+        for seconds in (1.0, 2.0, 3.0):
+            stats.record("add", seconds)
+        self.assertEqual(3, stats.calls["add"])
+        self.assertEqual(6.0, stats.seconds["add"])
+        self.assertEqual([2.0, 3.0], list(stats.latencies["add"]))
+
+if __name__ == '__main__':
+    unittest.main()